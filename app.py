@@ -1,11 +1,17 @@
 # app.py
 import streamlit as st
-import sqlite3
 import datetime
 import time
-import hashlib
-import json
-from urllib.request import urlopen
+from streamlit.errors import StreamlitAPIException
+
+import service
+from db import connection_stats
+from migrations import migrate
+from meteo import get_forecasts, live_weather
+from bj_snapshot import snapshot_stats
+from search import search, KIND_LABELS
+from roles import get_user_role_badge, role_badge_html, role_cache_stats
+from events import DEFAULT_CAPACITY, cleanup_if_due, parse_starts_at, fast_track_stats
 
 # Import blackjack (deve esistere blackjack_app.py con blackjack_section())
 try:
@@ -120,22 +126,6 @@ def local_css():
         box-shadow: 0 2px 5px rgba(0,0,0,0.02);
     }
 
-    .fast-track-box {
-        text-align: center;
-        padding: 2rem;
-        background: linear-gradient(135deg, #ffffff 0%, #f0f9ff 100%);
-        border: 2px solid #3b82f6;
-        border-radius: 24px;
-        box-shadow: 0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-        margin-bottom: 2rem;
-    }
-    .fast-track-title {
-        font-size: 1.5rem;
-        font-weight: 800;
-        color: #1e3a8a;
-        margin-bottom: 0.5rem;
-    }
-
     .admin-section {
         background-color: #F9FAFB;
         border-radius: 14px;
@@ -152,291 +142,64 @@ def local_css():
     </style>
     """, unsafe_allow_html=True)
 
-# DATABASE
-DB_NAME = "terrazzo_vito.db"
+# DATABASE (connessioni: vedi db.py)
 LINK_REVOLUT = "https://revolut.me/gianlunapolano"
 VITO_ADDRESS = "Via Arenella, 95, 80128 Napoli NA"
 VITO_MAP_URL = "https://www.google.com/maps/search/?api=1&query=Via+Arenella+95+Napoli"
 
-# --- SICUREZZA ---
-def make_hashes(password: str) -> str:
-    return hashlib.sha256(str.encode(password)).hexdigest()
-
-def check_hashes(password: str, hashed_text: str) -> bool:
-    return make_hashes(password) == hashed_text
-
-# --- METEO ---
-def get_weather_napoli_live():
-    try:
-        url = "https://api.open-meteo.com/v1/forecast?latitude=40.8518&longitude=14.2681&current_weather=true"
-        response = urlopen(url)
-        data = json.loads(response.read())
-        temp = data["current_weather"]["temperature"]
-        wcode = data["current_weather"]["weathercode"]
-        wind = data["current_weather"]["windspeed"]
-        icon = "☀️"
-        if wcode in [1, 2, 3]:
-            icon = "⛅"
-        elif wcode >= 51:
-            icon = "🌧️"
-        return f"{icon} {temp}°C", f"Vento: {wind} km/h"
-    except Exception:
-        return "🌡️ N/D", "-"
-
-def get_forecast_for_date(date_str):
-    try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude=40.8518&longitude=14.2681&daily=weathercode,temperature_2m_max&timezone=auto&start_date={date_str}&end_date={date_str}"
-        response = urlopen(url)
-        data = json.loads(response.read())
-        if "daily" in data and "weathercode" in data["daily"]:
-            wcode = data["daily"]["weathercode"][0]
-            temp_max = data["daily"]["temperature_2m_max"][0]
-            return (wcode >= 51), temp_max
-    except Exception:
-        return False, None
-    return False, None
-
 # --- DB INIT ---
-def get_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
-
-def _ensure_column(conn, table: str, col: str, coldef: str):
-    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
-    if col not in cols:
-        conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {coldef}")
-
-def init_db():
-    conn = get_connection()
-    c = conn.cursor()
-
-    c.execute("""CREATE TABLE IF NOT EXISTS slots (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        data TEXT,
-        ora TEXT,
-        tema TEXT,
-        creator TEXT,
-        description TEXT,
-        is_confirmed INTEGER DEFAULT 1,
-        UNIQUE(data, ora)
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS bookings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        slot_id INTEGER,
-        nome_amico TEXT,
-        note TEXT,
-        plus_one INTEGER DEFAULT 0,
-        nome_plus_one TEXT,
-        tieni_status INTEGER DEFAULT 0,
-        FOREIGN KEY(slot_id) REFERENCES slots(id)
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS donazioni (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        donatore TEXT,
-        importo REAL,
-        username TEXT
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS goal (
-        id INTEGER PRIMARY KEY,
-        description TEXT,
-        target REAL,
-        current REAL
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS users (
-        username TEXT PRIMARY KEY,
-        password TEXT,
-        role TEXT
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS bringing (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        slot_id INTEGER,
-        username TEXT,
-        item TEXT
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS waitlist (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        slot_id INTEGER,
-        username TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS event_messages (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        slot_id INTEGER,
-        username TEXT,
-        message TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )""")
-
-    # Goal init
-    if c.execute("SELECT count(*) FROM goal").fetchone()[0] == 0:
-        c.execute("INSERT INTO goal (id, description, target, current) VALUES (1, 'Fondo Serate', 100.0, 0.0)")
-
-    # Safe migrations
-    try: _ensure_column(conn, "bookings", "nome_plus_one", "TEXT")
-    except Exception: pass
-    try: _ensure_column(conn, "bookings", "tieni_status", "INTEGER DEFAULT 0")
-    except Exception: pass
-    try: _ensure_column(conn, "slots", "creator", "TEXT")
-    except Exception: pass
-    try: _ensure_column(conn, "slots", "description", "TEXT")
-    except Exception: pass
-    try: _ensure_column(conn, "slots", "is_confirmed", "INTEGER DEFAULT 1")
-    except Exception: pass
-    try: _ensure_column(conn, "donazioni", "username", "TEXT")
-    except Exception: pass
-    try: _ensure_column(conn, "users", "role", "TEXT")
-    except Exception: pass
-
-    conn.commit()
-    conn.close()
-
-init_db()
-
-# --- RUOLI ---
-def assign_user_role(username, role):
-    conn = get_connection()
-    conn.execute("UPDATE users SET role = ? WHERE username = ?", (role, username))
-    conn.commit()
-    conn.close()
-
-def get_user_role_badge(username):
-    if not username:
-        return ""
-    conn = get_connection()
-    role = conn.execute("SELECT role FROM users WHERE username = ?", (username,)).fetchone()
-    conn.close()
-
-    if role and role[0]:
-        r = role[0]
-        style = "background-color: #E0F2FE; color: #0284C7; border: 1px solid #7DD3FC;"
-        if "DJ" in r:
-            style = "background-color: #F3E8FF; color: #9333EA; border: 1px solid #D8B4FE;"
-        elif "Barman" in r:
-            style = "background-color: #FEF3C7; color: #D97706; border: 1px solid #FCD34D;"
-        elif "Admin" in r or "Boss" in r:
-            style = "background-color: #FEE2E2; color: #DC2626; border: 1px solid #FCA5A5;"
-        elif "VIP" in r or "Re" in r:
-            style = "background: linear-gradient(45deg, #FFD700, #FDB931); color: #FFF; text-shadow: 0 1px 2px rgba(0,0,0,0.2);"
-        return f"<span class='role-badge' style='{style}'>{r}</span>"
-    return ""
-
-# --- UTILS ---
-def is_user_booked(slot_id, username):
-    if not username:
-        return False
-    conn = get_connection()
-    res = conn.execute(
-        "SELECT count(*) FROM bookings WHERE slot_id=? AND nome_amico=?",
-        (slot_id, username),
-    ).fetchone()[0]
-    conn.close()
-    return res > 0
-
-def _parse_event_datetime(date_str: str, time_str: str):
-    # Supporta sia "20:00" che "20:00:00"
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
-        try:
-            return datetime.datetime.strptime(f"{date_str} {time_str}", fmt)
-        except Exception:
-            pass
-    return None
-
-def cleanup_past_events():
-    conn = get_connection()
-    slots = conn.execute("SELECT id, data, ora FROM slots").fetchall()
-    now = datetime.datetime.now()
-    deleted = False
-
-    for sid, d, o in slots:
-        event_dt = _parse_event_datetime(d, o)
-        if event_dt and now > event_dt:
-            conn.execute("DELETE FROM bookings WHERE slot_id=?", (sid,))
-            conn.execute("DELETE FROM bringing WHERE slot_id=?", (sid,))
-            conn.execute("DELETE FROM waitlist WHERE slot_id=?", (sid,))
-            conn.execute("DELETE FROM event_messages WHERE slot_id=?", (sid,))
-            conn.execute("DELETE FROM slots WHERE id=?", (sid,))
-            deleted = True
-
-    if deleted:
-        conn.commit()
-    conn.close()
-
-def get_total_donations():
-    conn = get_connection()
-    res = conn.execute("SELECT SUM(importo) FROM donazioni").fetchone()[0]
-    conn.close()
-    return float(res) if res else 0.0
-
-def get_target():
-    conn = get_connection()
-    res = conn.execute("SELECT target, description FROM goal WHERE id=1").fetchone()
-    conn.close()
-    return res
-
-def add_donation(nome, importo, username=None):
-    conn = get_connection()
-    conn.execute(
-        "INSERT INTO donazioni (donatore, importo, username) VALUES (?, ?, ?)",
-        (nome, float(importo), username),
-    )
-    conn.commit()
-    conn.close()
-
-def create_user(username, password):
-    conn = get_connection()
-    try:
-        conn.execute(
-            "INSERT INTO users (username, password) VALUES (?, ?)",
-            (username, make_hashes(password)),
-        )
-        conn.commit()
-        conn.close()
-        return True
-    except Exception:
-        conn.close()
-        return False
-
-def login_user(username, password):
-    conn = get_connection()
-    data = conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
-    conn.close()
-    if data:
-        return check_hashes(password, data[0])
-    return False
+migrate()
 
 # --- FAST TRACK ---
-def get_next_available_slot():
-    conn = get_connection()
-    slot = conn.execute(
-        "SELECT id, data, ora, tema FROM slots WHERE is_confirmed=1 ORDER BY data, ora LIMIT 1"
-    ).fetchone()
-    conn.close()
-
-    if slot:
-        conn = get_connection()
-        taken = conn.execute(
-            "SELECT count(*) + COALESCE(sum(plus_one),0) FROM bookings WHERE slot_id=?",
-            (slot[0],),
-        ).fetchone()[0] or 0
-        conn.close()
-        if taken < 10:
-            return slot
-    return None
+# Pagina a sé: solo lo stile che le serve, niente CSS globale né pulizia (vedi main)
+FAST_TRACK_CSS = """
+<style>
+[data-testid="stSidebar"] {display: none;}
+.block-container {max-width: 600px; padding-top: 2rem;}
+.fast-track-box {
+    text-align: center;
+    padding: 2rem;
+    background: linear-gradient(135deg, #ffffff 0%, #f0f9ff 100%);
+    border: 2px solid #3b82f6;
+    border-radius: 24px;
+    box-shadow: 0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
+    margin-bottom: 2rem;
+}
+.fast-track-title {
+    font-size: 1.5rem;
+    font-weight: 800;
+    color: #1e3a8a;
+    margin-bottom: 0.5rem;
+}
+</style>
+"""
+
+def is_fast_track():
+    return st.query_params.get("action") == "fastjoin"
+
+def leave_fast_track():
+    st.session_state.pop("fast_join", None)
+    st.query_params.clear()
+    st.rerun()
 
 def handle_fast_track():
-    if "action" in st.query_params and st.query_params["action"] == "fastjoin":
-        st.markdown(
-            """<style>[data-testid="stSidebar"] {display: none;} .block-container {max-width: 600px; padding-top: 2rem;}</style>""",
-            unsafe_allow_html=True,
-        )
-        slot = get_next_available_slot()
+    if is_fast_track():
+        st.markdown(FAST_TRACK_CSS, unsafe_allow_html=True)
+        # Una sola prenotazione per sessione: i rerun (dettagli, +1) non riprenotano su un altro evento
+        res = None
+        if st.session_state.logged_in:
+            if "fast_join" not in st.session_state:
+                st.session_state["fast_join"] = service.fast_join(st.session_state.username)
+            slot, res = st.session_state["fast_join"]
+        else:
+            slot = service.next_open_slot()
         st.markdown('<div class="fast-track-box">', unsafe_allow_html=True)
         st.markdown('<div class="fast-track-title">🚀 Fast Booking Terrazzo</div>', unsafe_allow_html=True)
 
         if not slot:
             st.error("Nessun evento disponibile o posti esauriti! 😔")
             if st.button("Vai alla Home"):
-                st.query_params.clear()
-                st.rerun()
+                leave_fast_track()
             st.markdown("</div>", unsafe_allow_html=True)
             return True
 
@@ -444,18 +207,13 @@ def handle_fast_track():
         st.info(f"Prossimo Evento:\n\n**{s_t}**\n\n📅 {s_d} ore {s_o}")
 
         if st.session_state.logged_in:
-            if is_user_booked(sid, st.session_state.username):
+            if res == "ALREADY_BOOKED":
                 st.success(f"✅ Sei già prenotato, {st.session_state.username}!")
-            else:
-                conn = get_connection()
-                conn.execute(
-                    "INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status) VALUES (?, ?, ?, 0, '', 1)",
-                    (sid, st.session_state.username, "Fast Booking ⚡"),
-                )
-                conn.commit()
-                conn.close()
+            elif res == "OK":
                 st.balloons()
                 st.success(f"✅ Prenotazione Confermata per {st.session_state.username}!")
+            else:
+                st.error("Posti appena esauriti! 😔")
 
             st.write("---")
             with st.expander("📝 Aggiungi +1 o Note (Opzionale)"):
@@ -466,32 +224,20 @@ def handle_fast_track():
                     if p1:
                         np1 = st.text_input("Nome +1")
                     if st.form_submit_button("Salva Dettagli"):
-                        conn = get_connection()
-                        conn.execute(
-                            "UPDATE bookings SET note=?, plus_one=?, nome_plus_one=? WHERE slot_id=? AND nome_amico=?",
-                            (note, 1 if p1 else 0, np1, sid, st.session_state.username),
-                        )
-                        conn.commit()
-                        conn.close()
-                        st.toast("Salvato!")
+                        if service.update_booking(sid, st.session_state.username, note, p1, np1).ok:
+                            st.toast("Salvato!")
+                        else:
+                            st.error("Posti finiti per il +1.")
 
             if st.button("Vai alla Home"):
-                st.query_params.clear()
-                st.rerun()
+                leave_fast_track()
         else:
             st.write("Chi sei?")
             with st.form("fast_login_form"):
                 name = st.text_input("Il tuo nome", placeholder="Es. Marco")
                 if st.form_submit_button("Ci sono! 🚀"):
                     if name:
-                        conn = get_connection()
-                        exists = conn.execute(
-                            "SELECT count(*) FROM users WHERE username=?",
-                            (name,),
-                        ).fetchone()[0]
-                        conn.close()
-                        if not exists:
-                            create_user(name, "terrazzo")
+                        service.ensure_user(name, "terrazzo")
                         st.session_state.logged_in = True
                         st.session_state.username = name
                         st.rerun()
@@ -513,7 +259,7 @@ def auth_section():
             username = st.text_input("Username")
             password = st.text_input("Password", type="password")
             if st.form_submit_button("Entra"):
-                if login_user(username, password):
+                if service.login_user(username, password):
                     st.session_state.logged_in = True
                     st.session_state.username = username
                     st.success("Accesso effettuato!")
@@ -526,88 +272,124 @@ def auth_section():
             new_user = st.text_input("Scegli un Username")
             new_pass = st.text_input("Scegli una Password", type="password")
             if st.form_submit_button("Crea Account"):
-                if create_user(new_user, new_pass):
+                if service.create_user(new_user, new_pass).ok:
                     st.success("Account creato! Vai su Accedi.")
                 else:
                     st.error("Username già in uso.")
 
+# --- CHAT EVENTO ---
+CHAT_POLL_SECONDS = 3
+
+def rerun_fragment():
+    # Dentro un frammento ridisegna solo quello; durante un run completo dell'app si riesegue tutto
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def chat_opened(slot_id):
+    # Una chat aperta alla volta: un solo frammento che interroga il database ogni CHAT_POLL_SECONDS
+    if not st.session_state.get(f"chat_open_{slot_id}"): return
+    for key in [k for k in st.session_state if k.startswith("chat_open_") and k != f"chat_open_{slot_id}"]:
+        st.session_state[key] = False
+
+@st.fragment(run_every=CHAT_POLL_SECONDS)
+def chat_fragment(slot_id):
+    # Solo la chat si aggiorna: ultimi messaggi all'apertura, poi solo quelli con id > ultimo visto
+    # (e la finestra riletta se qualcuno ha cancellato)
+    key = f"chat_view_{slot_id}"
+    view = st.session_state.get(key)
+    if view is None:
+        view = st.session_state[key] = service.open_chat(slot_id)
+    else:
+        service.refresh_chat(view)
+
+    if view.has_older and st.button("⬆️ Messaggi precedenti", key=f"older_{slot_id}"):
+        service.load_older(view); rerun_fragment()
+
+    for m in view.messages:
+        is_me = m.username == st.session_state.username
+        align = "right" if is_me else "left"
+        bubble = "me" if is_me else "other"
+        role_html = role_badge_html(m.role)
+        st.markdown(
+            f"<div style='overflow:hidden; padding:2px;'><div style='float:{align};' class='chat-bubble {bubble}'><b>{m.username} {role_html}:</b> {m.message}</div></div>",
+            unsafe_allow_html=True,
+        )
+        if is_me:
+            if st.button("🗑️", key=f"del_msg_my_{m.id}"):
+                service.remove_message(view, m.id, st.session_state.username)
+                rerun_fragment()
+
+    c_msg, c_send = st.columns([4, 1])
+    new_msg = c_msg.text_input("Messaggio...", key=f"chat_{slot_id}", label_visibility="collapsed")
+    if c_send.button("Invia", key=f"snd_{slot_id}"):
+        if service.send_message(slot_id, st.session_state.username, new_msg).ok:
+            rerun_fragment()
+
+# --- RICERCA ---
+def search_results(key, admin=False):
+    text = st.text_input("Cerca", key=f"{key}_q", placeholder="es. cassa, compleanno, chi porta il ghiaccio…")
+    # Nuova ricerca = prima pagina
+    if st.session_state.get(f"{key}_last") != text:
+        st.session_state[f"{key}_last"] = text
+        st.session_state[f"{key}_page"] = 0
+    page = st.session_state.get(f"{key}_page", 0)
+    if not text.strip():
+        return
+
+    hits, has_more = search(text, username=st.session_state.username, admin=admin, page=page)
+    if not hits:
+        st.info("Nessun risultato.")
+    for h in hits:
+        with st.container(border=True):
+            who = f" · {h.username}" if h.username else ""
+            st.caption(f"{KIND_LABELS[h.kind]} · {h.data} · {h.tema}{who}")
+            st.markdown(h.snippet, unsafe_allow_html=True)
+
+    c_prev, c_page, c_next = st.columns([1, 2, 1])
+    if page > 0 and c_prev.button("⬅️", key=f"{key}_prev"):
+        st.session_state[f"{key}_page"] = page - 1; st.rerun()
+    c_page.caption(f"Pagina {page + 1}")
+    if has_more and c_next.button("➡️", key=f"{key}_next"):
+        st.session_state[f"{key}_page"] = page + 1; st.rerun()
+
+def search_section():
+    st.markdown('<div class="admin-card">', unsafe_allow_html=True)
+    st.title("Cerca 🔎")
+    st.caption("Chat dei tuoi eventi, titoli e descrizioni degli eventi, cose da portare.")
+    search_results("search")
+    st.markdown("</div>", unsafe_allow_html=True)
+
 def my_bookings_section():
     st.markdown('<div class="admin-card">', unsafe_allow_html=True)
     st.title("Le mie Prenotazioni 📅")
 
-    conn = get_connection()
-    my_books = conn.execute(
-        """
-        SELECT s.data, s.ora, s.tema, b.plus_one, b.nome_plus_one, b.note, b.id, s.id, s.is_confirmed
-        FROM bookings b JOIN slots s ON b.slot_id = s.id
-        WHERE b.nome_amico = ? ORDER BY s.data, s.ora
-        """,
-        (st.session_state.username,),
-    ).fetchall()
-    conn.close()
+    my_books = service.my_bookings(st.session_state.username)
 
     if my_books:
         for b in my_books:
-            data, ora, tema, p1, np1, note, bid, slot_id, is_conf = b
             with st.container(border=True):
                 c1, c2 = st.columns([4, 1])
                 with c1:
-                    status_text = " (⏳ IN ATTESA DI APPROVAZIONE)" if is_conf == 0 else ""
-                    st.subheader(f"{data} | {ora}{status_text}")
-                    st.markdown(f"**{tema}**")
-                    if p1:
-                        st.caption(f"👯 +1: {np1}")
-                    if note:
-                        st.caption(f"📝 {note}")
+                    status_text = "" if b.is_confirmed else " (⏳ IN ATTESA DI APPROVAZIONE)"
+                    st.subheader(f"{b.data} | {b.ora}{status_text}")
+                    st.markdown(f"**{b.tema}**")
+                    if b.plus_one:
+                        st.caption(f"👯 +1: {b.nome_plus_one}")
+                    if b.note:
+                        st.caption(f"📝 {b.note}")
                 with c2:
                     st.write("")
-                    if st.button("Disdici", key=f"cancel_my_{bid}"):
-                        conn = get_connection()
-                        conn.execute("DELETE FROM bookings WHERE id=?", (bid,))
-                        conn.commit()
-                        conn.close()
+                    if st.button("Disdici", key=f"cancel_my_{b.id}"):
+                        service.cancel_booking(b.id, st.session_state.username)
                         st.toast("Cancellata.")
                         st.rerun()
 
-                if is_conf == 1:
-                    with st.expander("💬 Apri Chat"):
-                        conn = get_connection()
-                        msgs = conn.execute(
-                            "SELECT id, username, message FROM event_messages WHERE slot_id=? ORDER BY id",
-                            (slot_id,),
-                        ).fetchall()
-                        conn.close()
-
-                        if msgs:
-                            for msg_id, user, message in msgs:
-                                is_me = user == st.session_state.username
-                                align = "right" if is_me else "left"
-                                bubble = "me" if is_me else "other"
-                                role_html = get_user_role_badge(user)
-                                st.markdown(
-                                    f"<div style='overflow:hidden; padding:2px;'><div style='float:{align};' class='chat-bubble {bubble}'><b>{user} {role_html}:</b> {message}</div></div>",
-                                    unsafe_allow_html=True,
-                                )
-                                if is_me:
-                                    if st.button("🗑️", key=f"del_msg_my_{msg_id}"):
-                                        conn = get_connection()
-                                        conn.execute("DELETE FROM event_messages WHERE id=?", (msg_id,))
-                                        conn.commit()
-                                        conn.close()
-                                        st.rerun()
-
-                        c_msg, c_send = st.columns([4, 1])
-                        new_msg = c_msg.text_input("Messaggio...", key=f"chat_{slot_id}", label_visibility="collapsed")
-                        if c_send.button("Invia", key=f"snd_{slot_id}"):
-                            if new_msg.strip():
-                                conn = get_connection()
-                                conn.execute(
-                                    "INSERT INTO event_messages (slot_id, username, message) VALUES (?, ?, ?)",
-                                    (slot_id, st.session_state.username, new_msg.strip()),
-                                )
-                                conn.commit()
-                                conn.close()
-                                st.rerun()
+                if b.is_confirmed:
+                    # Il frammento della chat (e il suo polling) esiste solo per la chat aperta
+                    with st.expander("💬 Apri Chat", key=f"chat_open_{b.slot_id}", on_change=chat_opened, args=(b.slot_id,)) as chat_box:
+                        if chat_box.open: chat_fragment(b.slot_id)
                 else:
                     st.info("Chat bloccata: evento in attesa.")
     else:
@@ -638,39 +420,14 @@ def birthday_section():
             if not paid:
                 st.error("Devi confermare di aver inviato il contributo di 5€!")
             else:
-                try:
-                    conn = get_connection()
-                    cur = conn.cursor()
-                    cur.execute(
-                        "INSERT INTO slots (data, ora, tema, creator, description, is_confirmed) VALUES (?, ?, ?, ?, ?, 0)",
-                        (str(b_date), str(b_time), b_theme, st.session_state.username, b_desc),
-                    )
-                    sid = cur.lastrowid
-
-                    # Festeggiato
-                    cur.execute(
-                        "INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status) VALUES (?, ?, ?, ?, ?, ?)",
-                        (sid, st.session_state.username, "Festeggiato 👑", 0, "", 1),
-                    )
-
-                    # Ospiti generici
-                    for i in range(int(guest_count)):
-                        g_name = f"Ospite {i+1} di {st.session_state.username}"
-                        cur.execute(
-                            "INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status) VALUES (?, ?, ?, ?, ?, ?)",
-                            (sid, g_name, "Invitato", 0, "", 1),
-                        )
-
-                    conn.commit()
-                    conn.close()
+                res = service.request_birthday(st.session_state.username, b_date, b_time, b_theme, b_desc, guest_count)
+                if res.ok:
                     st.success("Richiesta inviata! Attendi approvazione.")
                     st.info("Il tuo evento è in attesa. L'Admin confermerà la ricezione del pagamento.")
                     time.sleep(1)
                     st.rerun()
-                except sqlite3.IntegrityError:
+                else:
                     st.error("Esiste già un evento in questa data e ora!")
-                except Exception as e:
-                    st.error(f"Errore: {e}")
     st.markdown("</div>", unsafe_allow_html=True)
 
 def admin_section():
@@ -678,11 +435,19 @@ def admin_section():
     if st.text_input("Password", type="password") == "admin123":
         st.success("Accesso Admin")
 
-        tab_cassa, tab_ruoli, tab_crea, tab_gestione, tab_link = st.tabs(
-            ["💰 Cassa", "👥 Ruoli", "➕ Crea", "📅 Eventi", "🔗 Link"]
+        # Radio al posto di st.tabs: le tab eseguono sempre tutte le query, qui gira solo la sezione scelta
+        section = st.radio(
+            "Sezione",
+            ["💰 Cassa", "👥 Ruoli", "➕ Crea", "📅 Eventi", "🔗 Link", "🔎 Cerca"],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="adm_section",
         )
 
-        with tab_link:
+        if section == "🔎 Cerca":
+            search_results("adm_search", admin=True)
+
+        elif section == "🔗 Link":
             st.markdown('<div class="admin-section">', unsafe_allow_html=True)
             st.markdown('<div class="admin-section-title">Generatore Link WhatsApp</div>', unsafe_allow_html=True)
             st.info("Incolla qui il link base della tua app (es. Streamlit) per creare il fastjoin.")
@@ -695,16 +460,32 @@ def admin_section():
                 st.code(final_link, language="text")
             st.markdown("</div>", unsafe_allow_html=True)
 
-        with tab_ruoli:
+            with st.expander("🛠️ Diagnostica DB"):
+                stats = connection_stats()
+                c_o, c_r, c_l, c_s = st.columns(4)
+                c_o.metric("Connessioni aperte", stats["opened"])
+                c_r.metric("Riutilizzi", stats["reused"])
+                c_l.metric("Libere nel pool", stats["idle"])
+                c_s.metric("Statement", stats["statements"])
+                w = live_weather().stats()
+                last = datetime.datetime.fromtimestamp(w["last_refresh"]).strftime("%H:%M:%S") if w["last_refresh"] else "mai"
+                st.caption(f"Meteo live: ultimo aggiornamento {last}, errori {w['failures']} ({w['consecutive_failures']} consecutivi)")
+                snap = snapshot_stats()
+                st.caption(f"Tavoli blackjack: {snap['hits']} snapshot condivisi, {snap['misses']} letture dal DB")
+                rc = role_cache_stats()
+                st.caption(f"Cache ruoli: {rc['hits']} hit, {rc['misses']} caricamenti, {rc['invalidations']} invalidazioni")
+                ft = fast_track_stats()
+                st.caption(f"Fast track: {ft['hits']} hit, {ft['misses']} letture, {ft['invalidations']} invalidazioni")
+
+        elif section == "👥 Ruoli":
             st.markdown('<div class="admin-section">', unsafe_allow_html=True)
             st.markdown('<div class="admin-section-title">Assegna Titoli e Ruoli</div>', unsafe_allow_html=True)
 
-            conn = get_connection()
-            all_users = [u[0] for u in conn.execute("SELECT username FROM users").fetchall()]
-            conn.close()
+            users = service.all_users()
+            usernames = [u for u, _ in users]
 
             c_u, c_r, c_b = st.columns([2, 2, 1])
-            sel_user = c_u.selectbox("Seleziona Utente", all_users if all_users else [""])
+            sel_user = c_u.selectbox("Seleziona Utente", usernames if usernames else [""])
             sel_role = c_r.selectbox(
                 "Scegli Ruolo",
                 ["🎧 DJ", "🍹 Barman", "📸 Fotografo", "🛡️ Security", "👑 Re del Terrazzo", "🧹 Addetto Pulizie", "🍕 Responsabile Cibo", "Nessuno"],
@@ -712,95 +493,91 @@ def admin_section():
 
             if c_b.button("Assegna Ruolo") and sel_user:
                 role_to_save = sel_role if sel_role != "Nessuno" else None
-                assign_user_role(sel_user, role_to_save)
+                service.set_role(sel_user, role_to_save)
                 st.success(f"Assegnato {sel_role} a {sel_user}")
                 st.rerun()
 
             st.divider()
             st.caption("Utenti con ruoli attivi:")
-            conn = get_connection()
-            users_with_roles = conn.execute("SELECT username, role FROM users WHERE role IS NOT NULL").fetchall()
-            conn.close()
-            for u, r in users_with_roles:
-                st.write(f"- **{u}**: {r}")
+            for u, r in users:
+                if r: st.write(f"- **{u}**: {r}")
             st.markdown("</div>", unsafe_allow_html=True)
 
-        with tab_cassa:
-            conn = get_connection()
-            tot = conn.execute("SELECT COALESCE(SUM(importo),0) FROM donazioni").fetchone()[0] or 0
-            tgt = conn.execute("SELECT target FROM goal WHERE id=1").fetchone()[0]
-            conn.close()
+        elif section == "💰 Cassa":
+            goals = {x.id: x for x in service.list_goals()}
+            gid = st.selectbox("Obiettivo", list(goals), format_func=lambda i: goals[i].description + ("" if goals[i].active else " (chiuso)"), key="adm_goal")
+            g = goals[gid]
             c1, c2 = st.columns(2)
-            c1.metric("Totale", f"{tot}€")
-            c2.metric("Target", f"{tgt}€")
+            c1.metric("Totale", f"{g.current}€")
+            c2.metric("Target", f"{g.target}€")
+            st.progress(g.progress)
+            if st.button("🔒 Chiudi obiettivo" if g.active else "🔓 Riapri obiettivo", key=f"goal_active_{g.id}"):
+                service.toggle_goal(g.id, not g.active)
+                st.rerun()
 
             with st.expander("Aggiungi Donazione"):
                 dn = st.text_input("Nome")
                 di = st.number_input("Euro", step=1.0)
                 if st.button("Salva Donazione"):
-                    add_donation(dn, di, st.session_state.username if st.session_state.get("logged_in") else None)
+                    service.donate(dn, di, st.session_state.username if st.session_state.get("logged_in") else None, g.id)
                     st.toast("Salvato")
                     st.rerun()
 
             with st.expander("Gestione Donatori"):
-                conn = get_connection()
-                dons = conn.execute("SELECT id, donatore, importo FROM donazioni ORDER BY id DESC").fetchall()
-                conn.close()
+                dons = service.recent_donations(g.id)
                 if dons:
-                    for did, donatore, importo in dons:
+                    for d in dons:
                         c_nm, c_val, c_del = st.columns([3, 2, 1])
-                        c_nm.write(donatore)
-                        c_val.write(f"{importo}€")
-                        if c_del.button("❌", key=f"del_d_{did}"):
-                            conn = get_connection()
-                            conn.execute("DELETE FROM donazioni WHERE id=?", (did,))
-                            conn.commit()
-                            conn.close()
+                        c_nm.write(d.donatore)
+                        c_val.write(f"{d.importo}€")
+                        if c_del.button("❌", key=f"del_d_{d.id}"):
+                            service.remove_donation(d.id)
                             st.rerun()
 
-        with tab_crea:
+            with st.expander("📊 Riepilogo"):
+                c_don, c_mon = st.columns(2)
+                c_don.caption("Top donatori")
+                for donor, total, n in service.donor_totals(g.id, limit=10):
+                    c_don.write(f"**{donor or 'Anonimo'}**: {total}€ ({n})")
+                c_mon.caption("Per mese")
+                for month, total, n in service.month_totals(g.id):
+                    c_mon.write(f"**{month or 'Prima del registro'}**: {total}€ ({n})")
+
+            with st.expander("Nuovo Obiettivo"):
+                gd = st.text_input("Descrizione", key="goal_desc")
+                gt = st.number_input("Target (€)", min_value=1.0, value=100.0, step=10.0, key="goal_target")
+                if st.button("Crea Obiettivo") and service.new_goal(gd, gt).ok:
+                    st.success("Obiettivo creato")
+                    st.rerun()
+
+        elif section == "➕ Crea":
             c1, c2 = st.columns(2)
             d = c1.date_input("Data")
             t = c2.time_input("Ora", value=datetime.time(20, 0))
             th = st.text_input("Tema", "Aperitivo")
+            cap = st.number_input("Posti", min_value=1, value=DEFAULT_CAPACITY, step=1)
             if st.button("Crea Evento (Admin)"):
-                try:
-                    conn = get_connection()
-                    conn.execute(
-                        "INSERT INTO slots (data, ora, tema, creator, is_confirmed) VALUES (?, ?, ?, ?, 1)",
-                        (str(d), str(t), th, "Admin"),
-                    )
-                    conn.commit()
-                    conn.close()
+                if service.create_event(d, t, th, "Admin", int(cap)).ok:
                     st.toast("Creato!", icon="✅")
                     time.sleep(0.5)
                     st.rerun()
-                except Exception:
-                    st.error("Esiste già o errore DB.")
+                else:
+                    st.error("Esiste già un evento in questa data e ora!")
 
-        with tab_gestione:
+        elif section == "📅 Eventi":
             st.markdown("### 🔔 Richieste Pending")
-            conn = get_connection()
-            pending = conn.execute("SELECT id, data, ora, tema, creator FROM slots WHERE is_confirmed=0").fetchall()
-            conn.close()
+            pending = service.pending_events()
             if pending:
-                for sid, d, o, tema, creator in pending:
+                for pe in pending:
                     with st.container(border=True):
-                        st.write(f"**{tema}** ({d} {o}) di *{creator}*")
+                        st.write(f"**{pe.tema}** ({pe.data} {pe.ora}) di *{pe.creator}*")
                         c_ok, c_no = st.columns(2)
-                        if c_ok.button("✅ Approva", key=f"ok_{sid}"):
-                            conn = get_connection()
-                            conn.execute("UPDATE slots SET is_confirmed=1 WHERE id=?", (sid,))
-                            conn.commit()
-                            conn.close()
+                        if c_ok.button("✅ Approva", key=f"ok_{pe.id}"):
+                            service.approve_event(pe.id)
                             st.success("Evento approvato!")
                             st.rerun()
-                        if c_no.button("❌ Rifiuta", key=f"no_{sid}"):
-                            conn = get_connection()
-                            conn.execute("DELETE FROM bookings WHERE slot_id=?", (sid,))
-                            conn.execute("DELETE FROM slots WHERE id=?", (sid,))
-                            conn.commit()
-                            conn.close()
+                        if c_no.button("❌ Rifiuta", key=f"no_{pe.id}"):
+                            service.delete_event(pe.id)
                             st.warning("Richiesta cancellata.")
                             st.rerun()
             else:
@@ -808,36 +585,33 @@ def admin_section():
 
             st.divider()
             st.markdown("### 📅 Eventi Attivi")
-            conn = get_connection()
-            slots = conn.execute("SELECT id, data, ora, tema, creator, is_confirmed FROM slots ORDER BY data, ora").fetchall()
-            conn.close()
-
-            for sid, d, o, tema, creator, conf in slots:
-                lbl = " (PENDING)" if conf == 0 else ""
-                with st.expander(f"{d} {o} - {tema} ({creator}){lbl}"):
-                    conn = get_connection()
-                    parts = conn.execute(
-                        "SELECT id, nome_amico, note, plus_one, nome_plus_one FROM bookings WHERE slot_id=?",
-                        (sid,),
-                    ).fetchall()
-                    conn.close()
-
-                    if parts:
+            c_since, c_page = st.columns([2, 1])
+            since = c_since.date_input("Dal", value=datetime.date.today(), key="adm_ev_since")
+            # Nuovo filtro = prima pagina
+            if st.session_state.get("adm_ev_since_last") != since:
+                st.session_state["adm_ev_since_last"] = since
+                st.session_state["adm_ev_page"] = 0
+            ev_page = service.load_admin_events(f"{since} 00:00:00", st.session_state.get("adm_ev_page", 0))
+            c_page.caption(f"Pagina {ev_page.page + 1}")
+            if not ev_page.events:
+                st.caption("Nessun evento da questa data.")
+
+            for ev in ev_page.events:
+                lbl = "" if ev.is_confirmed else " (PENDING)"
+                with st.expander(f"{ev.data} {ev.ora} - {ev.tema} ({ev.creator}) · {ev.taken}/{ev.capacity}{lbl}"):
+                    if ev.participants:
                         st.write("👥 **Partecipanti:**")
-                        for bid, bname, bnote, bp1, bnp1 in parts:
+                        for p in ev.participants:
                             c_info, c_del = st.columns([5, 1])
-                            info_str = f"**{bname}**"
-                            if bp1:
-                                info_str += f" (+1: {bnp1})"
-                            if bnote:
-                                info_str += f" | 📝 {bnote}"
+                            info_str = f"**{p.username}**"
+                            if p.plus_one:
+                                info_str += f" (+1: {p.nome_plus_one})"
+                            if p.note:
+                                info_str += f" | 📝 {p.note}"
                             c_info.markdown(f"- {info_str}")
-                            if c_del.button("❌", key=f"adm_del_user_{bid}", help="Rimuovi partecipante"):
-                                conn = get_connection()
-                                conn.execute("DELETE FROM bookings WHERE id=?", (bid,))
-                                conn.commit()
-                                conn.close()
-                                st.toast(f"Rimosso {bname}")
+                            if c_del.button("❌", key=f"adm_del_user_{p.id}", help="Rimuovi partecipante"):
+                                service.cancel_booking(p.id)
+                                st.toast(f"Rimosso {p.username}")
                                 st.rerun()
                         st.divider()
                     else:
@@ -845,132 +619,94 @@ def admin_section():
 
                     st.divider()
                     st.write("🛠️ **Gestione & Modifica**")
-                    with st.form(key=f"edit_event_{sid}"):
+                    with st.form(key=f"edit_event_{ev.id}"):
                         col_edit_1, col_edit_2 = st.columns(2)
-                        try:
-                            date_val = datetime.datetime.strptime(d, "%Y-%m-%d").date()
-                        except Exception:
-                            date_val = datetime.date.today()
-
-                        # Support HH:MM:SS and HH:MM
-                        time_val = datetime.time(20, 0)
-                        for tfmt in ("%H:%M:%S", "%H:%M"):
-                            try:
-                                time_val = datetime.datetime.strptime(o, tfmt).time()
-                                break
-                            except Exception:
-                                pass
+                        start_dt = parse_starts_at(ev.starts_at)
+                        date_val = start_dt.date() if start_dt else datetime.date.today()
+                        time_val = start_dt.time() if start_dt else datetime.time(20, 0)
 
                         new_d = col_edit_1.date_input("Data", value=date_val)
                         new_t = col_edit_2.time_input("Ora", value=time_val)
-                        new_thm = st.text_input("Tema", value=tema)
+                        new_thm = st.text_input("Tema", value=ev.tema)
+                        # La capienza non può scendere sotto i posti già occupati
+                        min_cap = max(1, ev.taken)
+                        new_cap = st.number_input("Posti", min_value=min_cap, value=max(ev.capacity, min_cap), step=1)
 
                         if st.form_submit_button("💾 Salva Modifiche"):
-                            conn = get_connection()
-                            conn.execute(
-                                "UPDATE slots SET data=?, ora=?, tema=? WHERE id=?",
-                                (str(new_d), str(new_t), new_thm, sid),
-                            )
-                            conn.commit()
-                            conn.close()
-                            st.toast("Evento Modificato!", icon="✅")
-                            time.sleep(0.5)
-                            st.rerun()
+                            if service.edit_event(ev.id, new_d, new_t, new_thm, new_cap).ok:
+                                st.toast("Evento Modificato!", icon="✅")
+                                time.sleep(0.5)
+                                st.rerun()
+                            else:
+                                st.error("Esiste già un evento in questa data e ora!")
 
-                    if st.button("🗑️ Elimina Intero Evento", key=f"adm_del_ev_{sid}"):
-                        conn = get_connection()
-                        conn.execute("DELETE FROM bookings WHERE slot_id=?", (sid,))
-                        conn.execute("DELETE FROM slots WHERE id=?", (sid,))
-                        conn.commit()
-                        conn.close()
+                    if st.button("🗑️ Elimina Intero Evento", key=f"adm_del_ev_{ev.id}"):
+                        service.delete_event(ev.id)
                         st.rerun()
 
+            c_prev, _, c_next = st.columns([1, 2, 1])
+            if ev_page.page > 0 and c_prev.button("⬅️ Precedenti", key="adm_ev_prev"):
+                st.session_state["adm_ev_page"] = ev_page.page - 1; st.rerun()
+            if ev_page.has_more and c_next.button("Successivi ➡️", key="adm_ev_next"):
+                st.session_state["adm_ev_page"] = ev_page.page + 1; st.rerun()
+
 def user_section():
     st.title("Bacheca Eventi 🌇")
 
-    conn = get_connection()
-    slots = conn.execute(
-        "SELECT id, data, ora, tema, description FROM slots WHERE is_confirmed=1 ORDER BY data, ora"
-    ).fetchall()
-    conn.close()
-
-    if not slots:
+    board = service.load_board(st.session_state.username)
+    if not board.slots:
         st.warning("Nessun evento disponibile.")
         return
 
+    forecasts = get_forecasts(s.data for s in board.slots)
+
     cols = st.columns(2)
-    for idx, s in enumerate(slots):
-        sid, s_date, s_time, s_theme, s_desc = s
+    for idx, slot in enumerate(board.slots):
+        sid = slot.id
+        free = slot.free
 
         w_alert = ""
-        is_rain, t_max = get_forecast_for_date(s_date)
+        is_rain, t_max = forecasts.get(slot.data, (False, None))
         if is_rain:
             w_alert = "⚠️ Pioggia!"
         elif t_max is not None:
             w_alert = f"☀️ {t_max}°C"
 
-        conn = get_connection()
-        taken = conn.execute(
-            "SELECT count(*) + COALESCE(sum(plus_one),0) FROM bookings WHERE slot_id=?",
-            (sid,),
-        ).fetchone()[0] or 0
-        conn.close()
-        free = 10 - taken
-
         with cols[idx % 2]:
             with st.container(border=True):
-                st.caption(f"{s_date} ore {s_time}")
-                st.subheader(s_theme)
+                st.caption(f"{slot.data} ore {slot.ora}")
+                st.subheader(slot.tema)
                 if w_alert:
                     st.caption(w_alert)
-                if s_desc:
-                    st.caption(f"📝 {s_desc}")
+                if slot.description:
+                    st.caption(f"📝 {slot.description}")
 
                 if free > 0:
-                    st.success(f"Liberi: {free}/10")
+                    st.success(f"Liberi: {free}/{slot.capacity}")
 
                     with st.expander("🛍️ Spesa"):
-                        conn = get_connection()
-                        items = conn.execute(
-                            "SELECT username, item, id FROM bringing WHERE slot_id=?",
-                            (sid,),
-                        ).fetchall()
-                        conn.close()
-
-                        if items:
-                            for u, item, iid in items:
-                                c_t, c_d = st.columns([4, 1])
-                                c_t.write(f"{u}: {item}")
-                                if u == st.session_state.username:
-                                    if c_d.button("x", key=f"rd_{iid}"):
-                                        conn = get_connection()
-                                        conn.execute("DELETE FROM bringing WHERE id=?", (iid,))
-                                        conn.commit()
-                                        conn.close()
-                                        st.rerun()
+                        for it in slot.items:
+                            c_t, c_d = st.columns([4, 1])
+                            c_t.write(f"{it.username}: {it.item}")
+                            if it.username == st.session_state.username:
+                                if c_d.button("x", key=f"rd_{it.id}"):
+                                    service.remove_bring_item(it.id, st.session_state.username)
+                                    st.rerun()
 
                         if st.session_state.username:
                             ni = st.text_input("Porto...", key=f"bi_{sid}")
                             if st.button("Aggiungi", key=f"ba_{sid}"):
-                                if ni.strip():
-                                    conn = get_connection()
-                                    conn.execute(
-                                        "INSERT INTO bringing (slot_id, username, item) VALUES (?, ?, ?)",
-                                        (sid, st.session_state.username, ni.strip()),
-                                    )
-                                    conn.commit()
-                                    conn.close()
+                                if service.add_bring_item(sid, st.session_state.username, ni).ok:
                                     st.rerun()
 
                     with st.expander("🎟️ Prenota"):
-                        already = is_user_booked(sid, st.session_state.username)
-                        if already:
+                        if slot.booked:
                             st.info("✅ Sei già prenotato! Vai in 'I Miei Eventi' per la chat.")
                         elif not st.session_state.username:
                             st.warning("Accedi per prenotare.")
                         else:
                             with st.form(key=f"book_{sid}"):
-                                role_html = get_user_role_badge(st.session_state.username)
+                                role_html = role_badge_html(board.user_role)
                                 st.markdown(
                                     f"Prenota come: **{st.session_state.username}** {role_html}",
                                     unsafe_allow_html=True,
@@ -983,33 +719,24 @@ def user_section():
                                     np1 = st.text_input("Nome +1")
 
                                 if st.form_submit_button("Conferma"):
-                                    needed = 2 if p1 else 1
-                                    if free >= needed:
-                                        conn = get_connection()
-                                        conn.execute(
-                                            "INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status) VALUES (?, ?, ?, ?, ?, 1)",
-                                            (sid, st.session_state.username, note, 1 if p1 else 0, np1),
-                                        )
-                                        conn.commit()
-                                        conn.close()
+                                    res = service.book(sid, st.session_state.username, note, p1, np1).status
+                                    if res == "OK":
                                         st.snow()
                                         st.success("Prenotato! Vai su 'Le mie Prenotazioni' per la chat.")
                                         time.sleep(1)
                                         st.rerun()
+                                    elif res == "ALREADY_BOOKED":
+                                        st.info("✅ Sei già prenotato!")
                                     else:
                                         st.error("Posti finiti.")
                 else:
                     st.error("SOLD OUT")
                     if st.session_state.username:
                         if st.button("Waitlist", key=f"wl_{sid}"):
-                            conn = get_connection()
-                            conn.execute(
-                                "INSERT INTO waitlist (slot_id, username) VALUES (?, ?)",
-                                (sid, st.session_state.username),
-                            )
-                            conn.commit()
-                            conn.close()
-                            st.toast("Sei in lista d'attesa!")
+                            if service.join_waitlist(sid, st.session_state.username).ok:
+                                st.toast("Sei in lista d'attesa!")
+                            else:
+                                st.toast("Sei già in lista d'attesa.")
 
 # --- BLACKJACK (GATED) ---
 def blackjack_page():
@@ -1025,17 +752,18 @@ def blackjack_page():
 
 # --- MAIN ---
 def main():
-    local_css()
-    cleanup_past_events()
-
     if "logged_in" not in st.session_state:
         st.session_state.logged_in = False
     if "username" not in st.session_state:
         st.session_state.username = None
 
+    # Il link fastjoin arriva a tutti insieme: prima di CSS e pulizia globali
     if handle_fast_track():
         return
 
+    local_css()
+    cleanup_if_due()
+
     # Sidebar decorativa + menu
     with st.sidebar:
         if st.session_state.logged_in:
@@ -1055,7 +783,7 @@ def main():
         if st.session_state.logged_in:
             menu = st.radio(
                 "Navigazione",
-                ["🏠 Bacheca Eventi", "📅 I Miei Eventi", "🎂 Organizza Party", "🎰 Sala Giochi", "🔒 Area Admin"],
+                ["🏠 Bacheca Eventi", "📅 I Miei Eventi", "🔎 Cerca", "🎂 Organizza Party", "🎰 Sala Giochi", "🔒 Area Admin"],
                 label_visibility="collapsed",
             )
         else:
@@ -1066,16 +794,15 @@ def main():
             )
 
         st.divider()
-        temp_val, weather_desc = get_weather_napoli_live()
+        temp_val, weather_desc = live_weather().current()
         st.metric("Meteo Napoli", temp_val, weather_desc)
 
         st.markdown("<br>", unsafe_allow_html=True)
-        target, desc = get_target()
-        totale = get_total_donations()
-        st.markdown(f"**🎯 {desc}**")
-        progress_val = max(0.0, min(totale / float(target), 1.0)) if target else 0
-        st.progress(progress_val)
-        st.caption(f"Raccolti: {totale}€ su {target}€")
+        goal = service.primary_goal()
+        if goal:
+            st.markdown(f"**🎯 {goal.description}**")
+            st.progress(goal.progress)
+            st.caption(f"Raccolti: {goal.current}€ su {goal.target}€")
         st.link_button("💜 Supporta il progetto", LINK_REVOLUT, use_container_width=True)
 
         st.divider()
@@ -1092,6 +819,8 @@ def main():
         user_section()
     elif menu == "📅 I Miei Eventi":
         my_bookings_section()
+    elif menu == "🔎 Cerca":
+        search_section()
     elif menu == "🎂 Organizza Party":
         birthday_section()
     elif menu == "🎰 Sala Giochi":
@@ -1106,3 +835,6 @@ def main():
     elif menu == "🔒 Area Admin":
         admin_section()
 
+
+if __name__ == "__main__":
+    main()
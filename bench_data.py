@@ -0,0 +1,245 @@
+# bench_data.py
+# Dati di prova condivisi da benchmarks.py e tests/. generate(): database deterministico con lo schema di
+# terrazzo_vito.db a più scale: utenti, eventi futuri e passati, prenotazioni, lista spesa, chat (una molto
+# lunga), donazioni su più obiettivi. Stesso seed = stesso database. Le righe passano dai trigger veri
+# (posti, indice di ricerca, cassa), quindi i contatori sono coerenti come in produzione.
+# Più sotto: piccoli seed (eventi, giocatori, sessioni di blackjack), il contatore di statement e un finto Open-Meteo.
+import datetime
+import json
+import random
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import migrations
+from db import get_connection
+from events import now_ts
+
+ITEMS = ["ghiaccio", "birra", "patatine", "limoni", "casse bluetooth", "torta", "bicchieri", "pizza"]
+PHRASES = ["ci sono!", "porto io la cassa", "a che ora si sale?", "chi porta il ghiaccio?", "arrivo tardi",
+           "c'è posto per un +1?", "stasera si balla", "ho dimenticato le chiavi", "qualcuno passa da Vito?"]
+ROLES = ["🎧 DJ", "🍹 Barman", "📸 Fotografo", "🍕 Responsabile Cibo"]
+SLOTS_PER_DAY = 14  # orari 10:00-23:00: UNIQUE(data, ora) con più eventi al giorno
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    events: int  # eventi futuri confermati
+    history: int  # eventi passati, quelli che elimina cleanup_past_events
+    bookings: int  # su eventi futuri e passati
+    messages: int  # metà nella chat del primo evento futuro
+    donations: int
+    goals: int = 3
+
+
+SCALES = {
+    "small": Scale(users=60, events=10, history=10, bookings=100, messages=500, donations=100),
+    "medium": Scale(users=2_000, events=100, history=400, bookings=10_000, messages=20_000, donations=5_000),
+    "large": Scale(users=50_000, events=1_000, history=40_000, bookings=1_000_000, messages=300_000, donations=200_000),
+}
+
+
+def _slot_time(base, j, step):
+    # j-esimo evento a partire da base, SLOTS_PER_DAY al giorno, in avanti (step=1) o indietro (step=-1)
+    day = base + datetime.timedelta(days=step * (1 + j // SLOTS_PER_DAY))
+    return str(day), f"{10 + j % SLOTS_PER_DAY:02d}:00:00"
+
+
+def generate(path, scale, seed=1):
+    # Popola un database nuovo in path; restituisce i conteggi per riga
+    if isinstance(scale, str): scale = SCALES[scale]
+    rng = random.Random(seed)
+    migrations.migrate(path)
+    conn = get_connection(path)
+    today = datetime.date.today()
+    conn.execute("BEGIN")
+    try:
+        users = [f"sim{i}" for i in range(scale.users)]
+        conn.executemany("INSERT INTO users (username, password, role) VALUES (?, 'x', ?)",
+                         [(u, ROLES[i % len(ROLES)] if i % 25 == 0 else None) for i, u in enumerate(users)])
+
+        # Eventi: prima i futuri (ordine di starts_at), poi i passati
+        n_slots = scale.events + scale.history
+        per_slot, extra = divmod(scale.bookings, n_slots)
+        slots = []
+        for j in range(n_slots):
+            future = j < scale.events
+            d, o = _slot_time(today, j if future else j - scale.events, 1 if future else -1)
+            k = min(per_slot + (j < extra), scale.users)
+            names = rng.sample(users, k)
+            plus = [rng.random() < 0.1 for _ in names]
+            taken = k + sum(plus)
+            # Un evento futuro su tre è pieno: il fast track deve cercare oltre
+            capacity = taken if future and j % 3 == 0 and taken else taken + rng.randint(1, 10)
+            sid = conn.execute(
+                "INSERT INTO slots (data, ora, tema, creator, description, is_confirmed, capacity) VALUES (?, ?, ?, 'Admin', ?, 1, ?)",
+                (d, o, f"Serata {j}", rng.choice(PHRASES), capacity),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status) VALUES (?, ?, '', ?, ?, 1)",
+                [(sid, u, int(p), "amico" if p else "") for u, p in zip(names, plus)],
+            )
+            slots.append((sid, future, names))
+
+        future = [s for s in slots if s[1]]
+        conn.executemany("INSERT INTO bringing (slot_id, username, item) VALUES (?, ?, ?)",
+                         [(sid, rng.choice(names or users), rng.choice(ITEMS)) for sid, _, names in future for _ in range(3)])
+
+        # Chat: la metà dei messaggi nel primo evento futuro (la chat lunga), il resto sparso
+        longest = future[0][0] if future else slots[0][0]
+
+        def message(_):
+            sid = longest if rng.random() < 0.5 else rng.choice(slots)[0]
+            return sid, rng.choice(users), rng.choice(PHRASES)
+
+        conn.executemany("INSERT INTO event_messages (slot_id, username, message) VALUES (?, ?, ?)", map(message, range(scale.messages)))
+
+        for g in range(2, scale.goals + 1):
+            conn.execute("INSERT INTO goal (id, description, target, current, active) VALUES (?, ?, ?, 0, 1)", (g, f"Fondo {g}", 500.0))
+        donors = users[:max(1, scale.users // 10)]
+        conn.executemany(
+            "INSERT INTO donazioni (donatore, importo, username, goal_id, donated_at) VALUES (?, ?, ?, ?, ?)",
+            ((d, float(rng.randint(1, 50)), d, rng.randint(1, scale.goals),
+              now_ts(datetime.datetime.combine(today, datetime.time(20)) - datetime.timedelta(days=rng.randint(0, 720))))
+             for d in (rng.choice(donors) for _ in range(scale.donations))),
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    counts = {t: conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0]
+              for t in ("users", "slots", "bookings", "bringing", "event_messages", "donazioni")}
+    conn.close()
+    return counts
+
+
+# --- PICCOLI SEED ---
+def seed_events(n_events, bookings_per_event=6, items_per_event=3, start=None):
+    # n eventi confermati alle 20:00, uno al giorno da start (default domani), con prenotazioni userN e lista spesa
+    conn = get_connection()
+    start = start or datetime.date.today() + datetime.timedelta(days=1)
+    for i in range(n_events):
+        d = str(start + datetime.timedelta(days=i))
+        cur = conn.execute(
+            "INSERT INTO slots (data, ora, tema, creator, description, is_confirmed) VALUES (?, '20:00:00', ?, 'Admin', '', 1)",
+            (d, f"Evento {i}"),
+        )
+        sid = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status) VALUES (?, ?, '', ?, '', 1)",
+            [(sid, f"user{j}", j % 2) for j in range(bookings_per_event)],
+        )
+        conn.executemany(
+            "INSERT INTO bringing (slot_id, username, item) VALUES (?, ?, ?)",
+            [(sid, f"user{j}", f"item {j}") for j in range(items_per_event)],
+        )
+    conn.commit()
+    conn.close()
+
+
+def seat_players(bj, n, bet=10):
+    # n giocatori playerN al tavolo 1, con puntata principale e side bet
+    for i in range(n):
+        bj.join_blackjack(f"player{i}", 1)
+    conn = get_connection()
+    conn.execute("UPDATE bj_players SET bet_main=?, bet_pair=5, bet_21p3=5", (bet,))
+    conn.commit()
+    conn.close()
+    return [f"player{i}" for i in range(n)]
+
+
+def current_player(bj, table_id=1):
+    conn = get_connection()
+    user, _, h_idx = bj.get_current_turn(conn, table_id)
+    conn.close()
+    return user, h_idx
+
+
+def record_session(bj, players, rounds, seed):
+    # Sessione deterministica al tavolo 1: semi dei sabot e scelte dei giocatori dallo stesso generatore
+    from bj_cards import is_pair_for_split
+
+    conn = get_connection()
+    rng = random.Random(seed)
+    for _ in range(rounds):
+        conn.execute("UPDATE bj_players SET bankroll=2000 WHERE table_id=1 AND bankroll < 200")
+        conn.commit()
+        bj.start_game(1, seed=rng.getrandbits(63))
+        for _ in range(100):
+            status = conn.execute("SELECT status FROM bj_game WHERE id=1").fetchone()[0]
+            if status == "INSURANCE":
+                for (u,) in conn.execute("SELECT username FROM bj_players WHERE table_id=1 ORDER BY seat").fetchall():
+                    if rng.random() < 0.3: bj.player_insurance(u, 1, 5)
+                bj.close_insurance_phase(players[0], 1)
+                continue
+            if status != "PLAYING":
+                break
+            user, _, h_idx = bj.get_current_turn(conn, 1)
+            cards, score = conn.execute("SELECT cards, score FROM bj_hands WHERE username=? AND hand_index=?", (user, h_idx)).fetchone()
+            if is_pair_for_split(cards) and h_idx == 0 and rng.random() < 0.7:
+                if bj.player_split(user, 1) == "OK": continue
+            if len(cards) == 2 and score in (10, 11) and rng.random() < 0.8:
+                if bj.player_double(user, 1) == "OK": continue
+            if score < 17 and rng.random() < 0.9:
+                bj.player_hit(user, 1)
+            else:
+                bj.player_stand(user, 1)
+        bj.reset_round(1)
+    conn.close()
+
+
+class QueryCounter:
+    # Conta gli statement eseguiti sulla connessione del thread corrente dentro il blocco with
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        self.conn = get_connection()
+        self.conn.set_trace_callback(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.set_trace_callback(None)
+        self.conn.close()
+
+    def _trace(self, sql):
+        self.count += 1
+
+
+# --- METEO ---
+class StubOpenMeteo:
+    # Finto Open-Meteo locale: risponde a daily (range di date) e current_weather
+    def __init__(self):
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                q = parse_qs(urlparse(self.path).query)
+                if "start_date" in q:
+                    start = datetime.date.fromisoformat(q["start_date"][0])
+                    end = datetime.date.fromisoformat(q["end_date"][0])
+                    days = [str(start + datetime.timedelta(days=i)) for i in range((end - start).days + 1)]
+                    body = {"daily": {"time": days, "weathercode": [3] * len(days), "temperature_2m_max": [27.5] * len(days)}}
+                else:
+                    body = {"current_weather": {"temperature": 24.0, "weathercode": 1, "windspeed": 9.0}}
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/forecast"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
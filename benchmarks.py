@@ -0,0 +1,992 @@
+# benchmarks.py
+# Micro-benchmark dei percorsi caldi, su database temporanei (mai su terrazzo_vito.db).
+# Uso: python benchmarks.py [nome|gruppo ...] [--json risultati.json] [--baseline baseline.json] [--threshold 0.25]
+# Con --baseline l'uscita è 1 se un tempo minimo peggiora oltre la soglia anche dopo RECHECKS nuove misure (vedi compare).
+# benchmarks_baseline.json è il set di default (tutto tranne SLOW), il più lento di 3 giri; i tempi dipendono dalla
+# macchina, quindi si rigenera con --json --runs 3 prima di confrontare su un'altra.
+import argparse
+import atexit
+import dataclasses
+import datetime
+import itertools
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import json
+import threading
+
+import db
+import events
+import meteo
+import migrations
+from bench_data import QueryCounter, StubOpenMeteo, current_player, record_session, seat_players, seed_events
+from board import load_board
+
+
+def _timeit(fn, repeat=200):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "min_us": round(samples[0] * 1e6, 1),
+        "median_us": round(samples[len(samples) // 2] * 1e6, 1),
+        "p95_us": round(samples[int(len(samples) * 0.95) - 1] * 1e6, 1),
+    }
+
+
+_TMPDIR = tempfile.mkdtemp(prefix="terrazzo_bench_")
+_counter = itertools.count()
+atexit.register(shutil.rmtree, _TMPDIR, True)
+
+
+def fresh_db():
+    db.close_all_connections()
+    path = os.path.join(_TMPDIR, f"bench_{next(_counter)}.db")
+    db.set_database(path)
+    return path
+
+
+def _new_process(path):
+    # Simula l'avvio di un nuovo processo: niente connessioni in cache, migrazioni da verificare
+    db.close_all_connections()
+    migrations._up_to_date.discard(path)
+
+
+# --- COLD START ---
+def bench_cold_start():
+    def first_boot():
+        path = fresh_db()
+        migrations.migrate(path)
+        _new_process(path)
+
+    path = fresh_db()
+    migrations.migrate(path)
+
+    def warm_boot():
+        _new_process(path)
+        migrations.migrate(path)
+
+    return {
+        "empty_db": _timeit(first_boot, repeat=30),
+        "up_to_date_new_process": _timeit(warm_boot),
+        "rerun_same_process": _timeit(lambda: migrations.migrate(path), repeat=2000),
+    }
+
+
+# --- BACHECA EVENTI ---
+def bench_board_load():
+    res = {}
+    for n in (5, 30, 300):
+        path = fresh_db()
+        migrations.migrate(path)
+        seed_events(n)
+        with QueryCounter() as qc:
+            load_board("user1")
+        res[f"events_{n}"] = dict(_timeit(lambda: load_board("user1"), repeat=50), queries=qc.count)
+    return res
+
+
+def bench_admin_events(n_events=500, bookings_per_event=20):
+    from board import load_admin_events, ADMIN_PAGE
+
+    path = fresh_db()
+    migrations.migrate(path)
+    seed_events(n_events, bookings_per_event=bookings_per_event, items_per_event=0)
+    conn = db.get_connection()
+    since = events.now_ts()
+
+    # Vecchio pannello: tutti gli slot, poi una query di partecipanti per ogni expander
+    def eager():
+        slots = conn.execute("SELECT id, data, ora, tema, creator, is_confirmed, starts_at, capacity, seats_taken FROM slots ORDER BY starts_at").fetchall()
+        for sid, *_ in slots:
+            conn.execute("SELECT id, nome_amico, note, plus_one, nome_plus_one FROM bookings WHERE slot_id=?", (sid,)).fetchall()
+
+    with QueryCounter() as qc:
+        load_admin_events(since)
+    return {
+        "events": n_events,
+        "bookings": n_events * bookings_per_event,
+        "eager_all_events": _timeit(eager, repeat=20),
+        "page_queries": qc.count,
+        "first_page": _timeit(lambda: load_admin_events(since), repeat=200),
+        "last_page": _timeit(lambda: load_admin_events(since, page=n_events // ADMIN_PAGE - 1), repeat=200),
+    }
+
+
+# --- PRENOTAZIONI CONCORRENTI ---
+def bench_reserve_concurrency(threads=60, capacity=10):
+    path = fresh_db()
+    migrations.migrate(path)
+    conn = db.get_connection()
+    sid = conn.execute(
+        "INSERT INTO slots (data, ora, tema, creator, is_confirmed, capacity) VALUES (?, '20:00:00', 'Stress', 'Admin', 1, ?)",
+        (str(datetime.date.today() + datetime.timedelta(days=1)), capacity),
+    ).lastrowid
+    conn.commit()
+
+    results = []
+    barrier = threading.Barrier(threads)
+
+    def worker(i):
+        barrier.wait()
+        results.append(events.reserve_seat(sid, f"friend{i}", plus_one=(i % 3 == 0)))
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    taken, cap = conn.execute("SELECT seats_taken, capacity FROM slots WHERE id=?", (sid,)).fetchone()
+    return {
+        "threads": threads,
+        "ok": results.count("OK"),
+        "sold_out": results.count("SOLD_OUT"),
+        "seats_taken": taken,
+        "capacity": cap,
+        "total_ms": round(elapsed * 1e3, 1),
+    }
+
+
+
+def bench_fast_join(joins=100, capacities=(5, 40, 100)):
+    # Raffica dal link fastjoin: il primo evento è già pieno, i posti liberi sono nei successivi
+    path = fresh_db()
+    migrations.migrate(path)
+    conn = db.get_connection()
+    day = datetime.date.today() + datetime.timedelta(days=1)
+    sids = []
+    for i, cap in enumerate(capacities):
+        sids.append(conn.execute(
+            "INSERT INTO slots (data, ora, tema, creator, is_confirmed, capacity) VALUES (?, ?, ?, 'Admin', 1, ?)",
+            (str(day + datetime.timedelta(days=i)), "20:00:00", f"Evento {i}", cap),
+        ).lastrowid)
+    conn.executemany("INSERT INTO bookings (slot_id, nome_amico) VALUES (?, ?)", [(sids[0], f"early{i}") for i in range(capacities[0])])
+    conn.commit()
+
+    events.invalidate_open_slot()
+    before = events.fast_track_stats()
+    results = []
+    barrier = threading.Barrier(joins)
+
+    def worker(i):
+        barrier.wait()
+        t0 = time.perf_counter()
+        slot, res = events.fast_join(f"friend{i}")
+        results.append((res, slot and slot[0], time.perf_counter() - t0))
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(joins)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    after = events.fast_track_stats()
+
+    ok = [r for r in results if r[0] == "OK"]
+    latencies = sorted(r[2] for r in results)
+    events.next_open_slot()
+    return {
+        "joins": joins,
+        "ok": len(ok),
+        "per_slot": {str(sid): sum(1 for r in ok if r[1] == sid) for sid in sids},
+        "total_ms": round(elapsed * 1e3, 1),
+        "join_p50_ms": round(latencies[len(latencies) // 2] * 1e3, 2),
+        "join_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1e3, 2),
+        "slot_reads": after["misses"] - before["misses"],
+        "slot_cache_hits": after["hits"] - before["hits"],
+        "next_slot_cached": _timeit(events.next_open_slot, repeat=500),
+        "next_slot_query": _timeit(lambda: (events.invalidate_open_slot(), events.next_open_slot()), repeat=200),
+    }
+
+
+
+def bench_service_load(users=2000, threads=8, n_events=20, capacity=60, seed=7):
+    # Utenti simulati in processo sul servizio headless, senza Streamlit: registrazione, bacheca,
+    # prenotazione (o waitlist se pieno), lista spesa, chat, e una parte disdice
+    import random
+    import service
+
+    path = fresh_db()
+    migrations.migrate(path)
+    day = datetime.date.today() + datetime.timedelta(days=1)
+    sids = [service.create_event(day + datetime.timedelta(days=i), datetime.time(20, 0), f"Evento {i}", capacity=capacity).id
+            for i in range(n_events)]
+    counts = {}
+    lock = threading.Lock()
+    per_thread = [range(t, users, threads) for t in range(threads)]
+
+    def worker(ids):
+        rng = random.Random(seed + ids.start)
+        local = {}
+        for i in ids:
+            name = f"sim{i}"
+            ok = service.create_user(name, "pw").ok and service.login_user(name, "pw")
+            local["login"] = local.get("login", 0) + ok
+            board = service.load_board(name)
+            sid = rng.choice(sids)
+            res = service.book(sid, name, "sim", rng.random() < 0.2, "amico")
+            local[res.status] = local.get(res.status, 0) + 1
+            if res.status == "SOLD_OUT":
+                service.join_waitlist(sid, name)
+                continue
+            service.add_bring_item(sid, name, rng.choice(["ghiaccio", "birra", "patatine"]))
+            service.send_message(sid, name, f"ci sono! ({len(board.slots)} eventi)")
+            service.open_chat(sid)
+            if rng.random() < 0.1:
+                mine = service.my_bookings(name)
+                local["cancel"] = local.get("cancel", 0) + service.cancel_booking(mine[0].id, name).ok
+        with lock:
+            for k, v in local.items():
+                counts[k] = counts.get(k, 0) + v
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(ids,)) for ids in per_thread]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    conn = db.get_connection()
+    return {
+        "users": users,
+        "threads": threads,
+        "outcomes": counts,
+        "total_s": round(elapsed, 2),
+        "users_per_s": round(users / elapsed, 1),
+        "waitlist": conn.execute("SELECT count(*) FROM waitlist").fetchone()[0],
+        "messages": conn.execute("SELECT count(*) FROM event_messages").fetchone()[0],
+    }
+
+
+# --- PULIZIA EVENTI PASSATI ---
+def bench_cleanup():
+    res = {}
+    for n in (100, 1000, 5000):
+        # Regime: n eventi futuri, niente da cancellare -> deve restare piatto
+        path = fresh_db()
+        migrations.migrate(path)
+        seed_events(n, bookings_per_event=2, items_per_event=1)
+        steady = _timeit(events.cleanup_past_events, repeat=50)
+        # Recupero: n eventi storici da cancellare in una volta
+        path = fresh_db()
+        migrations.migrate(path)
+        seed_events(n, bookings_per_event=2, items_per_event=1, start=datetime.date.today() - datetime.timedelta(days=n + 1))
+        t0 = time.perf_counter()
+        events.cleanup_past_events()
+        backlog = round((time.perf_counter() - t0) * 1e6, 1)
+        res[f"slots_{n}"] = {"steady": steady, "delete_all_us": backlog}
+    return res
+
+
+# --- CHAT ---
+def bench_chat(messages=10_000, slots=3, users=50):
+    import chat
+
+    path = fresh_db()
+    migrations.migrate(path)
+    seed_events(slots, bookings_per_event=0, items_per_event=0)
+    conn = db.get_connection()
+    slot_ids = [r[0] for r in conn.execute("SELECT id FROM slots ORDER BY id").fetchall()]
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, '', ?)",
+                     [(f"user{u}", "DJ" if u % 10 == 0 else None) for u in range(users)])
+    # Chat interlacciate: i messaggi di uno slot sono sparsi nella tabella come in produzione
+    conn.executemany("INSERT INTO event_messages (slot_id, username, message) VALUES (?, ?, ?)",
+                     [(slot_ids[i % slots], f"user{i % users}", f"messaggio {i}") for i in range(messages * slots)])
+    conn.commit()
+    slot = slot_ids[0]
+
+    # Vecchio percorso: tutta la chat + una query di ruolo per messaggio
+    def full_load():
+        rows = conn.execute("SELECT id, username, message FROM event_messages WHERE slot_id=? ORDER BY id", (slot,)).fetchall()
+        for _, u, _ in rows:
+            conn.execute("SELECT role FROM users WHERE username = ?", (u,)).fetchone()
+
+    view = chat.open_chat(slot)
+    with QueryCounter() as tick:
+        chat.refresh_chat(view)
+
+    return {
+        "messages_per_slot": messages,
+        "full_load_with_roles": _timeit(full_load, repeat=5),
+        "open_latest_page": _timeit(lambda: chat.open_chat(slot), repeat=200),
+        "refresh_idle": _timeit(lambda: chat.refresh_chat(view), repeat=500),
+        "refresh_idle_queries": tick.count,
+        "load_older_page": _timeit(lambda: chat.fetch_older(slot, messages * slots // 2), repeat=200),
+    }
+
+
+# --- RICERCA ---
+def bench_search(messages=100_000, slots=50, users=200):
+    import search
+
+    path = fresh_db()
+    migrations.migrate(path)
+    seed_events(slots, bookings_per_event=20, items_per_event=5)
+    conn = db.get_connection()
+    slot_ids = [r[0] for r in conn.execute("SELECT id FROM slots ORDER BY id").fetchall()]
+    words = ["cassa", "ghiaccio", "birra", "pizza", "chitarra", "casse", "vino", "torta", "sedie", "musica", "stasera", "arrivo"]
+    t0 = time.perf_counter()
+    conn.executemany("INSERT INTO event_messages (slot_id, username, message) VALUES (?, ?, ?)",
+                     [(slot_ids[i % slots], f"user{i % users}", f"{words[i % 12]} {words[(i * 7) % 12]} messaggio {i}") for i in range(messages)])
+    conn.commit()
+    insert_us = (time.perf_counter() - t0) / messages * 1e6
+    return {
+        "messages": messages,
+        "insert_with_index_us": round(insert_us, 1),
+        "rare_term": _timeit(lambda: search.search("proiettore", username="user0"), repeat=200),
+        "two_terms_page_1": _timeit(lambda: search.search("ghiaccio torta", username="user0"), repeat=50),
+        "prefix_page_5": _timeit(lambda: search.search("chit", username="user0", page=4), repeat=50),
+        "admin_common_term": _timeit(lambda: search.search("messaggio", admin=True), repeat=10),
+        "admin_past_window": _timeit(lambda: search.search("messaggio", admin=True, page=search.SEARCH_WINDOW // search.SEARCH_PAGE), repeat=10),
+    }
+
+
+# --- RUOLI ---
+def bench_role_cache(users=1000, lookups=200):
+    import roles
+
+    path = fresh_db()
+    migrations.migrate(path)
+    conn = db.get_connection()
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, '', ?)",
+                     [(f"user{i}", "🎧 DJ" if i % 7 == 0 else None) for i in range(users)])
+    conn.commit()
+    names = [f"user{i % users}" for i in range(lookups)]
+
+    # Vecchio percorso: una query per badge (una chat da 200 messaggi = 200 query)
+    def uncached():
+        for u in names:
+            conn.execute("SELECT role FROM users WHERE username = ?", (u,)).fetchone()
+
+    roles.get_user_role_badge("user0")
+    with QueryCounter() as qc:
+        for u in names:
+            roles.get_user_role_badge(u)
+    # Controllo di versione a ogni chiamata (intervallo azzerato): data_version + contatore dei ruoli
+    check, roles.ROLE_CHECK_SECONDS = roles.ROLE_CHECK_SECONDS, 0
+    with QueryCounter() as idle:
+        roles.get_role("user0")
+    checked = _timeit(lambda: roles.get_role("user0"), repeat=500)
+    roles.ROLE_CHECK_SECONDS = check
+
+    return {
+        "users": users,
+        "uncached_lookups": _timeit(uncached, repeat=50),
+        "cached_lookups": _timeit(lambda: [roles.get_user_role_badge(u) for u in names], repeat=50),
+        "cached_queries": qc.count,
+        "version_check_queries": idle.count,
+        "version_check": checked,
+        "reload": _timeit(lambda: (roles.invalidate_roles(), roles.get_role("user0")), repeat=50),
+        "stats": roles.role_cache_stats(),
+    }
+
+
+def bench_donations(donations=100_000, donors=300, goals=3):
+    import ledger
+
+    path = fresh_db()
+    migrations.migrate(path)
+    for g in range(2, goals + 1):
+        ledger.create_goal(f"Fondo {g}", 500)
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO donazioni (donatore, importo, goal_id, donated_at) VALUES (?, ?, ?, ?)",
+        [(f"donor{i % donors}", float(i % 50 + 1), i % goals + 1, f"2025-{i % 12 + 1:02d}-01 20:00:00") for i in range(donations)],
+    )
+    conn.commit()
+    # Aggiornamenti e cancellazioni passano dagli stessi trigger
+    conn.execute("UPDATE donazioni SET importo = importo + 0.5, goal_id = 2 WHERE id % 97 = 0")
+    conn.execute("DELETE FROM donazioni WHERE id % 101 = 0")
+    conn.commit()
+
+    # Vecchio percorso della sidebar: target + SUM su tutta la tabella a ogni rerun
+    def full_scan():
+        conn.execute("SELECT target, description FROM goal WHERE id=1").fetchone()
+        conn.execute("SELECT SUM(importo) FROM donazioni").fetchone()
+
+    with QueryCounter() as qc:
+        ledger.primary_goal()
+    n = itertools.count()
+    return {
+        "donations": donations,
+        "sidebar_full_scan": _timeit(full_scan, repeat=20),
+        "sidebar_goal_row": _timeit(ledger.primary_goal, repeat=500),
+        "sidebar_queries": qc.count,
+        "donors_group_by": _timeit(lambda: conn.execute("SELECT donatore, sum(importo) FROM donazioni WHERE goal_id = 1 GROUP BY 1 ORDER BY 2 DESC LIMIT 20").fetchall(), repeat=20),
+        "donors_rollup": _timeit(lambda: ledger.donor_totals(1), repeat=200),
+        "months_rollup": _timeit(lambda: ledger.month_totals(1), repeat=200),
+        "add_donation": _timeit(lambda: ledger.add_donation(f"donor{next(n) % donors}", 5, goal_id=1), repeat=200),
+    }
+
+
+
+# --- SUITE A SCALE ---
+# Database generati da bench_data (seed fisso) e percorsi caldi delle pagine su ciascuno
+SCALE_REPEAT = {"small": 200, "medium": 100, "large": 20}
+
+
+def _timeit_on_copies(path, fn, repeat):
+    # Per operazioni distruttive: ogni campione su una copia nuova del database
+    db.get_connection(path).execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    samples, out = [], []
+    for _ in range(repeat):
+        copy = fresh_db()
+        shutil.copy(path, copy)
+        t0 = time.perf_counter()
+        out.append(fn())
+        samples.append(time.perf_counter() - t0)
+        db.close_all_connections()
+        os.remove(copy)
+    db.set_database(path)
+    samples.sort()
+    return {
+        "min_us": round(samples[0] * 1e6, 1),
+        "median_us": round(samples[len(samples) // 2] * 1e6, 1),
+        "p95_us": round(samples[-1] * 1e6, 1),
+    }, out
+
+
+def bench_scale(scale, seed=1):
+    import bench_data
+    import chat
+    import ledger
+    import service
+
+    path = fresh_db()
+    t0 = time.perf_counter()
+    rows = bench_data.generate(path, scale, seed)
+    generate_s = round(time.perf_counter() - t0, 2)
+    repeat = SCALE_REPEAT.get(scale, 50)
+    conn = db.get_connection()
+    now = events.now_ts()
+    user = conn.execute("""SELECT b.nome_amico FROM bookings b JOIN slots s ON s.id = b.slot_id
+        WHERE s.starts_at >= ? ORDER BY s.starts_at, b.id LIMIT 1""", (now,)).fetchone()[0]
+    longest, last = conn.execute("""SELECT slot_id, max(id) FROM event_messages
+        GROUP BY slot_id ORDER BY count(*) DESC LIMIT 1""").fetchone()
+
+    res = {
+        "rows": rows,
+        "generate_s": generate_s,
+        "board_load": _timeit(lambda: service.load_board(user), repeat),
+        "my_bookings": _timeit(lambda: service.my_bookings(user), repeat),
+        "next_open_slot": _timeit(lambda: (events.invalidate_open_slot(), events.next_open_slot()), repeat),
+        "chat_latest": _timeit(lambda: chat.fetch_latest(longest), repeat),
+        "chat_since": _timeit(lambda: chat.fetch_since(longest, last), repeat),
+        "donation_goal": _timeit(ledger.primary_goal, repeat),
+        "donation_donors": _timeit(lambda: ledger.donor_totals(1), repeat),
+        "donation_months": _timeit(lambda: ledger.month_totals(1), repeat),
+    }
+    res["cleanup_past_events"], deleted = _timeit_on_copies(path, events.cleanup_past_events, 3 if scale == "large" else 5)
+    res["history_deleted"] = deleted[0]
+    return res
+
+
+# --- BLACKJACK ---
+def bench_blackjack_actions(repeat=300):
+    import blackjack_app as bj
+
+    path = fresh_db()
+    migrations.migrate(path)
+    seat_players(bj, 6)
+    conn = db.get_connection()
+
+    # HIT: ogni campione parte da una mano 2♠ 2♥ (punteggio 4), così la mano non sballa mai
+    def fresh_turn():
+        conn.execute("UPDATE bj_game SET status='PLAYING', current_seat=0, current_hand_index=0 WHERE id=1")
+        conn.execute("UPDATE bj_hands SET cards=x'0001', score=4, status='PLAYING'")
+        conn.commit()
+
+    bj.start_game(1)
+    samples = []
+    for _ in range(repeat):
+        fresh_turn()
+        user, _ = current_player(bj)
+        t0 = time.perf_counter()
+        bj.player_hit(user, 1)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    hit = {"median_us": round(samples[len(samples) // 2] * 1e6, 1), "p95_us": round(samples[int(len(samples) * 0.95)] * 1e6, 1)}
+
+    # STAND: stessa mano di partenza, il turno passa al posto successivo
+    samples = []
+    for _ in range(repeat):
+        fresh_turn()
+        user, _ = current_player(bj)
+        t0 = time.perf_counter()
+        bj.player_stand(user, 1)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    stand = {"median_us": round(samples[len(samples) // 2] * 1e6, 1), "p95_us": round(samples[int(len(samples) * 0.95)] * 1e6, 1)}
+
+    # Round completo: start, tutti stand, end_round, reset
+    def full_round():
+        bj.start_game(1)
+        for _ in range(20):
+            user, _ = current_player(bj)
+            status = conn.execute("SELECT status FROM bj_game WHERE id=1").fetchone()[0]
+            if status == "INSURANCE":
+                bj.close_insurance_phase(user or "player0", 1)
+                continue
+            if status != "PLAYING":
+                break
+            bj.player_stand(user, 1)
+        bj.reset_round(1)
+
+    # Liquidazione: statement per round con 6 giocatori
+    with QueryCounter() as qc:
+        bj.end_round(1)
+
+    return {
+        "player_hit": hit,
+        "player_stand": stand,
+        "end_round": _timeit(lambda: bj.end_round(1), repeat=repeat),
+        "end_round_queries": qc.count,
+        "round_6_players": _timeit(full_round, repeat=50),
+    }
+
+
+def bench_turn_order(seats=8, repeat=30):
+    import blackjack_app as bj
+
+    path = fresh_db()
+    migrations.migrate(path)
+    conn = db.get_connection()
+    conn.execute("UPDATE bj_game SET max_seats=? WHERE id=1", (seats,))
+    conn.commit()
+    players = seat_players(bj, seats)
+    eights = bytes([24, 25])  # 8♠ 8♥: ogni giocatore splitta
+
+    def deal_pairs():
+        bj.reset_round(1)
+        bj.start_game(1)
+        conn.execute("UPDATE bj_hands SET cards=?, score=16, status='PLAYING' WHERE table_id=1", (eights,))
+        conn.execute("UPDATE bj_game SET status='PLAYING', current_seat=0, current_hand_index=0, dealer_cards=x'2c30' WHERE id=1")
+        conn.commit()
+
+    stand_samples, stand_queries = [], []
+    for _ in range(repeat):
+        deal_pairs()
+        split_done = set()
+        while True:
+            user, _, _ = bj.get_current_turn(conn, 1)
+            if user is None:
+                break
+            if user not in split_done:
+                bj.player_split(user, 1)
+                split_done.add(user)
+                continue
+            with QueryCounter() as qc:
+                t0 = time.perf_counter()
+                bj.player_stand(user, 1)
+                stand_samples.append(time.perf_counter() - t0)
+            stand_queries.append(qc.count)
+    stand_samples.sort()
+    return {
+        "seats": len(players),
+        "stands_per_round": seats * 2,
+        "stand_median_us": round(stand_samples[len(stand_samples) // 2] * 1e6, 1),
+        "stand_p95_us": round(stand_samples[int(len(stand_samples) * 0.95)] * 1e6, 1),
+        "queries_per_stand": max(set(stand_queries), key=stand_queries.count),
+    }
+
+
+def bench_multi_table(players=21, rounds=20):
+    import blackjack_app as bj
+
+    path = fresh_db()
+    migrations.migrate(path)
+    conn = db.get_connection()
+
+    # Ogni giocatore si siede al primo tavolo libero: quando uno si riempie ne nasce un altro
+    for i in range(players):
+        table_id = next(t[0] for t in bj.list_tables() if t[2] == "WAITING" and t[4] < t[3])
+        bj.join_blackjack(f"player{i}", table_id)
+    tables = bj.list_tables()
+    full = [t[0] for t in tables if t[4] == t[3]]
+    conn.execute("UPDATE bj_players SET bet_main=10")
+    conn.commit()
+
+    def play_round(table_id):
+        bj.start_game(table_id)
+        for _ in range(30):
+            status = conn.execute("SELECT status FROM bj_game WHERE id=?", (table_id,)).fetchone()[0]
+            user, _, _ = bj.get_current_turn(conn, table_id)
+            if status == "INSURANCE":
+                bj.close_insurance_phase(conn.execute("SELECT username FROM bj_players WHERE table_id=? LIMIT 1", (table_id,)).fetchone()[0], table_id)
+            elif status == "PLAYING":
+                bj.player_stand(user, table_id)
+            else:
+                break
+        bj.reset_round(table_id)
+
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for t in full:
+            play_round(t)
+    elapsed = time.perf_counter() - t0
+    return {
+        "tables": len(tables),
+        "full_tables": len(full),
+        "rounds_per_table": rounds,
+        "round_us": round(elapsed / (rounds * len(full)) * 1e6, 1),
+    }
+
+
+def bench_hand_history(players=6, rounds=300, seed=1234):
+    import hashlib
+    import blackjack_app as bj
+    import bj_events
+
+    path = fresh_db()
+    migrations.migrate(path)
+    users = seat_players(bj, players)
+    conn = db.get_connection()
+
+    t0 = time.perf_counter()
+    record_session(bj, users, rounds, seed)
+    record_s = time.perf_counter() - t0
+    n_events = conn.execute("SELECT count(*) FROM bj_events").fetchone()[0]
+
+    # Replay massivo: ogni round rigiocato dal seme e verificato carta per carta e sulla liquidazione
+    t0 = time.perf_counter()
+    replays = bj_events.replay_all(1)
+    replay_s = time.perf_counter() - t0
+
+    # Stessi semi => stessa sessione: l'impronta dei round rigiocati non deve cambiare tra le esecuzioni
+    digest = hashlib.sha256(repr([(r.round_no, r.dealer_cards, sorted(r.report.bankrolls.items())) for r in replays]).encode()).hexdigest()
+
+    # Costo della scrittura nello storico: uno statement in più per azione
+    bj.start_game(1, seed=seed)
+    while conn.execute("SELECT status FROM bj_game WHERE id=1").fetchone()[0] == "INSURANCE":
+        bj.close_insurance_phase(users[0], 1)
+    user, _ = current_player(bj)
+    with QueryCounter() as qc:
+        bj.player_stand(user, 1)
+
+    return {
+        "stand_queries": qc.count,
+        "rounds": len(replays),
+        "events_per_round": round(n_events / len(replays), 1),
+        "record_round_us": round(record_s / rounds * 1e6, 1),
+        "replay_round_us": round(replay_s / len(replays) * 1e6, 1),
+        "replay_rounds_per_s": round(len(replays) / replay_s),
+        "session_digest": digest[:16],
+    }
+
+
+def _on_new_threads(fn, n):
+    # n chiamate, ognuna su un thread nuovo come i tick dei fragment di Streamlit; statement e connessioni aperte
+    out = []
+    before = db.connection_stats()
+    for _ in range(n):
+        t = threading.Thread(target=lambda: out.append(fn()))
+        t.start()
+        t.join()
+    after = db.connection_stats()
+    return out, {k: after[k] - before[k] for k in ("statements", "opened")}
+
+
+def bench_table_polling(ticks_per_minute=30, spectators=20):
+    import blackjack_app as bj
+    from bj_snapshot import load_snapshot
+
+    path = fresh_db()
+    migrations.migrate(path)
+    seat_players(bj, 6)
+    bj.start_game(1)
+    state = bj.poll_table_state(None, "player0")
+
+    # Client in attesa: nessuna azione -> solo la lettura della versione
+    _, idle = _on_new_threads(lambda: bj.poll_table_state(state, "player0"), ticks_per_minute)
+    # Dopo un'azione di un altro giocatore il tick successivo ricarica il tavolo
+    bj.player_stand(current_player(bj)[0], 1)
+    (new_state,), changed = _on_new_threads(lambda: bj.poll_table_state(state, "player0"), 1)
+
+    # Spettatori: dopo un'azione il primo tick legge il tavolo, tutti gli altri usano lo stesso snapshot
+    bj.player_stand(current_player(bj)[0], 1)
+    _, watch = _on_new_threads(lambda: bj.poll_table_state(None, "watcher", watch=1), spectators)
+    return {
+        "idle_queries_per_minute": idle["statements"],
+        "idle_connections_opened": idle["opened"],
+        "queries_after_change": changed["statements"],
+        "spectators": spectators,
+        "spectator_queries_after_change": watch["statements"],
+        "idle_tick": _timeit(lambda: bj.poll_table_state(new_state, "player0"), repeat=2000),
+        "cached_snapshot": _timeit(lambda: bj.poll_table_state(None, "player0"), repeat=500),
+        "load_snapshot": _timeit(lambda: load_snapshot(1), repeat=500),
+    }
+
+
+def bench_lookup_tables():
+    import bj_cards as bc
+
+    t0 = time.perf_counter()
+    bc.verify_lookup_tables()
+    verify_ms = round((time.perf_counter() - t0) * 1e3, 1)
+
+    two, three, up = bytes([51, 34]), bytes([8, 49, 20]), 44
+    cases = {
+        "score_2_cards": (lambda: bc.calculate_score(two), lambda: bc._score_reference(two)),
+        "score_3_cards": (lambda: bc.calculate_score(three), lambda: bc._score_reference(three)),
+        "is_blackjack": (lambda: bc.is_blackjack(two), lambda: len(two) == 2 and bc._score_reference(two) == 21),
+        "settle_pair": (lambda: bc.settle_pair(two), lambda: bc._settle_pair_reference(two)),
+        "settle_21p3": (lambda: bc.settle_21p3(two, up), lambda: bc._settle_21p3_reference(two, up)),
+    }
+    res = {"verify_ms": verify_ms}
+    for name, (table, reference) in cases.items():
+        res[name] = {"table_us": _timeit(table, 20000)["median_us"], "reference_us": _timeit(reference, 20000)["median_us"]}
+    return res
+
+
+def bench_simulator(rounds=500_000):
+    import bj_sim
+
+    res = bj_sim.simulate(rounds, seed=1)
+    return {
+        "rounds": rounds,
+        "rounds_per_sec": round(res["rounds_per_sec"]),
+        "ev": {k: (round(r["ev"], 4), round(r["ci95"], 4)) for k, r in res["bets"].items()},
+    }
+
+
+# --- APP (STREAMLIT) ---
+# Come gira in produzione: ogni rerun di AppTest e ogni tick di un fragment eseguono lo script su un thread nuovo
+def _fragment_runner(fragment_id):
+    # Il runner di AppTest, con ogni esecuzione ristretta al fragment (come un tick di run_every)
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    class FragmentTick(LocalScriptRunner):
+        def _run_script(self, rerun_data):
+            return super()._run_script(dataclasses.replace(rerun_data, fragment_id_queue=[fragment_id], is_auto_rerun=True))
+
+    return FragmentTick
+
+
+def bench_app_reruns(reruns=20, ticks_per_minute=30):
+    from unittest import mock
+    from streamlit.testing.v1 import AppTest, app_test
+    import blackjack_app as bj
+
+    path = fresh_db()
+    migrations.migrate(path)
+    seed_events(10)
+    seat_players(bj, 3)
+    stub = StubOpenMeteo()
+    base_url, meteo.OPEN_METEO_URL = meteo.OPEN_METEO_URL, stub.url
+    try:
+        at = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"), default_timeout=30)
+        at.session_state["logged_in"] = True
+        at.session_state["username"] = "player0"
+        at.run()
+        # Rerun completi della bacheca
+        db.reset_connection_stats()
+        page = _timeit(at.run, repeat=reruns)
+        full = db.connection_stats()
+
+        # Sala Giochi: l'unico fragment della pagina è il tavolo; i tick rieseguono solo quello
+        at.sidebar.radio[0].set_value("🎰 Sala Giochi")
+        at.run()
+        (table,) = at._fragment_storage._fragments
+        with mock.patch.object(app_test, "LocalScriptRunner", _fragment_runner(table)):
+            db.reset_connection_stats()
+            for _ in range(ticks_per_minute):
+                at.run()
+            idle = db.connection_stats()
+            tick = _timeit(at.run, repeat=reruns)
+    finally:
+        meteo.OPEN_METEO_URL = base_url
+        stub.close()
+    return {
+        "board_rerun": page,
+        "board_rerun_statements": round(full["statements"] / reruns, 1),
+        "board_rerun_connections_opened": full["opened"],
+        "table_tick": tick,
+        "table_ticks_per_minute": ticks_per_minute,
+        "table_idle_statements_per_minute": idle["statements"],
+        "table_idle_connections_opened": idle["opened"],
+    }
+
+
+# --- METEO ---
+def bench_forecast():
+    path = fresh_db()
+    migrations.migrate(path)
+    stub = StubOpenMeteo()
+    today = datetime.date.today()
+    dates = [str(today + datetime.timedelta(days=i)) for i in range(30)]
+    try:
+        t0 = time.perf_counter()
+        meteo.get_forecasts(dates, stub.url)
+        first = round((time.perf_counter() - t0) * 1e6, 1)
+        cached = _timeit(lambda: meteo.get_forecasts(dates, stub.url), repeat=200)
+        return {"first_render_us": first, "cached_render": cached, "http_requests": stub.requests}
+    finally:
+        stub.close()
+
+
+def bench_live_weather():
+    stub = StubOpenMeteo()
+    service = meteo.LiveWeatherService(base_url=stub.url, interval=3600)
+    try:
+        t0 = time.perf_counter()
+        service.refresh_now()
+        refresh = round((time.perf_counter() - t0) * 1e6, 1)
+        # La sidebar legge solo il valore in memoria: nessuna richiesta HTTP per rerun
+        read = _timeit(service.current, repeat=5000)
+        return {"refresh_us": refresh, "sidebar_read": read, "value": service.current()}
+    finally:
+        stub.close()
+
+
+BENCHMARKS = {
+    "scale_small": lambda: bench_scale("small"),
+    "scale_medium": lambda: bench_scale("medium"),
+    "scale_large": lambda: bench_scale("large"),
+    "cold_start": bench_cold_start,
+    "board_load": bench_board_load,
+    "admin_events": bench_admin_events,
+    "reserve_concurrency": bench_reserve_concurrency,
+    "fast_join": bench_fast_join,
+    "service_load": bench_service_load,
+    "cleanup": bench_cleanup,
+    "chat": bench_chat,
+    "search": bench_search,
+    "role_cache": bench_role_cache,
+    "donations": bench_donations,
+    "blackjack_actions": bench_blackjack_actions,
+    "table_polling": bench_table_polling,
+    "turn_order": bench_turn_order,
+    "multi_table": bench_multi_table,
+    "hand_history": bench_hand_history,
+    "lookup_tables": bench_lookup_tables,
+    "simulator": bench_simulator,
+    "forecast": bench_forecast,
+    "live_weather": bench_live_weather,
+    "app_reruns": bench_app_reruns,
+}
+
+
+# Gruppi richiamabili per nome; "scale_large" (1M prenotazioni, ~1 minuto) solo se chiesto esplicitamente
+GROUPS = {
+    "hot": ["scale_small", "scale_medium", "lookup_tables", "blackjack_actions"],
+    "scales": ["scale_small", "scale_medium", "scale_large"],
+}
+SLOW = {"scale_large"}
+
+# Confronto con la baseline: tempi minimi in µs (i meno sensibili al carico dell'host);
+# sotto MIN_DELTA_US la differenza è rumore
+DEFAULT_THRESHOLD = 0.25
+MIN_DELTA_US = 2.0
+RECHECKS = 2  # nuove misure dei soli benchmark sopra soglia: una regressione vera resta, un momento lento no
+
+
+def _timings(res, prefix=""):
+    # {"nome/percorso": µs} per ogni tempo confrontabile: min_us dei _timeit e i *_us dei confronti tabella/riferimento
+    out = {}
+    for k, v in res.items():
+        k = str(k)  # chiavi non stringa (es. id di slot) diventano stringhe anche nel JSON
+        key = f"{prefix}/{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(_timings(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool) and k.endswith("_us") and not k.startswith(("median_", "p95_")):
+            out[key] = float(v)
+    return out
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    # [(metrica, baseline µs, attuale µs, rapporto)] delle sole regressioni oltre la soglia
+    old, new = _timings(baseline.get("results", {})), _timings(current["results"])
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        b, c = old[key], new[key]
+        if b > 0 and c > b * (1 + threshold) and c - b > MIN_DELTA_US:
+            regressions.append((key, b, c, round(c / b, 2)))
+    return regressions, len(old.keys() & new.keys())
+
+
+def _merge(runs, stat):
+    # Fonde più risultati dello stesso benchmark applicando stat (min, max) a ogni *_us; il resto dal primo
+    out = {}
+    for k, v in runs[0].items():
+        others = [r.get(k) for r in runs[1:]]
+        if isinstance(v, dict) and all(isinstance(w, dict) for w in others): out[k] = _merge([v] + others, stat)
+        elif k.endswith("_us") and all(isinstance(w, (int, float)) for w in [v] + others): out[k] = round(stat([v] + others), 1)
+        else: out[k] = v
+    return out
+
+
+def run(names):
+    results = {}
+    for name in names:
+        res = results[name] = BENCHMARKS[name]()
+        print(f"== {name}")
+        for k, v in res.items():
+            print(f"  {k}: {v}")
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark dei percorsi caldi su database temporanei.")
+    parser.add_argument("names", nargs="*", help=f"benchmark o gruppi ({', '.join(GROUPS)}); default: tutti tranne {', '.join(sorted(SLOW))}")
+    parser.add_argument("--json", metavar="FILE", help="scrive i risultati in JSON (da usare come baseline)")
+    parser.add_argument("--baseline", metavar="FILE", help="confronta con un JSON salvato in precedenza")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="regressione se più lento di questa frazione (default 0.25)")
+    parser.add_argument("--runs", type=int, default=1, help="ripete tutto e tiene il tempo peggiore di ogni metrica (per scrivere una baseline)")
+    args = parser.parse_args(argv)
+
+    names = [n for name in args.names for n in GROUPS.get(name, [name])] or [n for n in BENCHMARKS if n not in SLOW]
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown: parser.error(f"benchmark sconosciuti: {', '.join(unknown)}")
+    # Stessa forma del JSON salvato
+    reports = [json.loads(json.dumps(run(names), ensure_ascii=False, default=str)) for _ in range(max(1, args.runs))]
+    # Con più giri la baseline è il tetto del rumore: il più lento di ogni tempo, che il confronto deve superare di threshold
+    report = {"meta": reports[0]["meta"] | {"runs": len(reports)}, "results": _merge([r["results"] for r in reports], max)}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Risultati scritti in {args.json}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        missing = sorted(_timings(report["results"]).keys() - _timings(baseline.get("results", {})).keys())
+        if missing: print(f"  senza baseline ({len(missing)}): {', '.join(missing)} — rigenerarla con --json")
+        regressions, compared = compare(baseline, report, args.threshold)
+        for _ in range(RECHECKS):
+            if not regressions: break
+            for name in sorted({key.split("/")[0] for key, *_ in regressions}):
+                print(f"== {name}: sopra soglia, nuova misura")
+                fresh = json.loads(json.dumps(BENCHMARKS[name](), ensure_ascii=False, default=str))
+                report["results"][name] = _merge([report["results"][name], fresh], min)
+            regressions, compared = compare(baseline, report, args.threshold)
+        print(f"== confronto con {args.baseline}: {compared} tempi, soglia +{args.threshold:.0%}")
+        for key, b, c, ratio in regressions:
+            print(f"  REGRESSIONE {key}: {b} -> {c} µs (x{ratio})")
+        if regressions: return 1
+        print("  nessuna regressione")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,286 @@
+# bj_cards.py
+# Carte del blackjack in forma compatta: ogni carta è un intero 0..51 = rank_idx * 4 + suit_idx,
+# una mano o un sabot sono semplici bytes. Niente JSON, niente dict per carta.
+import random
+from dataclasses import dataclass, field
+
+SUITS = ['♠', '♥', '♦', '♣']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+RANK_VALUE_21P3 = {'A': 14, 'K': 13, 'Q': 12, 'J': 11, '10': 10, '9': 9, '8': 8, '7': 7, '6': 6, '5': 5, '4': 4, '3': 3, '2': 2}
+PAIR_PAYOUT = {"mixed": 6, "colored": 12, "perfect": 25}
+P21P3_PAYOUT = {"straight_flush": 40, "three_kind": 30, "straight": 10, "flush": 5, "pair": 5}
+
+DECKS_PER_SHOE = 6
+ACE = RANKS.index('A')
+RED_SUITS = (SUITS.index('♥'), SUITS.index('♦'))
+
+# Valore blackjack per rank_idx (asso = 11, ridotto a 1 in calculate_score)
+RANK_POINTS = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11]
+
+
+def card(rank, suit):
+    return RANKS.index(rank) * 4 + SUITS.index(suit)
+
+
+def card_rank(c):
+    return c >> 2
+
+
+def card_suit(c):
+    return c & 3
+
+
+def card_label(c):
+    return f"{RANKS[c >> 2]}{SUITS[c & 3]}"
+
+
+def is_red(c):
+    return (c & 3) in RED_SUITS
+
+
+def encode_hand(cards):
+    # Da [{'rank':..,'suit':..}, ...] (vecchio formato JSON) a bytes
+    return bytes(card(c['rank'], c['suit']) for c in cards)
+
+
+def decode_hand(hand):
+    return [{'rank': RANKS[c >> 2], 'suit': SUITS[c & 3]} for c in hand]
+
+
+# --- SABOT ---
+def new_shoe(rng=random):
+    cards = list(range(52)) * DECKS_PER_SHOE
+    rng.shuffle(cards)
+    return bytes(cards)
+
+
+class Shoe:
+    # Sabot + cursore: distribuire una carta sposta solo pos
+    def __init__(self, cards=b"", pos=0, rng=random):
+        self.cards = bytes(cards or b"")
+        self.pos = int(pos or 0)
+        self.rng = rng
+        self.reshuffled = False
+
+    def draw(self):
+        if self.pos >= len(self.cards):
+            self.cards = new_shoe(self.rng)
+            self.pos = 0
+            self.reshuffled = True
+        c = self.cards[self.pos]
+        self.pos += 1
+        return c
+
+    def remaining(self):
+        return len(self.cards) - self.pos
+
+
+def seeded_shoe(seed):
+    # Stesso seme, stesso sabot: è tutto ciò che serve per rigiocare un round dallo storico
+    rng = random.Random(seed)
+    return Shoe(new_shoe(rng), rng=rng)
+
+
+# --- IMPLEMENTAZIONI DI RIFERIMENTO ---
+# Servono solo a costruire le tabelle qui sotto; il gioco usa le versioni a tabella, verificate contro bj_legacy.
+def _score_reference(hand):
+    score = 0
+    aces = 0
+    for c in hand:
+        r = c >> 2
+        score += RANK_POINTS[r]
+        if r == ACE:
+            aces += 1
+    while score > 21 and aces:
+        score -= 10
+        aces -= 1
+    return score
+
+
+def _settle_pair_reference(player_hand):
+    if len(player_hand) < 2: return 0, ""
+    c1, c2 = player_hand[0], player_hand[1]
+    if (c1 >> 2) != (c2 >> 2): return 0, ""
+    if (c1 & 3) == (c2 & 3): return PAIR_PAYOUT["perfect"], "Perfect Pair (25x)"
+    if is_red(c1) == is_red(c2): return PAIR_PAYOUT["colored"], "Color Pair (12x)"
+    return PAIR_PAYOUT["mixed"], "Mixed Pair (6x)"
+
+
+def _settle_21p3_reference(player_hand, dealer_upcard):
+    if len(player_hand) < 2 or dealer_upcard is None: return 0, ""
+    cards = (player_hand[0], player_hand[1], dealer_upcard)
+    # rank_idx + 2 = valore 21+3 (2..14, asso alto)
+    vals = sorted((c >> 2) + 2 for c in cards)
+    flush = (cards[0] & 3) == (cards[1] & 3) == (cards[2] & 3)
+    three_kind = vals[0] == vals[2]
+    pair = not three_kind and (vals[0] == vals[1] or vals[1] == vals[2])
+    straight = (vals == [2, 3, 14]) or (vals[0] + 1 == vals[1] and vals[1] + 1 == vals[2])
+
+    if straight and flush: return P21P3_PAYOUT["straight_flush"], "Straight Flush (40x)"
+    if three_kind: return P21P3_PAYOUT["three_kind"], "Three of a Kind (30x)"
+    if straight: return P21P3_PAYOUT["straight"], "Straight (10x)"
+    if flush: return P21P3_PAYOUT["flush"], "Flush (5x)"
+    if pair: return P21P3_PAYOUT["pair"], "One Pair (5x)"
+    return 0, ""
+
+
+# --- TABELLE PRECALCOLATE ---
+# Punti "hard" per carta (asso = 1) e insieme degli assi, indicizzati direttamente dall'intero della carta
+HARD_POINTS = [1 if (c >> 2) == ACE else RANK_POINTS[c >> 2] for c in range(52)]
+ACE_CARDS = frozenset(c for c in range(52) if (c >> 2) == ACE)
+# Totale finale per [hard][ha almeno un asso] fino a 21: l'asso vale 11 finché non si sballa
+SCORE_TABLE = [(h, h + 10 if h <= 11 else h) for h in range(22)]
+# Mani di due carte: punteggio per c1 * 52 + c2
+TWO_CARD_SCORE = bytes(_score_reference((a, b)) for a in range(52) for b in range(52))
+
+PAIR_OUTCOMES = [(0, ""), (PAIR_PAYOUT["mixed"], "Mixed Pair (6x)"),
+                 (PAIR_PAYOUT["colored"], "Color Pair (12x)"), (PAIR_PAYOUT["perfect"], "Perfect Pair (25x)")]
+_PAIR_CODE = {o: i for i, o in enumerate(PAIR_OUTCOMES)}
+# Esito Pair per c1 * 52 + c2
+PAIR_TABLE = bytes(_PAIR_CODE[_settle_pair_reference((a, b))] for a in range(52) for b in range(52))
+
+P21P3_OUTCOMES = [(0, ""), (P21P3_PAYOUT["pair"], "One Pair (5x)"), (P21P3_PAYOUT["flush"], "Flush (5x)"),
+                  (P21P3_PAYOUT["straight"], "Straight (10x)"), (P21P3_PAYOUT["three_kind"], "Three of a Kind (30x)"),
+                  (P21P3_PAYOUT["straight_flush"], "Straight Flush (40x)")]
+_P21P3_CODE = {o: i for i, o in enumerate(P21P3_OUTCOMES)}
+
+
+def _p21p3_index(c1, c2, c3):
+    # L'esito dipende solo dai tre rank e da "stesso seme per tutte e tre": 13^3 * 2 combinazioni
+    flush = (c1 & 3) == (c2 & 3) == (c3 & 3)
+    return (((c1 >> 2) * 13 + (c2 >> 2)) * 13 + (c3 >> 2)) * 2 + flush
+
+
+# Esito 21+3 per _p21p3_index: ogni classe costruita con carte rappresentative (semi 0/0/0 oppure 0/1/0)
+P21P3_TABLE = bytes(
+    _P21P3_CODE[_settle_21p3_reference((r1 * 4, r2 * 4 + (0 if flush else 1)), r3 * 4)]
+    for r1 in range(13) for r2 in range(13) for r3 in range(13) for flush in (0, 1)
+)
+
+
+# --- PUNTEGGI E SIDE BET ---
+def calculate_score(hand):
+    if len(hand) == 2:
+        return TWO_CARD_SCORE[hand[0] * 52 + hand[1]]
+    hard = 0
+    for c in hand:
+        hard += HARD_POINTS[c]
+    if hard > 21: return hard
+    return SCORE_TABLE[hard][not ACE_CARDS.isdisjoint(hand)]
+
+
+def is_blackjack(hand):
+    return len(hand) == 2 and TWO_CARD_SCORE[hand[0] * 52 + hand[1]] == 21
+
+
+def is_pair_for_split(hand):
+    return len(hand) == 2 and (hand[0] >> 2) == (hand[1] >> 2)
+
+
+def is_ace(c):
+    return c is not None and (c >> 2) == ACE
+
+
+def is_ten_value(c):
+    return c is not None and RANK_POINTS[c >> 2] == 10
+
+
+def settle_pair(player_hand):
+    if len(player_hand) < 2: return 0, ""
+    return PAIR_OUTCOMES[PAIR_TABLE[player_hand[0] * 52 + player_hand[1]]]
+
+
+def settle_21p3(player_hand, dealer_upcard):
+    if len(player_hand) < 2 or dealer_upcard is None: return 0, ""
+    return P21P3_OUTCOMES[P21P3_TABLE[_p21p3_index(player_hand[0], player_hand[1], dealer_upcard)]]
+
+
+def verify_lookup_tables(max_cards=4):
+    # Confronta le versioni a tabella con le funzioni originali congelate in bj_legacy (carte come dict),
+    # non con le _reference che hanno costruito le tabelle: tutte le coppie (Pair, punteggio, blackjack),
+    # tutte le 52^3 terne (21+3), tutte le mani fino a max_cards rank
+    import bj_legacy as legacy
+
+    cards = [legacy.card_dict(c) for c in range(52)]
+    errors = []
+    for a in range(52):
+        for b in range(52):
+            pair = (cards[a], cards[b])
+            if settle_pair((a, b)) != legacy.settle_pair(pair): errors.append(("pair", a, b))
+            if calculate_score((a, b)) != legacy.calculate_score(pair): errors.append(("score", a, b))
+            if is_blackjack((a, b)) != legacy.is_blackjack(pair): errors.append(("blackjack", a, b))
+            for c in range(52):
+                if settle_21p3((a, b), c) != legacy.settle_21p3(pair, cards[c]): errors.append(("21+3", a, b, c))
+    # Il punteggio dipende solo dai rank: una carta per rank basta (seme 0)
+    hands = [()]
+    for _ in range(max_cards):
+        hands = [h + (r * 4,) for h in hands for r in range(13)]
+        for h in hands:
+            if calculate_score(h) != legacy.calculate_score([cards[c] for c in h]): errors.append(("score",) + h)
+    return errors
+
+
+# --- LIQUIDAZIONE DEL ROUND ---
+@dataclass
+class HandSettlement:
+    username: str
+    hand_index: int
+    outcome: str
+    bet: int
+    payout: int  # importo riaccreditato (puntata compresa), 0 se persa
+    bankroll: int  # bankroll del giocatore a fine round
+
+
+@dataclass
+class RoundSettlement:
+    dealer_cards: bytes
+    dealer_score: int
+    dealer_blackjack: bool
+    hands: list = field(default_factory=list)
+    bankrolls: dict = field(default_factory=dict)  # username -> (bankroll, main_result)
+
+
+def settle_hand(cards, score, status, bet, is_split, dealer_score, dealer_bj):
+    # (esito, importo riaccreditato) con le regole di end_round
+    if status == 'BUST': return "Sballato", 0
+    p_bj = is_blackjack(cards)
+    if dealer_bj:
+        if p_bj and not is_split: return "Push", bet
+        return "Banco BJ", 0
+    if p_bj:
+        if not is_split: return "Blackjack!", int(bet * 2.5)
+        return "21 (Split)", bet * 2
+    if dealer_score > 21 or score > dealer_score: return "Vinto", bet * 2
+    if score == dealer_score: return "Push", bet
+    return "Perso", 0
+
+
+def settle_round(dealer_cards, dealer_initial, rows):
+    # rows: (username, bankroll, insurance_bet, hand_index, cards, score, status, bet, is_split_hand)
+    # in ordine di gioco; funzione pura, nessun accesso al database
+    d_score = calculate_score(dealer_cards)
+    dealer_bj = is_blackjack(dealer_initial)
+    report = RoundSettlement(dealer_cards, d_score, dealer_bj)
+    bankroll, outcomes, hands = {}, {}, {}
+    for u, br, ins, idx, cards, sc, stt, bet, is_split in rows:
+        if u not in bankroll:
+            bankroll[u] = int(br) + (int(ins) * 3 if int(ins or 0) > 0 and dealer_bj else 0)
+            outcomes[u] = []
+            hands[u] = []
+        if idx is None: continue
+        outcome, payout = settle_hand(cards, sc, stt, int(bet), is_split, d_score, dealer_bj)
+        bankroll[u] += payout
+        outcomes[u].append(outcome)
+        hands[u].append(HandSettlement(u, idx, outcome, int(bet), payout, 0))
+    for u in bankroll:
+        for h in hands[u]:
+            h.bankroll = bankroll[u]
+            report.hands.append(h)
+        report.bankrolls[u] = (bankroll[u], " | ".join(outcomes[u]))
+    return report
+
+
+def render_card_span(c):
+    if c is None: return ""
+    color_class = "card-red" if is_red(c) else "card-black"
+    return f"<span class='game-card {color_class}'>{card_label(c)}</span>"
@@ -0,0 +1,184 @@
+# bj_events.py
+# Storico append-only del blackjack: ogni azione aggiunge una riga a bj_events nella stessa transazione
+# che modifica il tavolo. Il sabot di ogni round nasce da un seme registrato, quindi dal log si può
+# rigiocare qualunque round carta per carta e ricontrollarne la liquidazione.
+import json
+from dataclasses import dataclass, field
+
+from db import get_connection
+from events import now_ts
+from bj_cards import seeded_shoe, calculate_score, is_ace, settle_pair, settle_21p3, settle_round
+
+# round_no letto da bj_game nello stesso INSERT: chi registra non deve conoscere il numero del round
+LOG_SQL = """INSERT INTO bj_events (table_id, round_no, kind, username, hand_index, data, ts)
+    SELECT id, round_no, ?, ?, ?, ?, ? FROM bj_game WHERE id = ?"""
+
+
+def log_event(conn, table_id, kind, username=None, hand_index=None, **data):
+    payload = json.dumps(data, separators=(",", ":")) if data else None
+    conn.execute(LOG_SQL, (kind, username, hand_index, payload, now_ts(), table_id))
+
+
+# --- LETTURA ---
+EVENT_COLUMNS = "table_id, round_no, kind, username, hand_index, data"
+
+
+def round_events(table_id, round_no):
+    conn = get_connection()
+    rows = conn.execute(f"SELECT {EVENT_COLUMNS} FROM bj_events WHERE table_id=? AND round_no=? ORDER BY id", (table_id, round_no)).fetchall()
+    conn.close()
+    return rows
+
+
+def list_rounds(table_id=None):
+    # (table_id, round_no, eventi) dei round registrati, in ordine
+    conn = get_connection()
+    rows = conn.execute("""SELECT table_id, round_no, count(*) FROM bj_events
+        WHERE ?1 IS NULL OR table_id = ?1 GROUP BY table_id, round_no ORDER BY table_id, round_no""", (table_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def iter_rounds(table_id=None):
+    # Tutti gli eventi in una sola lettura, raggruppati per round: è il carico del replay massivo
+    conn = get_connection()
+    rows = conn.execute(f"""SELECT {EVENT_COLUMNS} FROM bj_events
+        WHERE ?1 IS NULL OR table_id = ?1 ORDER BY table_id, round_no, id""", (table_id,)).fetchall()
+    conn.close()
+    current, key = [], None
+    for r in rows:
+        if r[:2] != key and current:
+            yield current
+            current = []
+        key = r[:2]
+        current.append(r)
+    if current: yield current
+
+
+# --- REPLAY ---
+@dataclass
+class ReplayHand:
+    username: str
+    seat: int
+    hand_index: int
+    cards: bytes
+    bet: int
+    status: str
+    doubled: bool = False
+    is_split: bool = False
+
+    @property
+    def score(self):
+        return calculate_score(self.cards)
+
+
+@dataclass
+class RoundReplay:
+    table_id: int
+    round_no: int
+    seed: int = None
+    status: str = "WAITING"
+    dealer_cards: bytes = b""
+    dealer_initial: bytes = b""
+    bankrolls: dict = field(default_factory=dict)  # username -> bankroll corrente, in ordine di posto
+    insurance: dict = field(default_factory=dict)
+    side_results: dict = field(default_factory=dict)
+    hands: list = field(default_factory=list)  # ReplayHand in ordine (seat, hand_index)
+    report: object = None  # RoundSettlement ricalcolato alla chiusura
+    events: int = 0
+
+    def hand(self, username, hand_index):
+        for h in self.hands:
+            if h.username == username and h.hand_index == hand_index: return h
+        raise ValueError(f"Round {self.table_id}/{self.round_no}: mano {username}#{hand_index} inesistente")
+
+
+def _draw(rs, shoe, recorded, what):
+    # Ripesca dal sabot ricostruito e confronta con le carte registrate: il log è anche un audit
+    cards = bytes(shoe.draw() for _ in recorded)
+    if list(cards) != list(recorded):
+        raise ValueError(f"Round {rs.table_id}/{rs.round_no}: {what} divergente, log {list(recorded)} replay {list(cards)}")
+    return cards
+
+
+def replay_round(events):
+    # events: righe (table_id, round_no, kind, username, hand_index, data) in ordine di id
+    rs, shoe = None, None
+    for table_id, round_no, kind, u, idx, data in events:
+        data = json.loads(data) if data else {}
+        if rs is None: rs = RoundReplay(table_id, round_no)
+        rs.events += 1
+
+        if kind == "shoe":
+            rs.seed = data["seed"]; shoe = seeded_shoe(rs.seed)
+        elif kind == "deal":
+            rs.dealer_cards = rs.dealer_initial = _draw(rs, shoe, data["dealer"], "banco")
+            up = rs.dealer_cards[0]
+            for (pu, seat, br, bm, bp, b213), cards in zip(data["players"], data["cards"]):
+                p_hand = _draw(rs, shoe, cards, f"mano di {pu}")
+                br -= bm + bp + b213
+                side_msgs = []
+                if bp > 0:
+                    mult, lbl = settle_pair(p_hand)
+                    if mult > 0: br += int(bp * (mult + 1)); side_msgs.append(lbl)
+                if b213 > 0:
+                    mult, lbl = settle_21p3(p_hand, up)
+                    if mult > 0: br += int(b213 * (mult + 1)); side_msgs.append(lbl)
+                rs.bankrolls[pu] = br; rs.insurance[pu] = 0; rs.side_results[pu] = " | ".join(side_msgs)
+                rs.hands.append(ReplayHand(pu, seat, 0, p_hand, bm, "STAND" if calculate_score(p_hand) == 21 else "PLAYING"))
+            rs.status = "INSURANCE" if is_ace(up) else "PLAYING"
+        elif kind == "insurance":
+            rs.bankrolls[u] -= data["amount"]; rs.insurance[u] = data["amount"]
+        elif kind == "insurance_closed":
+            rs.status = "PLAYING"
+        elif kind == "hit":
+            h = rs.hand(u, idx)
+            h.cards += _draw(rs, shoe, [data["card"]], f"carta di {u}#{idx}")
+            score = h.score
+            if score > 21: h.status = "BUST"
+            elif score == 21: h.status = "STAND"
+        elif kind == "stand":
+            rs.hand(u, idx).status = "STAND"
+        elif kind == "double":
+            h = rs.hand(u, idx)
+            rs.bankrolls[u] -= h.bet
+            h.cards += _draw(rs, shoe, [data["card"]], f"raddoppio di {u}#{idx}")
+            h.bet *= 2; h.doubled = True
+            h.status = "BUST" if h.score > 21 else "STAND"
+        elif kind == "split":
+            h = rs.hand(u, idx)
+            c1, c2 = h.cards[0], h.cards[1]
+            drawn = _draw(rs, shoe, data["cards"], f"split di {u}")
+            status = "STAND" if is_ace(c1) and is_ace(c2) else "PLAYING"
+            rs.bankrolls[u] -= h.bet
+            h.cards = bytes([c1, drawn[0]]); h.status = status; h.is_split = True
+            rs.hands.insert(rs.hands.index(h) + 1, ReplayHand(u, h.seat, 1, bytes([c2, drawn[1]]), h.bet, status, is_split=True))
+        elif kind == "leave":
+            rs.hands = [h for h in rs.hands if h.username != u]
+            rs.bankrolls.pop(u, None)
+        elif kind == "settle":
+            d_hand = rs.dealer_cards
+            while calculate_score(d_hand) < 17:
+                d_hand += bytes([shoe.draw()])
+            if list(d_hand) != data["dealer"]:
+                raise ValueError(f"Round {rs.table_id}/{rs.round_no}: banco divergente, log {data['dealer']} replay {list(d_hand)}")
+            rows = [(h.username, rs.bankrolls[h.username], rs.insurance[h.username], h.hand_index, h.cards, h.score, h.status, h.bet, h.is_split)
+                    for h in rs.hands]
+            rs.report = settle_round(d_hand, rs.dealer_initial, rows)
+            rs.dealer_cards = d_hand; rs.status = "FINISHED"
+            recorded = {pu: tuple(v) for pu, v in data["bankrolls"].items() if pu in rs.report.bankrolls}
+            if recorded != rs.report.bankrolls:
+                raise ValueError(f"Round {rs.table_id}/{rs.round_no}: liquidazione divergente, log {recorded} replay {rs.report.bankrolls}")
+            rs.bankrolls = {pu: br for pu, (br, _) in rs.report.bankrolls.items()}
+        else:
+            raise ValueError(f"Evento sconosciuto: {kind}")
+    return rs
+
+
+def replay(table_id, round_no):
+    return replay_round(round_events(table_id, round_no))
+
+
+def replay_all(table_id=None):
+    # Replay massivo dello storico: ogni round viene rigiocato e verificato, il primo errore interrompe
+    return [replay_round(evs) for evs in iter_rounds(table_id)]
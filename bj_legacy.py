@@ -0,0 +1,66 @@
+# bj_legacy.py
+# Copia congelata delle funzioni originali di blackjack_app.py, con le carte come dict {'rank', 'suit'}:
+# è l'oracolo di bj_cards.verify_lookup_tables. Non importa niente da bj_cards e non va "ottimizzata":
+# se le regole cambiano si cambiano qui a mano, poi si rigenerano le tabelle.
+SUITS = ['♠', '♥', '♦', '♣']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+RANK_VALUE_21P3 = {'A': 14, 'K': 13, 'Q': 12, 'J': 11, '10': 10, '9': 9, '8': 8, '7': 7, '6': 6, '5': 5, '4': 4, '3': 3, '2': 2}
+PAIR_PAYOUT = {"mixed": 6, "colored": 12, "perfect": 25}
+P21P3_PAYOUT = {"straight_flush": 40, "three_kind": 30, "straight": 10, "flush": 5, "pair": 5}
+
+
+def card_dict(c):
+    # Intero compatto (rank_idx * 4 + suit_idx) -> carta del vecchio formato
+    return {'rank': RANKS[c // 4], 'suit': SUITS[c % 4]}
+
+
+def calculate_score(hand):
+    score = 0
+    aces = 0
+    for card in hand:
+        if card['rank'] in ['J', 'Q', 'K']: score += 10
+        elif card['rank'] == 'A':
+            aces += 1
+            score += 11
+        else: score += int(card['rank'])
+    while score > 21 and aces:
+        score -= 10
+        aces -= 1
+    return score
+
+
+def is_blackjack(hand):
+    return len(hand) == 2 and calculate_score(hand) == 21
+
+
+def suit_color_group(suit):
+    return "red" if suit in ['♥', '♦'] else "black"
+
+
+def settle_pair(player_hand):
+    if len(player_hand) < 2: return 0, ""
+    c1, c2 = player_hand[0], player_hand[1]
+    if c1['rank'] != c2['rank']: return 0, ""
+    if c1['suit'] == c2['suit']: return PAIR_PAYOUT["perfect"], "Perfect Pair (25x)"
+    if suit_color_group(c1['suit']) == suit_color_group(c2['suit']): return PAIR_PAYOUT["colored"], "Color Pair (12x)"
+    return PAIR_PAYOUT["mixed"], "Mixed Pair (6x)"
+
+
+def settle_21p3(player_hand, dealer_upcard):
+    if len(player_hand) < 2 or dealer_upcard is None: return 0, ""
+    cards = [player_hand[0], player_hand[1], dealer_upcard]
+    ranks = [c['rank'] for c in cards]; suits = [c['suit'] for c in cards]
+    vals = sorted([RANK_VALUE_21P3[r] for r in ranks])
+
+    flush = len(set(suits)) == 1
+    counts = {r: ranks.count(r) for r in set(ranks)}
+    three_kind = 3 in counts.values()
+    pair = 2 in counts.values()
+    straight = (vals == [2, 3, 14]) or (vals[0]+1 == vals[1] and vals[1]+1 == vals[2])
+
+    if straight and flush: return P21P3_PAYOUT["straight_flush"], "Straight Flush (40x)"
+    if three_kind: return P21P3_PAYOUT["three_kind"], "Three of a Kind (30x)"
+    if straight: return P21P3_PAYOUT["straight"], "Straight (10x)"
+    if flush: return P21P3_PAYOUT["flush"], "Flush (5x)"
+    if pair: return P21P3_PAYOUT["pair"], "One Pair (5x)"
+    return 0, ""
@@ -0,0 +1,382 @@
+# bj_sim.py
+# Simulatore Monte Carlo vettorizzato (NumPy) con le regole di blackjack_app.py:
+# sabot nuovo a ogni mano, banco che sta su tutti i 17, blackjack pagato 3:2, un solo split,
+# assi splittati con una sola carta, 21 su mano splittata pagato 1:1, raddoppio anche dopo split,
+# assicurazione 2:1, side bet Pair e 21+3 sulle carte iniziali.
+# Uso: python bj_sim.py --rounds 1000000 --workers 4 [--policy basic|dealer] [--verify 20000]
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bj_cards import (
+    ACE, DECKS_PER_SHOE, PAIR_PAYOUT, P21P3_PAYOUT, RANK_POINTS, RANKS, RED_SUITS,
+    calculate_score, is_ace, is_blackjack, is_pair_for_split, settle_21p3, settle_pair,
+)
+
+CARDS_PER_ROUND = 32  # banco + due mani splittate: nel caso peggiore realistico ne servono meno di 25
+BATCH_SIZE = 200_000
+DEAL_BLOCK = 8192
+BET_TYPES = ("main", "pair", "21+3", "insurance")
+
+# Punti "hard" per rank_idx (asso = 1) e valore della carta scoperta del banco (asso = 11)
+HARD_POINTS = np.array([min(p, 10) if p != 11 else 1 for p in RANK_POINTS], dtype=np.int16)
+UP_POINTS = np.array(RANK_POINTS, dtype=np.int16)
+IS_RED = np.array([(c & 3) in RED_SUITS for c in range(52)])
+
+# --- STRATEGIA ---
+# S = stai, H = carta, D = raddoppia (altrimenti carta), X = raddoppia (altrimenti stai).
+# Colonne: carta del banco 2, 3, 4, 5, 6, 7, 8, 9, 10, A. Strategia base 6 mazzi, S17, raddoppio dopo split.
+STAND, HIT, DOUBLE, DOUBLE_STAND = 0, 1, 2, 3
+_CODES = {"S": STAND, "H": HIT, "D": DOUBLE, "X": DOUBLE_STAND}
+_HARD = {9: "HDDDDHHHHH", 10: "DDDDDDDDHH", 11: "DDDDDDDDDH", 12: "HHSSSHHHHH",
+         13: "SSSSSHHHHH", 14: "SSSSSHHHHH", 15: "SSSSSHHHHH", 16: "SSSSSHHHHH"}
+_SOFT = {13: "HHHDDHHHHH", 14: "HHHDDHHHHH", 15: "HHDDDHHHHH", 16: "HHDDDHHHHH",
+         17: "HDDDDHHHHH", 18: "SXXXXSSHHH"}
+_SPLIT = {"2": "YYYYYYNNNN", "3": "YYYYYYNNNN", "4": "NNNYYNNNNN", "6": "YYYYYNNNNN",
+          "7": "YYYYYYNNNN", "8": "YYYYYYYYYY", "9": "YYYYYNYYNN", "A": "YYYYYYYYYY"}
+
+
+def _table(rows, low, high):
+    # Indici [totale, punti della carta del banco]; sotto low si chiede carta, da high in su si sta
+    t = np.full((32, 12), STAND, dtype=np.int8)
+    t[:low] = HIT
+    for total in range(low, high):
+        if total in rows:
+            t[total, 2:12] = [_CODES[a] for a in rows[total]]
+        else:
+            t[total] = HIT
+    return t
+
+
+HARD_ACTIONS = _table(_HARD, 9, 17)
+SOFT_ACTIONS = _table(_SOFT, 12, 19)
+SPLITS = np.zeros((13, 12), dtype=bool)
+for _rank, _row in _SPLIT.items():
+    SPLITS[RANKS.index(_rank), 2:12] = [a == "Y" for a in _row]
+
+POLICIES = ("basic", "dealer")
+
+
+def decide(policy, total, soft, up, two_cards):
+    # Vettorizzata: funziona su array NumPy e su scalari
+    if policy == "dealer":
+        return np.where(total < 17, HIT, STAND)
+    t = np.minimum(total, 31)
+    act = np.where(soft, SOFT_ACTIONS[t, up], HARD_ACTIONS[t, up])
+    act = np.where(act == DOUBLE, np.where(two_cards, DOUBLE, HIT), act)
+    return np.where(act == DOUBLE_STAND, np.where(two_cards, DOUBLE, STAND), act)
+
+
+def wants_split(policy, rank, up):
+    return policy == "basic" and SPLITS[rank, up]
+
+
+# --- SABOT ---
+def deal_cards(rng, rounds, k=CARDS_PER_ROUND):
+    # Prime k carte di un sabot da DECKS_PER_SHOE mazzi mescolato per ogni mano:
+    # Fisher-Yates parziale, k passi vettorizzati invece di mescolare 312 carte per riga.
+    # A blocchi di DEAL_BLOCK righe, così i sabot del blocco restano in cache durante gli scambi
+    out = np.empty((rounds, k), dtype=np.uint8)
+    for start in range(0, rounds, DEAL_BLOCK):
+        size = min(DEAL_BLOCK, rounds - start)
+        shoe = np.tile(np.arange(52, dtype=np.uint8), (size, DECKS_PER_SHOE))
+        rows = np.arange(size)
+        n = shoe.shape[1]
+        for i in range(k):
+            j = rng.integers(i, n, size=size)
+            picked = shoe[rows, j]
+            shoe[rows, j] = shoe[:, i]
+            shoe[:, i] = picked
+        out[start:start + size] = shoe[:, :k]
+    return out
+
+
+# --- PUNTEGGI VETTORIZZATI ---
+def _total(hard, aces):
+    soft = aces & (hard <= 11)
+    return np.where(soft, hard + 10, hard), soft
+
+
+def settle_pair_vec(c1, c2):
+    same_rank = (c1 >> 2) == (c2 >> 2)
+    mult = np.where((c1 & 3) == (c2 & 3), PAIR_PAYOUT["perfect"],
+                    np.where(IS_RED[c1] == IS_RED[c2], PAIR_PAYOUT["colored"], PAIR_PAYOUT["mixed"]))
+    return np.where(same_rank, mult, 0)
+
+
+def settle_21p3_vec(c1, c2, up):
+    vals = np.sort(np.stack([c1 >> 2, c2 >> 2, up >> 2], axis=1).astype(np.int16) + 2, axis=1)
+    v0, v1, v2 = vals[:, 0], vals[:, 1], vals[:, 2]
+    flush = ((c1 & 3) == (c2 & 3)) & ((c2 & 3) == (up & 3))
+    three_kind = v0 == v2
+    pair = ~three_kind & ((v0 == v1) | (v1 == v2))
+    straight = ((v0 == 2) & (v1 == 3) & (v2 == 14)) | ((v0 + 1 == v1) & (v1 + 1 == v2))
+    return np.select(
+        [straight & flush, three_kind, straight, flush, pair],
+        [P21P3_PAYOUT["straight_flush"], P21P3_PAYOUT["three_kind"], P21P3_PAYOUT["straight"],
+         P21P3_PAYOUT["flush"], P21P3_PAYOUT["pair"]],
+        0,
+    )
+
+
+def _play_hands(cards, ptr, hard, aces, n, bet, done, up, policy):
+    rows = np.arange(len(ptr))
+    while True:
+        active = ~done
+        if not active.any():
+            return ptr, hard, aces, n, bet
+        total, soft = _total(hard, aces)
+        act = decide(policy, total, soft, up, n == 2)
+        draw = active & (act != STAND)
+        done = done | (active & ~draw)
+        c = cards[rows, np.minimum(ptr, CARDS_PER_ROUND - 1)]
+        hard = hard + np.where(draw, HARD_POINTS[c >> 2], 0)
+        aces = aces | (draw & ((c >> 2) == ACE))
+        n = n + draw
+        ptr = ptr + draw
+        doubled = draw & (act == DOUBLE)
+        bet = np.where(doubled, bet * 2, bet)
+        total, _ = _total(hard, aces)
+        done = done | doubled | (draw & (total >= 21))
+
+
+def _settle_hands(hard, aces, n, bet, is_split, d_total):
+    total, _ = _total(hard, aces)
+    split_21 = is_split & (n == 2) & (total == 21)
+    win = (d_total > 21) | (total > d_total)
+    net = np.where(win, bet, np.where(total == d_total, 0, -bet))
+    net = np.where(split_21, bet, net)
+    return np.where(total > 21, -bet, net)
+
+
+def simulate_batch(rng, rounds, policy="basic"):
+    # Esiti netti per unità puntata: main, pair, 21+3 per ogni mano; insurance solo con asso scoperto
+    cards = deal_cards(rng, rounds)
+    rows = np.arange(rounds)
+    d1, d2, p1, p2 = cards[:, 0], cards[:, 1], cards[:, 2], cards[:, 3]
+    up = UP_POINTS[d1 >> 2]
+
+    pair_mult = settle_pair_vec(p1, p2)
+    pair = np.where(pair_mult > 0, pair_mult, -1).astype(np.float64)
+    p21_mult = settle_21p3_vec(p1, p2, d1)
+    p21 = np.where(p21_mult > 0, p21_mult, -1).astype(np.float64)
+
+    d_hard = HARD_POINTS[d1 >> 2] + HARD_POINTS[d2 >> 2]
+    d_aces = ((d1 >> 2) == ACE) | ((d2 >> 2) == ACE)
+    dealer_bj = _total(d_hard, d_aces)[0] == 21
+    p_hard = HARD_POINTS[p1 >> 2] + HARD_POINTS[p2 >> 2]
+    p_aces = ((p1 >> 2) == ACE) | ((p2 >> 2) == ACE)
+    player_bj = _total(p_hard, p_aces)[0] == 21
+
+    offered = (d1 >> 2) == ACE
+    insurance = np.where(dealer_bj, 2.0, -1.0)[offered]
+
+    main = np.where(dealer_bj, np.where(player_bj, 0.0, -1.0), np.where(player_bj, 1.5, 0.0))
+    play = ~dealer_bj & ~player_bj
+
+    split = play & ((p1 >> 2) == (p2 >> 2))
+    if policy == "basic":
+        split &= SPLITS[p1 >> 2, up]
+    else:
+        split &= False
+    split_aces = split & ((p1 >> 2) == ACE)
+
+    # Mano 0: in caso di split riceve subito la carta successiva, poi la mano 1 la seguente
+    second0 = np.where(split, cards[:, 4], p2)
+    ptr = np.where(split, 6, 4)
+    hard0 = HARD_POINTS[p1 >> 2] + HARD_POINTS[second0 >> 2]
+    aces0 = ((p1 >> 2) == ACE) | ((second0 >> 2) == ACE)
+    n0 = np.full(rounds, 2)
+    bet0 = np.ones(rounds)
+    ptr, hard0, aces0, n0, bet0 = _play_hands(cards, ptr, hard0, aces0, n0, bet0, ~play | split_aces, up, policy)
+
+    hard1 = HARD_POINTS[p2 >> 2] + HARD_POINTS[cards[:, 5] >> 2]
+    aces1 = ((p2 >> 2) == ACE) | ((cards[:, 5] >> 2) == ACE)
+    n1 = np.full(rounds, 2)
+    bet1 = np.ones(rounds)
+    ptr, hard1, aces1, n1, bet1 = _play_hands(cards, ptr, hard1, aces1, n1, bet1, ~split | split_aces, up, policy)
+
+    # Banco: pesca finché è sotto 17 (sta su tutti i 17, anche soft)
+    d_done = ~play
+    while True:
+        d_total, _ = _total(d_hard, d_aces)
+        draw = ~d_done & (d_total < 17)
+        if not draw.any():
+            break
+        c = cards[rows, np.minimum(ptr, CARDS_PER_ROUND - 1)]
+        d_hard = d_hard + np.where(draw, HARD_POINTS[c >> 2], 0)
+        d_aces = d_aces | (draw & ((c >> 2) == ACE))
+        ptr = ptr + draw
+    # Le letture oltre il buffer sono bloccate sull'ultima carta: un round così avrebbe esiti sbagliati, non un errore
+    if ptr.max() > CARDS_PER_ROUND:
+        raise RuntimeError(f"Sabot simulato troppo corto: {int((ptr > CARDS_PER_ROUND).sum())} round oltre {CARDS_PER_ROUND} carte")
+
+    net0 = _settle_hands(hard0, aces0, n0, bet0, split, d_total)
+    net1 = np.where(split, _settle_hands(hard1, aces1, n1, bet1, split, d_total), 0)
+    main = np.where(play, net0 + net1, main)
+    return {"main": main, "pair": pair, "21+3": p21, "insurance": insurance}
+
+
+# --- RIFERIMENTO (scalare, con le funzioni del gioco) ---
+def _decide_one(policy, hand, up):
+    hard = sum(int(HARD_POINTS[c >> 2]) for c in hand)
+    total = calculate_score(hand)
+    return int(decide(policy, total, total != hard, up, len(hand) == 2))
+
+
+def reference_round(row, policy="basic"):
+    # Stessa sequenza di start_game / player_* / end_round, una carta alla volta
+    cards = [int(c) for c in row]
+    pos = 4
+    dealer = bytes(cards[:2])
+    hand = bytes(cards[2:4])
+    up = dealer[0]
+    up_pts = RANK_POINTS[up >> 2]
+
+    mult, _ = settle_pair(hand)
+    pair = mult if mult else -1
+    mult, _ = settle_21p3(hand, up)
+    p21 = mult if mult else -1
+    insurance = (2 if is_blackjack(dealer) else -1) if is_ace(up) else None
+
+    if is_blackjack(dealer):
+        return (0 if is_blackjack(hand) else -1), pair, p21, insurance
+    if is_blackjack(hand):
+        return 1.5, pair, p21, insurance
+
+    hands = [[hand, 1, False]]
+    split_aces = False
+    if is_pair_for_split(hand) and wants_split(policy, hand[0] >> 2, up_pts):
+        hands = [[bytes([hand[0], cards[pos]]), 1, True], [bytes([hand[1], cards[pos + 1]]), 1, True]]
+        pos += 2
+        split_aces = is_ace(hand[0])
+
+    for h in hands:
+        while not split_aces and calculate_score(h[0]) < 21:
+            act = _decide_one(policy, h[0], up_pts)
+            if act == STAND:
+                break
+            h[0] = h[0] + bytes([cards[pos]])
+            pos += 1
+            if act == DOUBLE:
+                h[1] *= 2
+                break
+
+    while calculate_score(dealer) < 17:
+        dealer = dealer + bytes([cards[pos]])
+        pos += 1
+    d_score = calculate_score(dealer)
+
+    main = 0
+    for h, bet, is_split in hands:
+        sc = calculate_score(h)
+        if sc > 21: main -= bet
+        elif is_blackjack(h) and is_split: main += bet
+        elif d_score > 21 or sc > d_score: main += bet
+        elif sc < d_score: main -= bet
+    return main, pair, p21, insurance
+
+
+def verify(rounds=20_000, seed=0, policy="basic"):
+    # Il motore vettorizzato deve dare esattamente gli stessi esiti del riferimento scalare
+    rng = np.random.default_rng(seed)
+    state = rng.bit_generator.state
+    res = simulate_batch(rng, rounds, policy)
+    rng.bit_generator.state = state
+    cards = deal_cards(rng, rounds)
+    ins = iter(res["insurance"])
+    mismatches = 0
+    for i in range(rounds):
+        main, pair, p21, insurance = reference_round(cards[i], policy)
+        got_ins = next(ins) if insurance is not None else None
+        if (main, pair, p21, insurance) != (res["main"][i], res["pair"][i], res["21+3"][i], got_ins):
+            mismatches += 1
+    return mismatches
+
+
+# --- STATISTICHE ---
+def _accumulate(results):
+    return {k: (len(v), float(v.sum()), float(np.square(v).sum())) for k, v in results.items()}
+
+
+def _run_chunk(args):
+    seed_seq, rounds, policy = args
+    rng = np.random.default_rng(seed_seq)
+    return _accumulate(simulate_batch(rng, rounds, policy))
+
+
+def summarize(totals):
+    out = {}
+    for k in BET_TYPES:
+        n, s, ss = totals.get(k, (0, 0.0, 0.0))
+        if n < 2:
+            out[k] = {"n": n, "ev": None, "variance": None, "ci95": None}
+            continue
+        ev = s / n
+        var = (ss - n * ev * ev) / (n - 1)
+        out[k] = {"n": n, "ev": ev, "variance": var, "ci95": 1.96 * math.sqrt(var / n)}
+    return out
+
+
+def simulate(rounds, workers=1, seed=None, policy="basic", batch=BATCH_SIZE):
+    if policy not in POLICIES:
+        raise ValueError(f"Strategia sconosciuta: {policy}")
+    sizes = [batch] * (rounds // batch) + ([rounds % batch] if rounds % batch else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(s, n, policy) for s, n in zip(seeds, sizes)]
+
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_run_chunk, tasks))
+    else:
+        parts = [_run_chunk(t) for t in tasks]
+    elapsed = time.perf_counter() - t0
+
+    totals = {}
+    for part in parts:
+        for k, (n, s, ss) in part.items():
+            tn, ts, tss = totals.get(k, (0, 0.0, 0.0))
+            totals[k] = (tn + n, ts + s, tss + ss)
+    return {
+        "rounds": rounds,
+        "policy": policy,
+        "workers": workers,
+        "seconds": elapsed,
+        "rounds_per_sec": rounds / elapsed if elapsed else float("inf"),
+        "bets": summarize(totals),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulazione Monte Carlo del blackjack del Terrazzo")
+    parser.add_argument("--rounds", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--policy", choices=POLICIES, default="basic")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--verify", type=int, default=0, help="confronta N mani con il riferimento scalare")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        bad = verify(args.verify, args.seed or 0, args.policy)
+        print(f"Verifica su {args.verify} mani: {bad} differenze")
+        if bad:
+            return 1
+
+    res = simulate(args.rounds, args.workers, args.seed, args.policy, args.batch)
+    print(f"{res['rounds']} mani, strategia {res['policy']}, {res['workers']} processi: "
+          f"{res['seconds']:.2f}s ({res['rounds_per_sec']:,.0f} mani/s)")
+    print(f"{'puntata':<10} {'mani':>10} {'EV':>9} {'± IC95':>8} {'varianza':>10}")
+    for k, r in res["bets"].items():
+        if r["ev"] is None:
+            continue
+        print(f"{k:<10} {r['n']:>10} {r['ev'] * 100:>8.2f}% {r['ci95'] * 100:>7.2f}% {r['variance']:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+# bj_snapshot.py
+# Stato di un tavolo di blackjack per il rendering: partita, giocatori, mani e turno letti in una sola
+# transazione di lettura. Gli snapshot sono immutabili e condivisi in processo per (tavolo, versione):
+# tutti gli spettatori dello stesso stato usano una sola lettura dal database.
+import threading
+from dataclasses import dataclass
+
+import db
+from db import get_connection
+from bj_cards import calculate_score
+
+
+@dataclass(frozen=True)
+class HandView:
+    hand_index: int
+    cards: bytes
+    score: int
+    status: str
+    bet: int
+
+
+@dataclass(frozen=True)
+class PlayerView:
+    username: str
+    seat: int
+    bankroll: int
+    bet_main: int
+    bet_pair: int
+    bet_21p3: int
+    side_result: str
+    main_result: str
+    insurance_taken: bool
+    hands: tuple = ()
+
+
+@dataclass(frozen=True)
+class TableSnapshot:
+    table_id: int
+    name: str
+    version: int
+    status: str
+    dealer: bytes
+    current_seat: int
+    current_hand_index: int
+    players: tuple = ()  # PlayerView in ordine di posto
+
+    def player(self, username):
+        return next((p for p in self.players if p.username == username), None)
+
+    def is_seated(self, username):
+        return self.player(username) is not None
+
+    @property
+    def turn(self):
+        # Giocatore di turno (solo durante PLAYING)
+        if self.status != 'PLAYING': return None
+        return next((p.username for p in self.players if p.seat == self.current_seat), None)
+
+    @property
+    def dealer_score(self):
+        return calculate_score(self.dealer) if self.status == 'FINISHED' else None
+
+    def can_take_insurance(self, username):
+        # Stesse regole di can_take_insurance_strict, sui dati già caricati
+        if self.status != 'INSURANCE': return False
+        p = self.player(username)
+        if p is None or p.insurance_taken: return False
+        return len(p.hands) == 1 and len(p.hands[0].cards) == 2
+
+    def insurance_amount(self, username):
+        return self.player(username).hands[0].bet // 2
+
+
+PLAYERS_SQL = """
+    SELECT p.username, p.seat, p.bankroll, p.bet_main, p.bet_pair, p.bet_21p3, p.side_result, p.main_result, p.insurance_taken,
+           h.hand_index, h.cards, h.score, h.status, h.bet
+    FROM bj_players p LEFT JOIN bj_hands h ON h.username = p.username
+    WHERE p.table_id = ? ORDER BY p.seat, h.hand_index
+"""
+
+
+def load_snapshot(table_id):
+    # BEGIN esplicito: partita e giocatori vengono dalla stessa versione del database (WAL)
+    conn = get_connection()
+    conn.execute("BEGIN")
+    try:
+        game = conn.execute("SELECT name, version, status, dealer_cards, current_seat, current_hand_index FROM bj_game WHERE id=?", (table_id,)).fetchone()
+        if game is None: return None
+        rows = conn.execute(PLAYERS_SQL, (table_id,)).fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+
+    players, last, hands = [], None, None
+    for u, seat, br, bm, bp, b213, side, main, ins, idx, cards, sc, stt, bt in rows:
+        if u != last:
+            hands = []
+            players.append((u, seat, int(br or 0), int(bm or 0), int(bp or 0), int(b213 or 0), side or "", main or "", bool(ins), hands))
+            last = u
+        if idx is not None: hands.append(HandView(idx, cards or b"", int(sc or 0), stt, int(bt or 0)))
+    name, version, status, d_hand, c_seat, h_idx = game
+    return TableSnapshot(table_id, name, version, status, d_hand or b"", c_seat, h_idx,
+                         tuple(PlayerView(*p[:-1], tuple(p[-1])) for p in players))
+
+
+# --- CACHE IN PROCESSO ---
+# Un solo snapshot per (database, tavolo): una versione nuova sostituisce la vecchia, che nessuno chiederà più
+_cache_lock = threading.Lock()
+_cache = {}
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_snapshot(table_id, version):
+    key = (db.DB_NAME, table_id)
+    with _cache_lock:
+        snap = _cache.get(key)
+        if snap is not None and snap.version >= version:
+            _stats["hits"] += 1
+            return snap
+        _stats["misses"] += 1
+    snap = load_snapshot(table_id)
+    if snap is None: return None
+    with _cache_lock:
+        cur = _cache.get(key)
+        if cur is None or cur.version < snap.version: _cache[key] = snap
+    return snap
+
+
+def snapshot_stats():
+    with _cache_lock:
+        return dict(_stats, tables=len(_cache))
+
+
+def clear_snapshots():
+    with _cache_lock:
+        _cache.clear()
+        for k in _stats:
+            _stats[k] = 0
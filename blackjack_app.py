@@ -1,503 +1,490 @@
 import streamlit as st
-import sqlite3
-import json
 import random
 import time
-import hashlib
-
-# --- CONFIGURAZIONE E COSTANTI ---
-DB_NAME = 'terrazzo_vito.db' 
-
-SUITS = ['♠', '♥', '♦', '♣']
-RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-RANK_VALUE_21P3 = {'A': 14, 'K': 13, 'Q': 12, 'J': 11, '10': 10, '9': 9, '8': 8, '7': 7, '6': 6, '5': 5, '4': 4, '3': 3, '2': 2}
-PAIR_PAYOUT = {"mixed": 6, "colored": 12, "perfect": 25}
-P21P3_PAYOUT = {"straight_flush": 40, "three_kind": 30, "straight": 10, "flush": 5, "pair": 5}
-
-# --- DATABASE HELPERS ---
-def get_connection():
-    return sqlite3.connect(DB_NAME)
+from streamlit.errors import StreamlitAPIException
+
+from db import get_connection
+from migrations import migrate
+from bj_events import log_event
+from bj_snapshot import get_snapshot
+from bj_cards import (
+    Shoe, seeded_shoe, calculate_score, is_blackjack, is_pair_for_split, is_ace, is_ten_value,
+    settle_pair, settle_21p3, settle_round, render_card_span,
+)
+
+# --- SABOT (bytes + cursore) ---
+def load_shoe(conn, table_id):
+    cards, pos = conn.execute("SELECT shoe, shoe_pos FROM bj_game WHERE id=?", (table_id,)).fetchone()
+    return Shoe(cards, pos)
+
+def save_shoe(conn, table_id, shoe):
+    # Carta distribuita = solo il cursore avanza; il sabot si riscrive solo dopo un rimescolamento
+    if shoe.reshuffled:
+        conn.execute("UPDATE bj_game SET shoe=?, shoe_pos=? WHERE id=?", (shoe.cards, shoe.pos, table_id))
+        shoe.reshuffled = False
+    else:
+        conn.execute("UPDATE bj_game SET shoe_pos=? WHERE id=?", (shoe.pos, table_id))
 
-def ensure_column(conn, table, col, coldef):
-    try:
-        cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
-        if col not in cols:
-            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {coldef}")
-    except: pass
+# --- VERSIONE TAVOLO ---
+# Ogni azione che cambia il tavolo incrementa bj_game.version nella stessa transazione:
+# i client in attesa leggono solo questo numero e ricaricano il tavolo quando cambia.
+def bump_version(conn, table_id):
+    conn.execute("UPDATE bj_game SET version = version + 1 WHERE id=?", (table_id,))
 
-def init_blackjack_db():
+def locate_table(username, watch=None):
+    # (table_id, version) del tavolo dove siede l'utente, altrimenti di quello che sta guardando
     conn = get_connection()
-    c = conn.cursor()
-    
-    # Tabelle Blackjack
-    c.execute('''CREATE TABLE IF NOT EXISTS bj_game (
-        id INTEGER PRIMARY KEY,
-        status TEXT,
-        dealer_hand TEXT,
-        dealer_initial_hand TEXT,
-        current_player_index INTEGER,
-        current_hand_index INTEGER,
-        deck TEXT
-    )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS bj_players (
-        username TEXT PRIMARY KEY,
-        status TEXT,
-        bankroll INTEGER DEFAULT 2000,
-        bet_main INTEGER DEFAULT 0,
-        bet_pair INTEGER DEFAULT 0,
-        bet_21p3 INTEGER DEFAULT 0,
-        insurance_bet INTEGER DEFAULT 0,
-        insurance_taken INTEGER DEFAULT 0,
-        side_result TEXT DEFAULT '',
-        main_result TEXT DEFAULT ''
-    )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS bj_hands (
-        username TEXT,
-        hand_index INTEGER,
-        hand TEXT,
-        score INTEGER,
-        status TEXT,
-        bet INTEGER,
-        doubled INTEGER DEFAULT 0,
-        is_split_hand INTEGER DEFAULT 0,
-        PRIMARY KEY (username, hand_index)
-    )''')
-
-    # Migrazioni
-    ensure_column(conn, "bj_game", "dealer_initial_hand", "TEXT DEFAULT '[]'")
-    ensure_column(conn, "bj_game", "current_hand_index", "INTEGER DEFAULT 0")
-    ensure_column(conn, "bj_players", "insurance_bet", "INTEGER DEFAULT 0")
-    ensure_column(conn, "bj_players", "insurance_taken", "INTEGER DEFAULT 0")
-    ensure_column(conn, "bj_hands", "is_split_hand", "INTEGER DEFAULT 0")
-    
-    if c.execute("SELECT count(*) FROM bj_game").fetchone()[0] == 0:
-        c.execute("INSERT INTO bj_game (id, status, dealer_hand, dealer_initial_hand, current_player_index, current_hand_index, deck) VALUES (1,'WAITING','[]','[]',0,0,'[]')")
-    
-    conn.commit()
+    row = conn.execute(
+        "SELECT id, version FROM bj_game WHERE id = coalesce((SELECT table_id FROM bj_players WHERE username=?), ?)",
+        (username, watch),
+    ).fetchone()
     conn.close()
-
-# --- LOGICA DI GIOCO ---
-def create_deck():
-    deck = [{'rank': r, 'suit': s} for s in SUITS for r in RANKS] * 6 
-    random.shuffle(deck)
-    return json.dumps(deck)
-
-def pop_card(deck):
-    if len(deck) == 0:
-        deck[:] = json.loads(create_deck())
-    return deck.pop()
-
-def calculate_score(hand):
-    score = 0
-    aces = 0
-    for card in hand:
-        if card['rank'] in ['J', 'Q', 'K']: score += 10
-        elif card['rank'] == 'A':
-            aces += 1
-            score += 11
-        else: score += int(card['rank'])
-    while score > 21 and aces:
-        score -= 10
-        aces -= 1
-    return score
-
-def is_blackjack(hand):
-    return len(hand) == 2 and calculate_score(hand) == 21
-
-def is_pair_for_split(hand):
-    return len(hand) == 2 and hand[0]['rank'] == hand[1]['rank']
+    return row
+
+# --- TAVOLI ---
+TABLE_SEATS = 7
+
+def create_table(conn, max_seats=TABLE_SEATS):
+    cur = conn.execute(
+        """INSERT INTO bj_game (name, max_seats, status, dealer_hand, dealer_initial_hand, deck, dealer_cards, dealer_initial_cards, shoe, shoe_pos, current_seat, current_hand_index, version)
+        SELECT 'Tavolo ' || (coalesce(max(id), 0) + 1), ?, 'WAITING', '[]', '[]', '[]', x'', x'', x'', 0, 0, 0, 0 FROM bj_game""",
+        (max_seats,),
+    )
+    return cur.lastrowid
+
+def ensure_free_table(conn):
+    # Quando tutti i tavoli in attesa sono pieni se ne apre uno nuovo
+    free = conn.execute("""SELECT 1 FROM bj_game g WHERE g.status = 'WAITING'
+        AND (SELECT count(*) FROM bj_players p WHERE p.table_id = g.id) < g.max_seats LIMIT 1""").fetchone()
+    if not free: return create_table(conn)
+
+def list_tables():
+    conn = get_connection()
+    rows = conn.execute("""SELECT g.id, g.name, g.status, g.max_seats, count(p.username)
+        FROM bj_game g LEFT JOIN bj_players p ON p.table_id = g.id
+        GROUP BY g.id ORDER BY g.id""").fetchall()
+    conn.close()
+    return rows
 
 def dealer_upcard(dealer_hand):
     return dealer_hand[0] if dealer_hand else None
 
-def is_ace(card):
-    return card and card.get('rank') == 'A'
-
-def suit_color_group(suit):
-    return "red" if suit in ['♥', '♦'] else "black"
-
-def settle_pair(player_hand):
-    if len(player_hand) < 2: return 0, ""
-    c1, c2 = player_hand[0], player_hand[1]
-    if c1['rank'] != c2['rank']: return 0, ""
-    if c1['suit'] == c2['suit']: return PAIR_PAYOUT["perfect"], "Perfect Pair (25x)"
-    if suit_color_group(c1['suit']) == suit_color_group(c2['suit']): return PAIR_PAYOUT["colored"], "Color Pair (12x)"
-    return PAIR_PAYOUT["mixed"], "Mixed Pair (6x)"
-
-def settle_21p3(player_hand, dealer_upcard):
-    if len(player_hand) < 2 or dealer_upcard is None: return 0, ""
-    cards = [player_hand[0], player_hand[1], dealer_upcard]
-    ranks = [c['rank'] for c in cards]; suits = [c['suit'] for c in cards]
-    vals = sorted([RANK_VALUE_21P3[r] for r in ranks])
-    
-    flush = len(set(suits)) == 1
-    counts = {r: ranks.count(r) for r in set(ranks)}
-    three_kind = 3 in counts.values()
-    pair = 2 in counts.values()
-    straight = (vals == [2, 3, 14]) or (vals[0]+1 == vals[1] and vals[1]+1 == vals[2])
-    
-    if straight and flush: return P21P3_PAYOUT["straight_flush"], "Straight Flush (40x)"
-    if three_kind: return P21P3_PAYOUT["three_kind"], "Three of a Kind (30x)"
-    if straight: return P21P3_PAYOUT["straight"], "Straight (10x)"
-    if flush: return P21P3_PAYOUT["flush"], "Flush (5x)"
-    if pair: return P21P3_PAYOUT["pair"], "One Pair (5x)"
-    return 0, ""
-
-def can_take_insurance_strict(conn, username):
-    status = conn.execute("SELECT status FROM bj_game WHERE id=1").fetchone()[0]
+def can_take_insurance_strict(conn, username, table_id):
+    status = conn.execute("SELECT status FROM bj_game WHERE id=?", (table_id,)).fetchone()[0]
     if status != "INSURANCE": return False
-    hands = conn.execute("SELECT hand FROM bj_hands WHERE username=?", (username,)).fetchall()
+    hands = conn.execute("SELECT cards FROM bj_hands WHERE username=? AND table_id=?", (username, table_id)).fetchall()
     if len(hands) != 1: return False
-    try: hand0 = json.loads(hands[0][0] or "[]")
-    except: return False
-    if len(hand0) != 2: return False
+    if len(hands[0][0] or b"") != 2: return False
     taken = conn.execute("SELECT insurance_taken FROM bj_players WHERE username=?", (username,)).fetchone()[0]
     if taken: return False
     return True
 
 # --- AZIONI DEL GIOCO ---
-def join_blackjack(username):
+def join_blackjack(username, table_id):
     conn = get_connection()
-    status = conn.execute("SELECT status FROM bj_game WHERE id=1").fetchone()[0]
-    if status in ['PLAYING', 'INSURANCE']:
-        conn.close(); return False, "Gioco in corso!"
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        conn.execute("INSERT INTO bj_players (username, status, bankroll, bet_main, bet_pair, bet_21p3, insurance_bet, insurance_taken, side_result, main_result) VALUES (?, 'READY', 2000, 0, 0, 0, 0, 0, '', '')", (username,))
-        conn.execute("INSERT INTO bj_hands (username, hand_index, hand, score, status, bet, doubled, is_split_hand) VALUES (?, 0, '[]', 0, 'READY', 0, 0, 0)", (username,))
-        conn.commit(); conn.close()
+        table = conn.execute("SELECT status, max_seats FROM bj_game WHERE id=?", (table_id,)).fetchone()
+        if table is None: return False, "Tavolo inesistente."
+        status, max_seats = table
+        if status in ['PLAYING', 'INSURANCE']: return False, "Gioco in corso!"
+        if conn.execute("SELECT 1 FROM bj_players WHERE username=?", (username,)).fetchone(): return True, "Già seduto."
+        taken = {r[0] for r in conn.execute("SELECT seat FROM bj_players WHERE table_id=?", (table_id,)).fetchall()}
+        free = [s for s in range(max_seats) if s not in taken]
+        if not free: return False, "Tavolo pieno!"
+        conn.execute("INSERT INTO bj_players (username, table_id, seat, status, bankroll, bet_main, bet_pair, bet_21p3, insurance_bet, insurance_taken, side_result, main_result) VALUES (?, ?, ?, 'READY', 2000, 0, 0, 0, 0, 0, '', '')", (username, table_id, free[0]))
+        conn.execute("INSERT INTO bj_hands (username, table_id, seat, hand_index, cards, score, status, bet, doubled, is_split_hand) VALUES (?, ?, ?, 0, x'', 0, 'READY', 0, 0, 0)", (username, table_id, free[0]))
+        if len(free) == 1: ensure_free_table(conn)
+        bump_version(conn, table_id); conn.commit()
         return True, "Seduto!"
-    except:
-        conn.close(); return True, "Già seduto."
+    finally:
+        conn.close()
 
 def leave_blackjack(username):
     conn = get_connection()
-    conn.execute("DELETE FROM bj_hands WHERE username=?", (username,))
-    conn.execute("DELETE FROM bj_players WHERE username=?", (username,))
-    cnt = conn.execute("SELECT count(*) FROM bj_players").fetchone()[0]
-    if cnt == 0:
-        conn.execute("UPDATE bj_game SET status='WAITING', dealer_hand='[]', dealer_initial_hand='[]', current_player_index=0, current_hand_index=0, deck='[]' WHERE id=1")
-    conn.commit(); conn.close()
-
-def start_game():
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT p.table_id, g.status FROM bj_players p JOIN bj_game g ON g.id = p.table_id WHERE p.username=?", (username,)).fetchone()
+        if not row: return
+        table_id, status = row
+        # Chi esce con il turno in mano lo passa: stessa transazione, come uno stand
+        has_turn = status == 'PLAYING' and get_current_turn(conn, table_id)[0] == username
+        if status in ('PLAYING', 'INSURANCE'): log_event(conn, table_id, "leave", username)
+        conn.execute("DELETE FROM bj_hands WHERE username=?", (username,))
+        conn.execute("DELETE FROM bj_players WHERE username=?", (username,))
+        cnt = conn.execute("SELECT count(*) FROM bj_players WHERE table_id=?", (table_id,)).fetchone()[0]
+        if cnt == 0:
+            conn.execute("UPDATE bj_game SET status='WAITING', dealer_cards=x'', dealer_initial_cards=x'', current_seat=0, current_hand_index=0, shoe=x'', shoe_pos=0 WHERE id=?", (table_id,))
+        elif has_turn:
+            advance_turn(conn, table_id)
+        bump_version(conn, table_id); conn.commit()
+    finally:
+        conn.close()
+
+def start_game(table_id, seed=None):
     conn = get_connection()
-    deck = json.loads(create_deck())
-    players = conn.execute("SELECT username, bankroll, bet_main, bet_pair, bet_21p3 FROM bj_players").fetchall()
-    
-    if not players: conn.close(); return False, "Nessun giocatore"
-
-    valid_players = []
-    bad_players = []
-    for u, br, bm, bp, b213 in players:
-        bm, bp, b213, br = int(bm or 0), int(bp or 0), int(b213 or 0), int(br or 0)
-        if bm > 0 and (bm + bp + b213) <= br: valid_players.append(u)
-        else: bad_players.append(u)
-    
-    if len(bad_players) > 0:
-        conn.close(); return False, f"Puntate non valide per: {', '.join(bad_players)}"
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Il seme finisce nello storico: il round si può rigiocare identico (un sabot nuovo basta per un round intero)
+        if seed is None: seed = random.getrandbits(63)
+        shoe = seeded_shoe(seed)
+        players = conn.execute("SELECT username, seat, bankroll, bet_main, bet_pair, bet_21p3 FROM bj_players WHERE table_id=? ORDER BY seat", (table_id,)).fetchall()
+        
+        if not players: return False, "Nessun giocatore"
+
+        valid_players = []
+        bad_players = []
+        for u, _, br, bm, bp, b213 in players:
+            bm, bp, b213, br = int(bm or 0), int(bp or 0), int(b213 or 0), int(br or 0)
+            if bm > 0 and (bm + bp + b213) <= br: valid_players.append(u)
+            else: bad_players.append(u)
+        
+        if len(bad_players) > 0:
+            return False, f"Puntate non valide per: {', '.join(bad_players)}"
 
-    dealer_hand = [pop_card(deck), pop_card(deck)]
-    d_initial = dealer_hand[:]
-    up = dealer_hand[0]
-    
-    conn.execute("DELETE FROM bj_hands")
-
-    for u, br, bm, bp, b213 in players:
-        bm, bp, b213, br = int(bm or 0), int(bp or 0), int(b213 or 0), int(br or 0)
-        p_hand = [pop_card(deck), pop_card(deck)]
-        p_score = calculate_score(p_hand)
-        total_bet = bm + bp + b213
-        br -= total_bet
+        dealer_hand = bytes([shoe.draw(), shoe.draw()])
+        d_initial = dealer_hand
+        up = dealer_hand[0]
         
-        side_msgs = []
-        if bp > 0:
-            mult, lbl = settle_pair(p_hand)
-            if mult > 0: br += int(bp * (mult + 1)); side_msgs.append(lbl)
-        if b213 > 0:
-            mult, lbl = settle_21p3(p_hand, up)
-            if mult > 0: br += int(b213 * (mult + 1)); side_msgs.append(lbl)
+        conn.execute("DELETE FROM bj_hands WHERE table_id=?", (table_id,))
+
+        dealt, dealt_cards = [], []
+        for u, seat, br, bm, bp, b213 in players:
+            bm, bp, b213, br = int(bm or 0), int(bp or 0), int(b213 or 0), int(br or 0)
+            p_hand = bytes([shoe.draw(), shoe.draw()])
+            dealt.append((u, seat, br, bm, bp, b213)); dealt_cards.append(list(p_hand))
+            p_score = calculate_score(p_hand)
+            total_bet = bm + bp + b213
+            br -= total_bet
             
-        p_status = "PLAYING"
-        if p_score == 21: p_status = "STAND"
-
-        conn.execute("UPDATE bj_players SET status='PLAYING', bankroll=?, side_result=?, main_result='', insurance_bet=0, insurance_taken=0 WHERE username=?", (br, " | ".join(side_msgs), u))
-        conn.execute("INSERT INTO bj_hands (username, hand_index, hand, score, status, bet, doubled, is_split_hand) VALUES (?, 0, ?, ?, ?, ?, 0, 0)", (u, json.dumps(p_hand), p_score, p_status, bm))
-
-    dealer_has_blackjack = is_blackjack(d_initial)
-    up_rank = up['rank']
-    up_is_ten = up_rank in ['10','J','Q','K']
-    is_ace_up = is_ace(up)
-
-    next_status = 'PLAYING'
-    if is_ace_up: next_status = 'INSURANCE'
-
-    conn.execute("UPDATE bj_game SET status=?, deck=?, dealer_hand=?, dealer_initial_hand=?, current_player_index=0, current_hand_index=0 WHERE id=1", (next_status, json.dumps(deck), json.dumps(dealer_hand), json.dumps(d_initial)))
-    conn.commit()
-
-    if dealer_has_blackjack and up_is_ten:
-        conn.close(); end_round(); return True, "Banco Blackjack! Partita terminata."
-    
-    conn.close()
-    if next_status == 'PLAYING': next_turn_logic()
-    return True, "Partita iniziata"
+            side_msgs = []
+            if bp > 0:
+                mult, lbl = settle_pair(p_hand)
+                if mult > 0: br += int(bp * (mult + 1)); side_msgs.append(lbl)
+            if b213 > 0:
+                mult, lbl = settle_21p3(p_hand, up)
+                if mult > 0: br += int(b213 * (mult + 1)); side_msgs.append(lbl)
+                
+            p_status = "PLAYING"
+            if p_score == 21: p_status = "STAND"
+
+            conn.execute("UPDATE bj_players SET status='PLAYING', bankroll=?, side_result=?, main_result='', insurance_bet=0, insurance_taken=0 WHERE username=?", (br, " | ".join(side_msgs), u))
+            conn.execute("INSERT INTO bj_hands (username, table_id, seat, hand_index, cards, score, status, bet, doubled, is_split_hand) VALUES (?, ?, ?, 0, ?, ?, ?, ?, 0, 0)", (u, table_id, seat, p_hand, p_score, p_status, bm))
+
+        dealer_has_blackjack = is_blackjack(d_initial)
+        up_is_ten = is_ten_value(up)
+        is_ace_up = is_ace(up)
+
+        next_status = 'PLAYING'
+        if is_ace_up: next_status = 'INSURANCE'
+
+        conn.execute("UPDATE bj_game SET status=?, shoe=?, shoe_pos=?, dealer_cards=?, dealer_initial_cards=?, current_seat=0, current_hand_index=0, round_no=round_no+1 WHERE id=?", (next_status, shoe.cards, shoe.pos, dealer_hand, d_initial, table_id))
+        log_event(conn, table_id, "shoe", seed=seed)
+        log_event(conn, table_id, "deal", dealer=list(dealer_hand), players=dealt, cards=dealt_cards)
+
+        msg = "Partita iniziata"
+        if dealer_has_blackjack and up_is_ten:
+            finish_round(conn, table_id); msg = "Banco Blackjack! Partita terminata."
+        elif next_status == 'PLAYING':
+            advance_turn(conn, table_id)
+        bump_version(conn, table_id); conn.commit()
+        return True, msg
+    finally:
+        conn.close()
 
-def close_insurance_phase(username):
+def close_insurance_phase(username, table_id):
     conn = get_connection()
-    seated = conn.execute("SELECT 1 FROM bj_players WHERE username=?", (username,)).fetchone()
-    if not seated: conn.close(); return False, "Non sei seduto al tavolo."
-
-    d_initial_json = conn.execute("SELECT dealer_initial_hand FROM bj_game WHERE id=1").fetchone()[0]
-    d_initial = json.loads(d_initial_json)
-    
-    if is_blackjack(d_initial):
-        conn.close(); end_round(); return True, "Banco ha Blackjack!"
-    else:
-        conn.execute("UPDATE bj_game SET status='PLAYING' WHERE id=1")
-        conn.commit(); conn.close(); next_turn(); return False, "Niente Blackjack, si gioca!"
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        seated = conn.execute("SELECT 1 FROM bj_players WHERE username=? AND table_id=?", (username, table_id)).fetchone()
+        if not seated: return False, "Non sei seduto al tavolo."
 
-def next_turn_logic():
-    next_turn()
+        status, d_initial = conn.execute("SELECT status, dealer_initial_cards FROM bj_game WHERE id=?", (table_id,)).fetchone()
+        if status != 'INSURANCE': return False, "Fase assicurazione già chiusa."
+        
+        if is_blackjack(d_initial):
+            finish_round(conn, table_id)
+            bump_version(conn, table_id); conn.commit(); return True, "Banco ha Blackjack!"
+        conn.execute("UPDATE bj_game SET status='PLAYING' WHERE id=?", (table_id,))
+        log_event(conn, table_id, "insurance_closed", username)
+        advance_turn(conn, table_id)
+        bump_version(conn, table_id); conn.commit(); return False, "Niente Blackjack, si gioca!"
+    finally:
+        conn.close()
 
-def next_turn():
+# --- TURNO ---
+# Prossima mano PLAYING in ordine (seat, hand_index) a partire dal cursore, poi con giro dall'inizio:
+# una sola query su idx_bj_hands_turn, qualunque sia il numero di giocatori
+NEXT_HAND_SQL = """
+    SELECT h.seat, h.hand_index FROM bj_hands h JOIN bj_game g ON g.id = h.table_id
+    WHERE h.table_id = :t AND h.status = 'PLAYING'
+    ORDER BY (h.seat, h.hand_index) < (g.current_seat, g.current_hand_index), h.seat, h.hand_index
+    LIMIT 1
+"""
+
+def advance_turn(conn, table_id):
+    # Nella transazione dell'azione che ha chiuso la mano; senza mani da giocare chiude il round
+    nxt = conn.execute(NEXT_HAND_SQL, {"t": table_id}).fetchone()
+    if nxt is None:
+        finish_round(conn, table_id); return None
+    conn.execute("UPDATE bj_game SET current_seat=?, current_hand_index=? WHERE id=?", (nxt[0], nxt[1], table_id))
+    return nxt
+
+def get_current_turn(conn, table_id):
+    row = conn.execute("""SELECT h.username, h.seat, h.hand_index FROM bj_game g
+        JOIN bj_hands h ON h.table_id = g.id AND h.seat = g.current_seat AND h.hand_index = g.current_hand_index
+        WHERE g.id = ? AND g.status = 'PLAYING'""", (table_id,)).fetchone()
+    return row or (None, None, None)
+
+def player_hit(username, table_id):
     conn = get_connection()
-    players = conn.execute("SELECT username FROM bj_players ORDER BY rowid").fetchall()
-    if not players: conn.close(); return
-
-    curr_p_idx, curr_h_idx = conn.execute("SELECT current_player_index, current_hand_index FROM bj_game WHERE id=1").fetchone()
-    
-    for i in range(curr_p_idx, len(players)):
-        user = players[i][0]
-        start_h = curr_h_idx if i == curr_p_idx else 0
-        hands = conn.execute("SELECT hand_index FROM bj_hands WHERE username=? AND status='PLAYING' AND hand_index >= ? ORDER BY hand_index", (user, start_h)).fetchone()
-        if hands:
-            conn.execute("UPDATE bj_game SET current_player_index=?, current_hand_index=? WHERE id=1", (i, hands[0]))
-            conn.commit(); conn.close(); return
-
-    for i in range(0, curr_p_idx + 1):
-        user = players[i][0]
-        end_h_limit = 999 if i != curr_p_idx else curr_h_idx
-        hands = conn.execute("SELECT hand_index FROM bj_hands WHERE username=? AND status='PLAYING' AND hand_index < ? ORDER BY hand_index", (user, end_h_limit)).fetchone()
-        if hands:
-            conn.execute("UPDATE bj_game SET current_player_index=?, current_hand_index=? WHERE id=1", (i, hands[0]))
-            conn.commit(); conn.close(); return
-            
-    conn.commit(); conn.close(); end_round()
-
-def get_current_turn(conn):
-    p_idx, h_idx = conn.execute("SELECT current_player_index, current_hand_index FROM bj_game WHERE id=1").fetchone()
-    players = conn.execute("SELECT username FROM bj_players ORDER BY rowid").fetchall()
-    if not players or p_idx >= len(players): return None, None, None
-    return players[p_idx][0], p_idx, h_idx
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        turn_user, _, h_idx = get_current_turn(conn, table_id)
+        if turn_user != username: return
+        
+        shoe = load_shoe(conn, table_id)
+        hand = conn.execute("SELECT cards FROM bj_hands WHERE username=? AND hand_index=?", (username, h_idx)).fetchone()[0]
+        
+        c = shoe.draw()
+        hand = hand + bytes([c])
+        score = calculate_score(hand)
+        status = "PLAYING"
+        if score > 21: status = "BUST"
+        elif score == 21: status = "STAND"
+        
+        conn.execute("UPDATE bj_hands SET cards=?, score=?, status=? WHERE username=? AND hand_index=?", (hand, score, status, username, h_idx))
+        save_shoe(conn, table_id, shoe)
+        log_event(conn, table_id, "hit", username, h_idx, card=c)
+        if status != "PLAYING": advance_turn(conn, table_id)
+        bump_version(conn, table_id); conn.commit()
+        return status
+    finally:
+        conn.close()
 
-def player_hit(username):
+def player_stand(username, table_id):
     conn = get_connection()
-    turn_user, _, h_idx = get_current_turn(conn)
-    if turn_user != username: conn.close(); return
-    
-    deck = json.loads(conn.execute("SELECT deck FROM bj_game WHERE id=1").fetchone()[0])
-    row = conn.execute("SELECT hand FROM bj_hands WHERE username=? AND hand_index=?", (username, h_idx)).fetchone()
-    hand = json.loads(row[0])
-    
-    hand.append(pop_card(deck))
-    score = calculate_score(hand)
-    status = "PLAYING"
-    if score > 21: status = "BUST"
-    elif score == 21: status = "STAND"
-    
-    conn.execute("UPDATE bj_hands SET hand=?, score=?, status=? WHERE username=? AND hand_index=?", (json.dumps(hand), score, status, username, h_idx))
-    conn.execute("UPDATE bj_game SET deck=? WHERE id=1", (json.dumps(deck),))
-    conn.commit(); conn.close()
-    if status != "PLAYING": next_turn()
-    return status
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        turn_user, _, h_idx = get_current_turn(conn, table_id)
+        if turn_user != username: return
+        conn.execute("UPDATE bj_hands SET status='STAND' WHERE username=? AND hand_index=?", (username, h_idx))
+        log_event(conn, table_id, "stand", username, h_idx)
+        advance_turn(conn, table_id)
+        bump_version(conn, table_id); conn.commit()
+    finally:
+        conn.close()
 
-def player_stand(username):
+def player_double(username, table_id):
     conn = get_connection()
-    turn_user, _, h_idx = get_current_turn(conn)
-    if turn_user != username: conn.close(); return
-    conn.execute("UPDATE bj_hands SET status='STAND' WHERE username=? AND hand_index=?", (username, h_idx))
-    conn.commit(); conn.close(); next_turn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        turn_user, _, h_idx = get_current_turn(conn, table_id)
+        if turn_user != username: return "NOT_YOUR_TURN"
+        hand_row = conn.execute("SELECT cards, bet, doubled, status FROM bj_hands WHERE username=? AND hand_index=?", (username, h_idx)).fetchone()
+        hand = hand_row[0]; bet = int(hand_row[1]); doubled = int(hand_row[2]); status = hand_row[3]
+        if len(hand) != 2 or doubled == 1 or status != "PLAYING": return "NOT_ALLOWED"
+        bankroll = int(conn.execute("SELECT bankroll FROM bj_players WHERE username=?", (username,)).fetchone()[0])
+        if bankroll < bet: return "NO_MONEY"
+        shoe = load_shoe(conn, table_id)
+        bankroll -= bet
+        c = shoe.draw()
+        hand = hand + bytes([c])
+        score = calculate_score(hand)
+        status = "STAND"
+        if score > 21: status = "BUST"
+        conn.execute("UPDATE bj_players SET bankroll=? WHERE username=?", (bankroll, username))
+        conn.execute("UPDATE bj_hands SET cards=?, score=?, status=?, bet=?, doubled=1 WHERE username=? AND hand_index=?", (hand, score, status, bet*2, username, h_idx))
+        save_shoe(conn, table_id, shoe)
+        log_event(conn, table_id, "double", username, h_idx, card=c)
+        advance_turn(conn, table_id)
+        bump_version(conn, table_id); conn.commit(); return "OK"
+    finally:
+        conn.close()
 
-def player_double(username):
-    conn = get_connection()
-    turn_user, _, h_idx = get_current_turn(conn)
-    if turn_user != username: conn.close(); return "NOT_YOUR_TURN"
-    hand_row = conn.execute("SELECT hand, bet, doubled, status FROM bj_hands WHERE username=? AND hand_index=?", (username, h_idx)).fetchone()
-    hand = json.loads(hand_row[0]); bet = int(hand_row[1]); doubled = int(hand_row[2]); status = hand_row[3]
-    if len(hand) != 2 or doubled == 1 or status != "PLAYING": conn.close(); return "NOT_ALLOWED"
-    bankroll = int(conn.execute("SELECT bankroll FROM bj_players WHERE username=?", (username,)).fetchone()[0])
-    if bankroll < bet: conn.close(); return "NO_MONEY"
-    deck = json.loads(conn.execute("SELECT deck FROM bj_game WHERE id=1").fetchone()[0])
-    bankroll -= bet
-    hand.append(pop_card(deck))
-    score = calculate_score(hand)
-    status = "STAND"
-    if score > 21: status = "BUST"
-    conn.execute("UPDATE bj_players SET bankroll=? WHERE username=?", (bankroll, username))
-    conn.execute("UPDATE bj_hands SET hand=?, score=?, status=?, bet=?, doubled=1 WHERE username=? AND hand_index=?", (json.dumps(hand), score, status, bet*2, username, h_idx))
-    conn.execute("UPDATE bj_game SET deck=? WHERE id=1", (json.dumps(deck),))
-    conn.commit(); conn.close(); next_turn(); return "OK"
-
-def player_split(username):
+def player_split(username, table_id):
     conn = get_connection()
-    turn_user, _, h_idx = get_current_turn(conn)
-    if turn_user != username or h_idx != 0: conn.close(); return "NOT_ALLOWED"
-    cnt = conn.execute("SELECT count(*) FROM bj_hands WHERE username=?", (username,)).fetchone()[0]
-    if cnt > 1: conn.close(); return "MAX_SPLIT"
-    hand_row = conn.execute("SELECT hand, bet FROM bj_hands WHERE username=? AND hand_index=?", (username, h_idx)).fetchone()
-    hand = json.loads(hand_row[0]); bet = int(hand_row[1])
-    if len(hand) != 2 or not is_pair_for_split(hand): conn.close(); return "NOT_PAIR"
-    bankroll = int(conn.execute("SELECT bankroll FROM bj_players WHERE username=?", (username,)).fetchone()[0])
-    if bankroll < bet: conn.close(); return "NO_MONEY"
-    deck = json.loads(conn.execute("SELECT deck FROM bj_game WHERE id=1").fetchone()[0])
-    
-    c1 = hand[0]; c2 = hand[1]
-    h1 = [c1, pop_card(deck)]
-    h2 = [c2, pop_card(deck)]
-    split_aces = (c1['rank'] == 'A' and c2['rank'] == 'A')
-    status_after = "STAND" if split_aces else "PLAYING"
-    
-    bankroll -= bet
-    conn.execute("UPDATE bj_players SET bankroll=? WHERE username=?", (bankroll, username))
-    conn.execute("UPDATE bj_hands SET hand=?, score=?, status=?, is_split_hand=1 WHERE username=? AND hand_index=0", (json.dumps(h1), calculate_score(h1), status_after, username))
-    conn.execute("INSERT INTO bj_hands (username, hand_index, hand, score, status, bet, doubled, is_split_hand) VALUES (?, 1, ?, ?, ?, ?, 0, 1)", (username, json.dumps(h2), calculate_score(h2), status_after, bet))
-    conn.execute("UPDATE bj_game SET deck=? WHERE id=1", (json.dumps(deck),))
-    conn.commit(); conn.close()
-    if split_aces: next_turn()
-    return "OK"
-
-def player_insurance(username, amount):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        turn_user, seat, h_idx = get_current_turn(conn, table_id)
+        if turn_user != username or h_idx != 0: return "NOT_ALLOWED"
+        cnt = conn.execute("SELECT count(*) FROM bj_hands WHERE username=?", (username,)).fetchone()[0]
+        if cnt > 1: return "MAX_SPLIT"
+        hand_row = conn.execute("SELECT cards, bet FROM bj_hands WHERE username=? AND hand_index=?", (username, h_idx)).fetchone()
+        hand = hand_row[0]; bet = int(hand_row[1])
+        if len(hand) != 2 or not is_pair_for_split(hand): return "NOT_PAIR"
+        bankroll = int(conn.execute("SELECT bankroll FROM bj_players WHERE username=?", (username,)).fetchone()[0])
+        if bankroll < bet: return "NO_MONEY"
+        shoe = load_shoe(conn, table_id)
+        
+        c1 = hand[0]; c2 = hand[1]
+        h1 = bytes([c1, shoe.draw()])
+        h2 = bytes([c2, shoe.draw()])
+        split_aces = is_ace(c1) and is_ace(c2)
+        status_after = "STAND" if split_aces else "PLAYING"
+        
+        bankroll -= bet
+        conn.execute("UPDATE bj_players SET bankroll=? WHERE username=?", (bankroll, username))
+        conn.execute("UPDATE bj_hands SET cards=?, score=?, status=?, is_split_hand=1 WHERE username=? AND hand_index=0", (h1, calculate_score(h1), status_after, username))
+        conn.execute("INSERT INTO bj_hands (username, table_id, seat, hand_index, cards, score, status, bet, doubled, is_split_hand) VALUES (?, ?, ?, 1, ?, ?, ?, ?, 0, 1)", (username, table_id, seat, h2, calculate_score(h2), status_after, bet))
+        save_shoe(conn, table_id, shoe)
+        log_event(conn, table_id, "split", username, 0, cards=[h1[1], h2[1]])
+        if split_aces: advance_turn(conn, table_id)
+        bump_version(conn, table_id); conn.commit()
+        return "OK"
+    finally:
+        conn.close()
+
+def player_insurance(username, table_id, amount):
     conn = get_connection()
-    if not can_take_insurance_strict(conn, username): conn.close(); return "NOT_ALLOWED"
+    if not can_take_insurance_strict(conn, username, table_id): conn.close(); return "NOT_ALLOWED"
     bankroll = int(conn.execute("SELECT bankroll FROM bj_players WHERE username=?", (username,)).fetchone()[0])
     if bankroll < amount: conn.close(); return "NO_MONEY"
     bankroll -= amount
     conn.execute("UPDATE bj_players SET bankroll=?, insurance_bet=?, insurance_taken=1 WHERE username=?", (bankroll, amount, username))
-    conn.commit(); conn.close(); return "OK"
-
-def end_round():
+    log_event(conn, table_id, "insurance", username, amount=amount)
+    bump_version(conn, table_id); conn.commit(); conn.close(); return "OK"
+
+def finish_round(conn, table_id):
+    # Banco, poi liquidazione: una lettura di tutte le mani del tavolo, calcolo puro, un executemany
+    d_hand, d_initial = conn.execute("SELECT dealer_cards, dealer_initial_cards FROM bj_game WHERE id=?", (table_id,)).fetchone()
+    shoe = load_shoe(conn, table_id)
+    while calculate_score(d_hand) < 17:
+        d_hand = d_hand + bytes([shoe.draw()])
+    rows = conn.execute("""SELECT p.username, p.bankroll, p.insurance_bet, h.hand_index, h.cards, h.score, h.status, h.bet, h.is_split_hand
+        FROM bj_players p LEFT JOIN bj_hands h ON h.username = p.username
+        WHERE p.table_id = ? ORDER BY p.seat, h.hand_index""", (table_id,)).fetchall()
+    report = settle_round(d_hand, d_initial, rows)
+    conn.executemany("UPDATE bj_players SET bankroll=?, main_result=? WHERE username=?",
+                     [(br, res, u) for u, (br, res) in report.bankrolls.items()])
+    conn.execute("UPDATE bj_game SET dealer_cards=?, status='FINISHED' WHERE id=?", (d_hand, table_id))
+    save_shoe(conn, table_id, shoe)
+    log_event(conn, table_id, "settle", dealer=list(d_hand), bankrolls=report.bankrolls)
+    return report
+
+def end_round(table_id):
     conn = get_connection()
-    game = conn.execute("SELECT deck, dealer_hand, dealer_initial_hand FROM bj_game WHERE id=1").fetchone()
-    deck = json.loads(game[0])
-    d_hand = json.loads(game[1])
-    d_initial = json.loads(game[2])
-    d_score = calculate_score(d_hand)
-    while d_score < 17:
-        d_hand.append(pop_card(deck))
-        d_score = calculate_score(d_hand)
-    dealer_bj = is_blackjack(d_initial)
-    players = conn.execute("SELECT username, bankroll, insurance_bet FROM bj_players").fetchall()
-    for u, br, ins in players:
-        br = int(br); ins = int(ins)
-        if ins > 0 and dealer_bj: br += ins * 3
-        hands = conn.execute("SELECT hand, score, status, bet, is_split_hand FROM bj_hands WHERE username=?", (u,)).fetchall()
-        res_str = []
-        for h_json, sc, stt, bet, is_split in hands:
-            bet = int(bet); hand = json.loads(h_json); p_bj = is_blackjack(hand)
-            outcome = "Perso"
-            if stt == 'BUST': outcome = "Sballato"
-            else:
-                if dealer_bj:
-                    if p_bj:
-                        if not is_split: outcome = "Push"; br += bet
-                        else: outcome = "Banco BJ"
-                    else: outcome = "Banco BJ"
-                elif p_bj:
-                    if not is_split: outcome = "Blackjack!"; br += int(bet * 2.5)
-                    else: outcome = "21 (Split)"; br += bet * 2
-                elif d_score > 21: outcome = "Vinto"; br += bet * 2
-                elif sc > d_score: outcome = "Vinto"; br += bet * 2
-                elif sc == d_score: outcome = "Push"; br += bet
-            res_str.append(outcome)
-        conn.execute("UPDATE bj_players SET bankroll=?, main_result=? WHERE username=?", (br, " | ".join(res_str), u))
-    conn.execute("UPDATE bj_game SET dealer_hand=?, status='FINISHED' WHERE id=1", (json.dumps(d_hand),))
-    conn.commit(); conn.close()
-
-def reset_round():
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        report = finish_round(conn, table_id)
+        bump_version(conn, table_id); conn.commit()
+        return report
+    finally:
+        conn.close()
+
+def reset_round(table_id):
     conn = get_connection()
-    conn.execute("UPDATE bj_game SET status='WAITING', dealer_hand='[]', dealer_initial_hand='[]', current_player_index=0, current_hand_index=0 WHERE id=1")
-    conn.execute("UPDATE bj_players SET status='READY', insurance_bet=0, insurance_taken=0, side_result='', main_result=''")
-    conn.execute("DELETE FROM bj_hands")
-    users = conn.execute("SELECT username FROM bj_players").fetchall()
-    for u in users:
-        conn.execute("INSERT INTO bj_hands (username, hand_index, hand, score, status, bet, doubled, is_split_hand) VALUES (?, 0, '[]', 0, 'READY', 0, 0, 0)", (u[0],))
-    conn.commit(); conn.close()
-
-def render_card_span(card):
-    if not card: return ""
-    r = card["rank"]; s = card["suit"]
-    color_class = "card-red" if s in ["♥", "♦"] else "card-black"
-    return f"<span class='game-card {color_class}'>{r}{s}</span>"
+    conn.execute("UPDATE bj_game SET status='WAITING', dealer_cards=x'', dealer_initial_cards=x'', current_seat=0, current_hand_index=0 WHERE id=?", (table_id,))
+    conn.execute("UPDATE bj_players SET status='READY', insurance_bet=0, insurance_taken=0, side_result='', main_result='' WHERE table_id=?", (table_id,))
+    conn.execute("DELETE FROM bj_hands WHERE table_id=?", (table_id,))
+    conn.execute("INSERT INTO bj_hands (username, table_id, seat, hand_index, cards, score, status, bet, doubled, is_split_hand) SELECT username, table_id, seat, 0, x'', 0, 'READY', 0, 0, 0 FROM bj_players WHERE table_id=?", (table_id,))
+    bump_version(conn, table_id); conn.commit(); conn.close()
+
+# --- STATO DEL TAVOLO (per il rendering) ---
+def poll_table_state(cached, username, watch=None):
+    # Un solo SELECT per tick finché nessuno agisce; il tavolo si ricarica solo se la versione cambia,
+    # e lo snapshot di una versione è condiviso da tutti i client del processo.
+    # None = l'utente non è seduto e non guarda nessun tavolo (lobby)
+    located = locate_table(username, watch)
+    if located is None: return None
+    table_id, version = located
+    if cached is not None and cached.table_id == table_id and cached.version == version: return cached
+    return get_snapshot(table_id, version)
 
 # --- INTERFACCIA GIOCO ---
+POLL_SECONDS = 2
+
 def blackjack_section():
     if not st.session_state.get("logged_in"):
         st.warning("Devi fare login."); st.stop()
     
-    init_blackjack_db()
+    migrate()
     
     st.markdown('<div class="admin-card">', unsafe_allow_html=True)
     st.title("🎰 Terrazzo Casino")
-    
-    username = st.session_state.username
-    conn = get_connection()
-    game_state = conn.execute("SELECT status, dealer_hand, current_player_index FROM bj_game WHERE id=1").fetchone()
-    players_data = conn.execute("SELECT username, bankroll, bet_main, bet_pair, bet_21p3, side_result, main_result, insurance_taken FROM bj_players ORDER BY rowid").fetchall()
-    status, d_hand_json, curr_idx = game_state
-    d_hand = json.loads(d_hand_json or "[]")
-    is_seated = any(p[0] == username for p in players_data)
-    
-    # helper turn info
-    curr_p_name = curr_p_idx = curr_h_idx = None
-    if status == 'PLAYING':
-        curr_p_name, curr_p_idx, curr_h_idx = get_current_turn(conn)
-    conn.close()
+    table_fragment(st.session_state.username)
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    # --- LOBBY ---
+def rerun_table():
+    # Un click nel frammento ridisegna solo il tavolo; durante un run completo dell'app si riesegue tutto
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def lobby(username):
+    st.write("### 🛋️ Tavoli")
+    for table_id, name, status, max_seats, seated in list_tables():
+        c_n, c_s, c_j, c_w = st.columns([3, 2, 2, 2])
+        c_n.write(f"**{name}**")
+        c_s.caption(f"👥 {seated}/{max_seats} · {'in attesa' if status == 'WAITING' else 'in gioco'}")
+        if c_j.button("Siediti", key=f"bj_join_{table_id}", disabled=status != 'WAITING' or seated >= max_seats):
+            ok, msg = join_blackjack(username, table_id)
+            if ok: rerun_table()
+            else: st.error(msg)
+        if c_w.button("👀 Guarda", key=f"bj_watch_{table_id}"):
+            st.session_state["bj_watch"] = table_id; rerun_table()
+
+@st.fragment(run_every=POLL_SECONDS)
+def table_fragment(username):
+    state = poll_table_state(st.session_state.get("bj_table"), username, st.session_state.get("bj_watch"))
+    st.session_state["bj_table"] = state
+    if state is None:
+        lobby(username)
+        return
+
+    table_id = state.table_id
+    status, d_hand, players_data = state.status, state.dealer, state.players
+    curr_p_name, curr_h_idx = state.turn, state.current_hand_index
+    is_seated = state.is_seated(username)
+
+    st.subheader(f"🃏 {state.name}")
+    if not is_seated and st.button("⬅️ Torna alla lobby"):
+        st.session_state.pop("bj_watch", None); rerun_table()
+
+    # --- ATTESA ---
     if status == 'WAITING':
         c1, c2 = st.columns(2)
         with c1:
             st.write("### 🛋️ Al tavolo:")
             if not players_data: st.write("Tavolo vuoto.")
-            for p in players_data: st.write(f"👤 {p[0]} (🪙 {p[1]})")
+            for p in players_data: st.write(f"👤 {p.username} (🪙 {p.bankroll})")
         with c2:
             if not is_seated:
-                if st.button("Siediti"): join_blackjack(username); st.rerun()
+                if st.button("Siediti"):
+                    ok, msg = join_blackjack(username, table_id)
+                    if ok: rerun_table()
+                    else: st.error(msg)
             else:
-                if st.button("Alzati"): leave_blackjack(username); st.rerun()
+                if st.button("Alzati"): leave_blackjack(username); st.session_state.pop("bj_watch", None); rerun_table()
                 
         if is_seated:
             st.divider()
             st.write("### 💵 Piazza le puntate")
-            conn = get_connection()
-            me = conn.execute("SELECT bankroll, bet_main, bet_pair, bet_21p3 FROM bj_players WHERE username=?", (username,)).fetchone()
-            conn.close()
+            me = state.player(username)
             
             c_m, c_p, c_s = st.columns(3)
-            bm = c_m.number_input("Main", value=int(me[1] or 0), step=10, min_value=0)
-            bp = c_p.number_input("Pair", value=int(me[2] or 0), step=5, min_value=0)
-            bs = c_s.number_input("21+3", value=int(me[3] or 0), step=5, min_value=0)
+            bm = c_m.number_input("Main", value=me.bet_main, step=10, min_value=0)
+            bp = c_p.number_input("Pair", value=me.bet_pair, step=5, min_value=0)
+            bs = c_s.number_input("21+3", value=me.bet_21p3, step=5, min_value=0)
             
             if st.button("Salva Puntate"):
                 conn = get_connection()
                 conn.execute("UPDATE bj_players SET bet_main=?, bet_pair=?, bet_21p3=? WHERE username=?", (bm, bp, bs, username))
-                conn.commit(); conn.close()
+                bump_version(conn, table_id); conn.commit(); conn.close()
                 st.success("Salvato!")
-                time.sleep(0.3); st.rerun()
+                time.sleep(0.3); rerun_table()
                 
             if st.button("🚀 START GAME"):
-                ok, msg = start_game()
-                if ok: st.rerun()
+                ok, msg = start_game(table_id)
+                if ok: rerun_table()
                 else: st.error(msg)
-        
-        time.sleep(2); st.rerun()
 
     # --- GIOCO ---
     else:
         st.write("### 🎩 Dealer")
         cols = st.columns(6)
-        d_score = "?"
-        if status == 'FINISHED': d_score = calculate_score(d_hand)
+        d_score = state.dealer_score or "?"
         
         for i, card in enumerate(d_hand):
             if (status in ["PLAYING", "INSURANCE"]) and i == 1:
@@ -513,61 +500,50 @@ def blackjack_section():
         st.divider()
         
         # PLAYERS UI
-        conn = get_connection()
         p_cols = st.columns(len(players_data) if players_data else 1)
-        for i, p_data in enumerate(players_data):
-            p_name = p_data[0]
-            hands = conn.execute("SELECT hand_index, hand, score, status, bet FROM bj_hands WHERE username=? ORDER BY hand_index", (p_name,)).fetchall()
+        for i, p in enumerate(players_data):
             with p_cols[i]:
-                st.write(f"**{p_name}**")
-                st.caption(f"🪙 {p_data[1]}")
-                if p_data[5]: st.info(f"Side: {p_data[5]}")
-                if status == "FINISHED" and p_data[6]: st.success(p_data[6])
-                if int(p_data[7] or 0) == 1: st.caption("🛡️ Insured")
+                st.write(f"**{p.username}**")
+                st.caption(f"🪙 {p.bankroll}")
+                if p.side_result: st.info(f"Side: {p.side_result}")
+                if status == "FINISHED" and p.main_result: st.success(p.main_result)
+                if p.insurance_taken: st.caption("🛡️ Insured")
                 
-                for idx, h_json, sc, stt, bt in hands:
-                    hand_cards = json.loads(h_json or "[]")
-                    is_active = (status == "PLAYING" and p_name == curr_p_name and idx == curr_h_idx)
+                for h in p.hands:
+                    is_active = (status == "PLAYING" and p.username == curr_p_name and h.hand_index == curr_h_idx)
                     bg = "background-color: #eff6ff; border: 2px solid #3b82f6;" if is_active else ""
                     st.markdown(f"<div style='padding:6px; border-radius:10px; {bg}'>", unsafe_allow_html=True)
-                    if hand_cards: st.markdown("".join(render_card_span(c) for c in hand_cards), unsafe_allow_html=True)
-                    st.caption(f"Bet: {bt} | Punti: {sc}")
-                    if stt != "PLAYING": st.caption(f"*{stt}*")
+                    if h.cards: st.markdown("".join(render_card_span(c) for c in h.cards), unsafe_allow_html=True)
+                    st.caption(f"Bet: {h.bet} | Punti: {h.score}")
+                    if h.status != "PLAYING": st.caption(f"*{h.status}*")
                     st.markdown("</div>", unsafe_allow_html=True)
-        conn.close()
         
         # ACTIONS
         if status == 'INSURANCE':
             st.write("---")
             if is_seated:
-                conn = get_connection()
-                if can_take_insurance_strict(conn, username):
-                     bet0 = int(conn.execute("SELECT bet FROM bj_hands WHERE username=? AND hand_index=0", (username,)).fetchone()[0])
-                     if st.button(f"Compra Insurance ({bet0//2})"):
-                         player_insurance(username, bet0//2); st.rerun()
-                conn.close()
+                if state.can_take_insurance(username):
+                     amount = state.insurance_amount(username)
+                     if st.button(f"Compra Insurance ({amount})"):
+                         player_insurance(username, table_id, amount); rerun_table()
                 if st.button("➡️ Continua"):
-                    end, msg = close_insurance_phase(username)
+                    end, msg = close_insurance_phase(username, table_id)
                     if end: st.error(msg)
-                    st.rerun()
+                    rerun_table()
 
         elif status == 'PLAYING' and username == curr_p_name:
             st.write("---")
             st.markdown("### 🔥 Tocca a te!")
             c1, c2, c3, c4 = st.columns(4)
-            if c1.button("HIT 🃏"): player_hit(username); st.rerun()
-            if c2.button("STAND ✋"): player_stand(username); st.rerun()
+            if c1.button("HIT 🃏"): player_hit(username, table_id); rerun_table()
+            if c2.button("STAND ✋"): player_stand(username, table_id); rerun_table()
             if c3.button("DOUBLE 2️⃣"): 
-                if player_double(username) != "OK": st.error("Non puoi raddoppiare")
-                else: st.rerun()
+                if player_double(username, table_id) != "OK": st.error("Non puoi raddoppiare")
+                else: rerun_table()
             if c4.button("SPLIT ✂️"): 
-                if player_split(username) != "OK": st.error("Non puoi splittare")
-                else: st.rerun()
+                if player_split(username, table_id) != "OK": st.error("Non puoi splittare")
+                else: rerun_table()
 
         elif status == 'FINISHED':
             st.write("---")
-            if st.button("Rigioca 🔄"): reset_round(); st.rerun()
-        else:
-            time.sleep(2); st.rerun()
-            
-    st.markdown('</div>', unsafe_allow_html=True)
+            if st.button("Rigioca 🔄"): reset_round(table_id); rerun_table()
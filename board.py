@@ -0,0 +1,135 @@
+# board.py
+# Loader della Bacheca Eventi: tutti gli slot confermati con posti occupati, lista spesa e
+# flag "già prenotato" in una query, indipendentemente dal numero di eventi; il ruolo dalla cache dei ruoli.
+# Più il loader paginato degli eventi per l'Area Admin, con i partecipanti in una query raggruppata.
+import json
+from dataclasses import dataclass, field
+
+from db import get_connection
+from events import DEFAULT_CAPACITY, now_ts
+from roles import get_role
+
+
+@dataclass
+class BringItem:
+    id: int
+    username: str
+    item: str
+
+
+@dataclass
+class BoardSlot:
+    id: int
+    data: str
+    ora: str
+    tema: str
+    description: str
+    taken: int
+    booked: bool
+    items: list = field(default_factory=list)
+    capacity: int = DEFAULT_CAPACITY
+
+    @property
+    def free(self):
+        return self.capacity - self.taken
+
+
+@dataclass
+class Board:
+    slots: list
+    user_role: str = None
+
+
+# Posti occupati dal contatore seats_taken; sottoquery correlate sugli indici per slot,
+# quindi il costo dipende dagli eventi visibili e non dalla dimensione di bookings/bringing
+BOARD_SQL = """
+    SELECT s.id, s.data, s.ora, s.tema, s.description, s.capacity, s.seats_taken,
+           EXISTS (SELECT 1 FROM bookings WHERE slot_id = s.id AND nome_amico = :username),
+           (SELECT json_group_array(json_array(id, username, item)) FROM bringing WHERE slot_id = s.id)
+    FROM slots s
+    WHERE s.is_confirmed = 1 AND s.starts_at >= :now
+    ORDER BY s.starts_at
+"""
+
+
+def load_board(username=None):
+    conn = get_connection()
+    rows = conn.execute(BOARD_SQL, {"username": username, "now": now_ts()}).fetchall()
+    conn.close()
+    role = get_role(username)
+
+    slots = []
+    for sid, d, o, tema, desc, capacity, taken, booked, items_json in rows:
+        items = [BringItem(iid, u, it) for iid, u, it in sorted(json.loads(items_json or "[]"))]
+        slots.append(BoardSlot(sid, d, o, tema, desc, int(taken or 0), bool(booked), items, int(capacity or DEFAULT_CAPACITY)))
+    return Board(slots, role)
+
+
+# --- AREA ADMIN ---
+ADMIN_PAGE = 20
+
+
+@dataclass
+class Participant:
+    id: int
+    username: str
+    note: str
+    plus_one: bool
+    nome_plus_one: str
+
+
+@dataclass
+class AdminEvent:
+    id: int
+    data: str
+    ora: str
+    tema: str
+    creator: str
+    is_confirmed: bool
+    starts_at: str
+    capacity: int
+    taken: int
+    participants: list = field(default_factory=list)
+
+
+@dataclass
+class AdminEventPage:
+    events: list
+    page: int
+    has_more: bool
+
+
+# Pagina di eventi da una data in poi, letta in ordine da idx_slots_starts_at (nessun ordinamento).
+# In testa gli eventi con data/ora non valida (starts_at NULL), altrimenti l'admin non potrebbe più correggerli:
+# UNION ALL di due ricerche sullo stesso indice, fuse in ordine; un OR scorrerebbe tutto lo storico
+ADMIN_EVENTS_SQL = """
+    SELECT id, data, ora, tema, creator, is_confirmed, starts_at, capacity, seats_taken
+    FROM slots WHERE starts_at IS NULL
+    UNION ALL
+    SELECT id, data, ora, tema, creator, is_confirmed, starts_at, capacity, seats_taken
+    FROM slots WHERE starts_at >= :since
+    ORDER BY starts_at, id
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def load_admin_events(since, page=0, per_page=ADMIN_PAGE):
+    conn = get_connection()
+    rows = conn.execute(ADMIN_EVENTS_SQL, {"since": since, "limit": per_page + 1, "offset": page * per_page}).fetchall()
+    rows, has_more = rows[:per_page], len(rows) > per_page
+    events = [AdminEvent(sid, d, o, tema, creator, bool(conf), starts_at, int(cap or DEFAULT_CAPACITY), int(taken or 0))
+              for sid, d, o, tema, creator, conf, starts_at, cap, taken in rows]
+    if events:
+        # Partecipanti di tutti gli eventi della pagina: una sola query raggruppata su idx_bookings_slot
+        ids = [e.id for e in events]
+        grouped = conn.execute(
+            f"""SELECT slot_id, json_group_array(json_array(id, nome_amico, note, plus_one, nome_plus_one))
+            FROM bookings WHERE slot_id IN ({",".join("?" * len(ids))}) GROUP BY slot_id""",
+            ids,
+        ).fetchall()
+        by_slot = dict(grouped)
+        for e in events:
+            e.participants = [Participant(bid, u, note or "", bool(p1), np1 or "")
+                              for bid, u, note, p1, np1 in sorted(json.loads(by_slot.get(e.id, "[]")))]
+    conn.close()
+    return AdminEventPage(events, page, has_more)
@@ -0,0 +1,125 @@
+# chat.py
+# Chat degli eventi con paginazione keyset su idx_event_messages_slot(slot_id, id): ultimi N messaggi,
+# "carica precedenti" con id < più vecchio e aggiornamenti incrementali con id > ultimo visto.
+# Il costo di ogni lettura dipende dalla pagina, non dalla lunghezza della chat. Il tick controlla anche
+# quanti messaggi della finestra esistono ancora: una cancellazione (di un altro utente o da un'altra
+# sessione) fa rileggere la finestra.
+from dataclasses import dataclass, field
+
+from db import get_connection
+
+CHAT_PAGE = 30
+
+
+@dataclass
+class ChatMessage:
+    id: int
+    username: str
+    message: str
+    role: str = None
+
+
+@dataclass
+class ChatView:
+    # Finestra della chat tenuta in session_state: messaggi in ordine di id, dal più vecchio caricato
+    slot_id: int
+    messages: list = field(default_factory=list)
+    has_older: bool = False
+
+    @property
+    def last_id(self):
+        return self.messages[-1].id if self.messages else 0
+
+    @property
+    def first_id(self):
+        return self.messages[0].id if self.messages else None
+
+
+# Il ruolo arriva con il messaggio: niente query per messaggio per il badge
+MESSAGES_SQL = """
+    SELECT m.id, m.username, m.message, u.role
+    FROM event_messages m LEFT JOIN users u ON u.username = m.username
+    WHERE m.slot_id = :slot AND {cond}
+    ORDER BY m.id {order} LIMIT :limit
+"""
+
+
+def _fetch(slot_id, cond, order, limit, **params):
+    conn = get_connection()
+    rows = conn.execute(MESSAGES_SQL.format(cond=cond, order=order), dict(params, slot=slot_id, limit=limit)).fetchall()
+    conn.close()
+    return [ChatMessage(*r) for r in rows]
+
+
+def fetch_latest(slot_id, limit=CHAT_PAGE):
+    # Un messaggio in più del necessario dice se esistono pagine precedenti
+    msgs = _fetch(slot_id, "1", "DESC", limit + 1)
+    return msgs[:limit][::-1], len(msgs) > limit
+
+
+def fetch_older(slot_id, before_id, limit=CHAT_PAGE):
+    msgs = _fetch(slot_id, "m.id < :before", "DESC", limit + 1, before=before_id)
+    return msgs[:limit][::-1], len(msgs) > limit
+
+
+def fetch_since(slot_id, after_id, limit=500):
+    return _fetch(slot_id, "m.id > :after", "ASC", limit, after=after_id)
+
+
+def open_chat(slot_id, limit=CHAT_PAGE):
+    msgs, has_older = fetch_latest(slot_id, limit)
+    return ChatView(slot_id, msgs, has_older)
+
+
+# Quanti messaggi della finestra esistono ancora e l'ultimo id: un solo range su idx_event_messages_slot
+WINDOW_SQL = """
+    SELECT count(*) FILTER (WHERE id <= :last), max(id) FROM event_messages
+    WHERE slot_id = :slot AND id >= :first
+"""
+
+
+def refresh_chat(view):
+    # Tick periodico: una sola query indicizzata se nulla è cambiato; poi i soli messaggi nuovi o,
+    # se qualcuno ha cancellato, la finestra intera. Restituisce quanti messaggi nuovi sono arrivati
+    if view.first_id is None:
+        new = fetch_since(view.slot_id, 0)
+        view.messages.extend(new)
+        return len(new)
+    last = view.last_id
+    conn = get_connection()
+    kept, newest = conn.execute(WINDOW_SQL, {"slot": view.slot_id, "first": view.first_id, "last": last}).fetchone()
+    conn.close()
+    if kept != len(view.messages):
+        view.messages = _fetch(view.slot_id, "m.id >= :first", "ASC", len(view.messages) + 500, first=view.first_id)
+        # Finestra svuotata: si riparte dagli ultimi messaggi, non dai più vecchi della chat
+        if not view.messages: view.messages, view.has_older = fetch_latest(view.slot_id)
+        return sum(m.id > last for m in view.messages)
+    if newest == last: return 0
+    new = fetch_since(view.slot_id, last)
+    view.messages.extend(new)
+    return len(new)
+
+
+def load_older(view, limit=CHAT_PAGE):
+    if view.first_id is None: return 0
+    older, view.has_older = fetch_older(view.slot_id, view.first_id, limit)
+    view.messages[:0] = older
+    return len(older)
+
+
+def post_message(slot_id, username, message):
+    conn = get_connection()
+    cur = conn.execute("INSERT INTO event_messages (slot_id, username, message) VALUES (?, ?, ?)", (slot_id, username, message))
+    conn.commit()
+    conn.close()
+    return cur.lastrowid
+
+
+def delete_message(view, msg_id, username):
+    # Solo i propri messaggi; la finestra locale si aggiorna senza ricaricare la chat
+    conn = get_connection()
+    cur = conn.execute("DELETE FROM event_messages WHERE id=? AND username=?", (msg_id, username))
+    conn.commit()
+    conn.close()
+    if cur.rowcount: view.messages = [m for m in view.messages if m.id != msg_id]
+    return cur.rowcount > 0
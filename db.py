@@ -0,0 +1,208 @@
+# db.py
+# Layer di connessione SQLite condiviso da app.py e blackjack_app.py.
+# Pool di processo: Streamlit esegue ogni rerun (e ogni tick di un fragment) su un thread nuovo, quindi le
+# connessioni libere sono condivise tra i thread; un thread tiene la sua finché l'ultimo close() non la
+# restituisce. WAL + PRAGMA impostati una volta per connessione aperta; con più processi Streamlit sullo
+# stesso file chi trova il lock di scrittura occupato aspetta fino a BUSY_TIMEOUT_MS (busy handler di SQLite).
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_NAME = os.environ.get("TERRAZZO_DB", "terrazzo_vito.db")
+
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 8192
+MMAP_SIZE = 64 * 1024 * 1024
+POOL_SIZE = 8  # connessioni libere tenute per file; le altre si chiudono al rilascio
+
+_local = threading.local()  # percorso -> connessione presa dal thread corrente
+_pool_lock = threading.Lock()
+_idle = {}  # percorso -> [connessioni libere]
+_stats_lock = threading.Lock()
+_stats = {"opened": 0, "reused": 0, "statements": 0}
+
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+class PooledConnection(sqlite3.Connection):
+    # close() non chiude: rilascia la connessione. Così il codice esistente (get_connection() ... conn.close())
+    # resta invariato anche quando le chiamate si annidano: get_connection() conta i prelievi (_depth), la
+    # transazione ricorda a che profondità è stata aperta e close() annulla solo la propria (o una lasciata
+    # aperta più in profondità), mai quella del chiamante. L'ultimo close() la rimette nel pool.
+    _depth = 0
+    _txn_depth = None
+    _path = None
+
+    def _track(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            if not self.in_transaction: self._txn_depth = None
+            elif self._txn_depth is None: self._txn_depth = self._depth
+
+    def execute(self, sql, parameters=()):
+        _bump("statements")
+        return self._track(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        _bump("statements")
+        return self._track(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._track(super().executescript, sql_script)
+
+    def commit(self):
+        if self.in_transaction: _bump("statements")  # sqlite3 esegue COMMIT solo con una transazione aperta
+        return self._track(super().commit)
+
+    def rollback(self):
+        super().rollback()
+        self._txn_depth = None
+
+    def close(self):
+        if self._depth == 0: return  # già rilasciata
+        if self.in_transaction and (self._txn_depth is None or self._txn_depth >= self._depth):
+            self.rollback()
+        self._depth -= 1
+        if self._depth == 0: _release(self)
+
+    def really_close(self):
+        super().close()
+
+
+def _configure(conn):
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+def _open(path):
+    # check_same_thread=False: la connessione passa da un thread all'altro tramite il pool, mai in uso da due insieme
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        factory=PooledConnection,
+        check_same_thread=False,
+    )
+    _configure(conn)
+    conn._path = path
+    _bump("opened")
+    return conn
+
+
+def _held():
+    held = getattr(_local, "conns", None)
+    if held is None:
+        held = _local.conns = {}
+    return held
+
+
+def get_connection(path=None):
+    # Quella già presa dal thread (chiamate annidate), altrimenti una libera del pool, altrimenti una nuova
+    path = path or DB_NAME
+    held = _held()
+    conn = held.get(path)
+    if conn is None:
+        with _pool_lock:
+            free = _idle.get(path)
+            conn = free.pop() if free else None
+        if conn is None:
+            conn = _open(path)
+        else:
+            _bump("reused")
+        held[path] = conn
+    else:
+        _bump("reused")
+    conn._depth += 1
+    return conn
+
+
+def _release(conn):
+    held = _held()
+    if held.get(conn._path) is conn: del held[conn._path]
+    with _pool_lock:
+        free = _idle.setdefault(conn._path, [])
+        if len(free) < POOL_SIZE:
+            free.append(conn)
+            return
+    conn.really_close()
+
+
+@contextmanager
+def transaction(immediate=True, path=None):
+    # BEGIN IMMEDIATE ... COMMIT sulla connessione del thread; ROLLBACK se il blocco solleva.
+    # IMMEDIATE prende subito il lock di scrittura: letture e scritture del blocco vedono lo stesso stato.
+    # Dentro una transazione già aperta (chiamate annidate) diventa un SAVEPOINT: un errore annulla solo il
+    # blocco interno e il COMMIT resta al chiamante.
+    conn = get_connection(path)
+    if conn.in_transaction:
+        name = f"sp{conn._depth}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+            conn.execute(f"RELEASE {name}")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute(f"ROLLBACK TO {name}")
+                conn.execute(f"RELEASE {name}")
+            raise
+        finally:
+            conn.close()
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def set_database(path):
+    # Usato da benchmark e script offline per puntare a un file diverso
+    global DB_NAME
+    DB_NAME = path
+
+
+def close_thread_connections():
+    # Chiude davvero le connessioni prese dal thread corrente (anche se non rilasciate)
+    held = _held()
+    for conn in held.values():
+        try:
+            conn.really_close()
+        except Exception:
+            pass
+    held.clear()
+
+
+def close_all_connections():
+    # Come close_thread_connections, più tutte le connessioni libere del pool (cambio di file, test, benchmark)
+    close_thread_connections()
+    with _pool_lock:
+        free = [c for conns in _idle.values() for c in conns]
+        _idle.clear()
+    for conn in free:
+        try:
+            conn.really_close()
+        except Exception:
+            pass
+
+
+def connection_stats():
+    with _stats_lock, _pool_lock:
+        return dict(_stats, idle=sum(len(conns) for conns in _idle.values()))
+
+
+def reset_connection_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
@@ -0,0 +1,187 @@
+# events.py
+# Logica degli eventi (slot) indipendente dalla UI.
+import datetime
+import threading
+import time
+
+import db
+from db import get_connection, transaction
+
+CLEANUP_INTERVAL = 300
+DEFAULT_CAPACITY = 10
+
+_cleanup_lock = threading.Lock()
+_last_cleanup = None
+
+
+def now_ts(now=None):
+    # Stesso formato di starts_at (datetime() di SQLite, ora locale)
+    return (now or datetime.datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_event_time(t):
+    # Formato canonico di slots.ora ("20:00:00"), qualunque sia il widget di origine
+    return t.strftime("%H:%M:%S")
+
+
+def parse_starts_at(starts_at):
+    # starts_at è sempre "YYYY-MM-DD HH:MM:SS" (o NULL): nessun tentativo multiplo di formato
+    return datetime.datetime.fromisoformat(starts_at) if starts_at else None
+
+
+# --- PRENOTAZIONI ---
+# INSERT condizionato dentro BEGIN IMMEDIATE: il controllo posti e la scrittura sono atomici,
+# due "Conferma" simultanei non possono superare la capienza. Con transaction() funzionano anche
+# chiamate dentro una transazione del chiamante (diventano un SAVEPOINT).
+def reserve_seat(slot_id, username, note="", plus_one=False, nome_plus_one="", tieni_status=1):
+    needed = 2 if plus_one else 1
+    with transaction() as conn:
+        cur = conn.execute(
+            """INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status)
+            SELECT :sid, :user, :note, :p1, :np1, :tieni FROM slots
+            WHERE id = :sid AND seats_taken + :needed <= capacity
+              AND NOT EXISTS (SELECT 1 FROM bookings WHERE slot_id = :sid AND nome_amico = :user)""",
+            {"sid": slot_id, "user": username, "note": note, "p1": 1 if plus_one else 0,
+             "np1": nome_plus_one or "", "tieni": tieni_status, "needed": needed},
+        )
+        if cur.rowcount != 1:
+            if conn.execute("SELECT 1 FROM bookings WHERE slot_id=? AND nome_amico=?", (slot_id, username)).fetchone():
+                return "ALREADY_BOOKED"
+            if not conn.execute("SELECT 1 FROM slots WHERE id=?", (slot_id,)).fetchone():
+                return "NOT_FOUND"
+            return "SOLD_OUT"
+        full = conn.execute("SELECT seats_taken >= capacity FROM slots WHERE id=?", (slot_id,)).fetchone()[0]
+    # Preso l'ultimo posto: il fast track non deve più proporre questo evento (dopo il COMMIT, non prima)
+    if full: invalidate_open_slot(slot_id)
+    return "OK"
+
+
+def update_booking_details(slot_id, username, note, plus_one, nome_plus_one):
+    # Aggiungere un +1 a una prenotazione esistente occupa un posto: stesso controllo atomico. Solo in quel
+    # caso: note e nome del +1 si modificano anche se l'admin ha ridotto la capienza sotto i posti presi
+    with transaction() as conn:
+        cur = conn.execute(
+            """UPDATE bookings SET note = :note, plus_one = :p1, nome_plus_one = :np1
+            WHERE slot_id = :sid AND nome_amico = :user
+              AND (:p1 <= bookings.plus_one OR (SELECT seats_taken < capacity FROM slots WHERE id = :sid))""",
+            {"sid": slot_id, "user": username, "note": note, "p1": 1 if plus_one else 0, "np1": nome_plus_one or ""},
+        )
+        if not cur.rowcount:
+            if not conn.execute("SELECT 1 FROM bookings WHERE slot_id=? AND nome_amico=?", (slot_id, username)).fetchone():
+                return "NOT_FOUND"
+            return "SOLD_OUT"
+        full = plus_one and conn.execute("SELECT seats_taken >= capacity FROM slots WHERE id=?", (slot_id,)).fetchone()[0]
+    # Togliere un +1 libera un posto: il prossimo evento disponibile può cambiare; aggiungerlo può riempire questo
+    if not plus_one: invalidate_open_slot()
+    elif full: invalidate_open_slot(slot_id)
+    return "OK"
+
+
+# --- FAST TRACK ---
+# Il link fastjoin arriva a decine di persone negli stessi secondi: il prossimo evento confermato con
+# posti liberi si calcola con una query su idx_slots_confirmed_starts_at e resta in cache per
+# FAST_SLOT_TTL secondi. Le scritture che possono liberare o spostare posti (disdette, modifiche agli
+# eventi) chiamano invalidate_open_slot, come reserve_seat quando prende l'ultimo posto; quelle di altri
+# processi si vedono alla scadenza. Un evento in cache riempito da un altro processo lo scopre reserve_seat
+# in modo atomico: fast_join svuota la cache e passa all'evento successivo.
+FAST_SLOT_TTL = 5.0
+FAST_JOIN_NOTE = "Fast Booking ⚡"
+
+NEXT_OPEN_SLOT_SQL = """
+    SELECT id, data, ora, tema FROM slots
+    WHERE is_confirmed = 1 AND starts_at >= ? AND seats_taken < capacity
+    ORDER BY starts_at LIMIT 1
+"""
+
+_fast_lock = threading.Lock()
+_fast_load_lock = threading.Lock()  # una sola lettura alla volta: in una raffica gli altri aspettano la risposta
+_fast_cache = {}  # percorso del database -> (istante, generazione, slot o None)
+_fast_gen = {}  # percorso del database -> numero di invalidazioni
+_fast_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _cached_open_slot(path, now):
+    # (True, slot) se la cache è valida, altrimenti (False, generazione corrente)
+    gen = _fast_gen.get(path, 0)
+    cached = _fast_cache.get(path)
+    if cached is not None and cached[1] == gen and now - cached[0] < FAST_SLOT_TTL:
+        _fast_stats["hits"] += 1
+        return True, cached[2]
+    return False, gen
+
+
+def next_open_slot():
+    # (id, data, ora, tema) del primo evento confermato futuro con almeno un posto, o None
+    path = db.DB_NAME
+    with _fast_lock:
+        found, val = _cached_open_slot(path, time.monotonic())
+    if found: return val
+    with _fast_load_lock:
+        now = time.monotonic()
+        with _fast_lock:
+            found, val = _cached_open_slot(path, now)
+            if found: return val
+            gen = val
+            _fast_stats["misses"] += 1
+        conn = get_connection()
+        row = conn.execute(NEXT_OPEN_SLOT_SQL, (now_ts(),)).fetchone()
+        conn.close()
+        slot = tuple(row) if row else None
+        with _fast_lock:
+            # Un'invalidazione arrivata durante la lettura vince: la risposta potrebbe essere già vecchia
+            if _fast_gen.get(path, 0) == gen: _fast_cache[path] = (now, gen, slot)
+    return slot
+
+
+def invalidate_open_slot(slot_id=None):
+    # Con slot_id si scarta la cache solo se indica ancora quell'evento (già sostituito da un'altra lettura = niente)
+    with _fast_lock:
+        cached = _fast_cache.get(db.DB_NAME)
+        if slot_id is not None and (cached is None or cached[2] is None or cached[2][0] != slot_id): return
+        _fast_gen[db.DB_NAME] = _fast_gen.get(db.DB_NAME, 0) + 1
+        _fast_cache.pop(db.DB_NAME, None)
+        _fast_stats["invalidations"] += 1
+
+
+def fast_join(username, note=FAST_JOIN_NOTE, attempts=5):
+    # (slot, esito): prenota il primo evento con posti; esito come reserve_seat
+    slot = next_open_slot()
+    for _ in range(attempts):
+        if slot is None: return None, "SOLD_OUT"
+        res = reserve_seat(slot[0], username, note)
+        if res in ("OK", "ALREADY_BOOKED"): return slot, res
+        # Riempito (o eliminato) dopo la lettura in cache: si rilegge dal database
+        invalidate_open_slot(slot[0])
+        slot = next_open_slot()
+    return slot, "SOLD_OUT"
+
+
+def fast_track_stats():
+    with _fast_lock:
+        return dict(_fast_stats)
+
+
+# --- PULIZIA EVENTI PASSATI ---
+# Poche DELETE set-based sull'indice di slots(starts_at), tutte in una transazione
+def cleanup_past_events(now=None):
+    cutoff = now_ts(now)
+    expired = "SELECT id FROM slots WHERE starts_at < :cutoff"
+    with transaction() as conn:
+        conn.execute(f"DELETE FROM bookings WHERE slot_id IN ({expired})", {"cutoff": cutoff})
+        conn.execute(f"DELETE FROM bringing WHERE slot_id IN ({expired})", {"cutoff": cutoff})
+        conn.execute(f"DELETE FROM waitlist WHERE slot_id IN ({expired})", {"cutoff": cutoff})
+        conn.execute(f"DELETE FROM event_messages WHERE slot_id IN ({expired})", {"cutoff": cutoff})
+        deleted = conn.execute("DELETE FROM slots WHERE starts_at < :cutoff", {"cutoff": cutoff}).rowcount
+        conn.execute("DELETE FROM weather_cache WHERE day < :day", {"day": cutoff[:10]})
+    if deleted: invalidate_open_slot()
+    return deleted
+
+
+def cleanup_if_due(interval=CLEANUP_INTERVAL):
+    # Al massimo una pulizia per intervallo per processo, non a ogni rerun
+    global _last_cleanup
+    with _cleanup_lock:
+        if _last_cleanup is not None and time.monotonic() - _last_cleanup < interval:
+            return None
+        _last_cleanup = time.monotonic()
+    return cleanup_past_events()
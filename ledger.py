@@ -0,0 +1,131 @@
+# ledger.py
+# Cassa: obiettivi di raccolta (goal) e donazioni. goal.current e i totali per donatore e per mese
+# sono mantenuti dai trigger della migrazione 14 nella stessa transazione della scrittura:
+# qui si leggono righe già sommate, mai SUM() sull'intera tabella donazioni.
+from dataclasses import dataclass
+
+from db import get_connection
+from events import now_ts
+
+DEFAULT_GOAL = 1
+
+
+@dataclass
+class Goal:
+    id: int
+    description: str
+    target: float
+    current: float
+    active: bool = True
+
+    @property
+    def progress(self):
+        return max(0.0, min(self.current / float(self.target), 1.0)) if self.target else 0.0
+
+
+@dataclass
+class Donation:
+    id: int
+    donatore: str
+    importo: float
+    username: str
+    goal_id: int
+    donated_at: str
+
+
+GOAL_COLUMNS = "id, description, target, coalesce(current, 0), coalesce(active, 1)"
+
+
+def _goal(row):
+    return Goal(row[0], row[1], float(row[2] or 0), float(row[3] or 0), bool(row[4])) if row else None
+
+
+def primary_goal():
+    # Obiettivo in sidebar: il primo attivo; una riga per chiave primaria
+    conn = get_connection()
+    row = conn.execute(f"SELECT {GOAL_COLUMNS} FROM goal WHERE coalesce(active, 1) = 1 ORDER BY id LIMIT 1").fetchone()
+    conn.close()
+    return _goal(row)
+
+
+def get_goal(goal_id):
+    conn = get_connection()
+    row = conn.execute(f"SELECT {GOAL_COLUMNS} FROM goal WHERE id = ?", (goal_id,)).fetchone()
+    conn.close()
+    return _goal(row)
+
+
+def list_goals(active_only=False):
+    conn = get_connection()
+    rows = conn.execute(f"SELECT {GOAL_COLUMNS} FROM goal WHERE ? = 0 OR coalesce(active, 1) = 1 ORDER BY id", (int(active_only),)).fetchall()
+    conn.close()
+    return [_goal(r) for r in rows]
+
+
+def create_goal(description, target):
+    conn = get_connection()
+    cur = conn.execute("INSERT INTO goal (description, target, current, active) VALUES (?, ?, 0, 1)", (description, float(target)))
+    conn.commit()
+    conn.close()
+    return cur.lastrowid
+
+
+def set_goal_active(goal_id, active):
+    conn = get_connection()
+    conn.execute("UPDATE goal SET active = ? WHERE id = ?", (int(bool(active)), goal_id))
+    conn.commit()
+    conn.close()
+
+
+def add_donation(nome, importo, username=None, goal_id=DEFAULT_GOAL):
+    conn = get_connection()
+    cur = conn.execute(
+        "INSERT INTO donazioni (donatore, importo, username, goal_id, donated_at) VALUES (?, ?, ?, ?, ?)",
+        (nome, float(importo), username, goal_id, now_ts()),
+    )
+    conn.commit()
+    conn.close()
+    return cur.lastrowid
+
+
+def delete_donation(donation_id):
+    conn = get_connection()
+    deleted = conn.execute("DELETE FROM donazioni WHERE id = ?", (donation_id,)).rowcount
+    conn.commit()
+    conn.close()
+    return deleted > 0
+
+
+def recent_donations(goal_id, limit=50):
+    # Ultime donazioni di un obiettivo su idx_donazioni_goal(goal_id, id)
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT id, donatore, importo, username, goal_id, donated_at FROM donazioni WHERE goal_id = ? ORDER BY id DESC LIMIT ?",
+        (goal_id, limit),
+    ).fetchall()
+    conn.close()
+    return [Donation(*r) for r in rows]
+
+
+def donor_totals(goal_id=None, limit=20):
+    # [(donatore, totale, numero donazioni)] dal riepilogo per donatore; goal_id=None = tutti gli obiettivi
+    conn = get_connection()
+    rows = conn.execute(
+        """SELECT donor, round(sum(total), 2), sum(n) FROM donation_donors
+        WHERE ?1 IS NULL OR goal_id = ?1 GROUP BY donor ORDER BY 2 DESC, donor LIMIT ?2""",
+        (goal_id, limit),
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def month_totals(goal_id=None):
+    # [(mese "YYYY-MM", totale, numero donazioni)] dal più recente; "" = donazioni senza data (precedenti alla migrazione)
+    conn = get_connection()
+    rows = conn.execute(
+        """SELECT month, round(sum(total), 2), sum(n) FROM donation_months
+        WHERE ?1 IS NULL OR goal_id = ?1 GROUP BY month ORDER BY month DESC""",
+        (goal_id,),
+    ).fetchall()
+    conn.close()
+    return rows
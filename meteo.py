@@ -0,0 +1,243 @@
+# meteo.py
+# Previsioni Open-Meteo con cache persistente (tabella weather_cache).
+# Una sola richiesta start_date..end_date copre tutti gli eventi della bacheca; le voci scadute
+# vengono servite subito e riaggiornate in background (stale-while-revalidate).
+import datetime
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import db
+from db import get_connection
+
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+LATITUDE = 40.8518
+LONGITUDE = 14.2681
+HTTP_TIMEOUT = 2.0
+FORECAST_TTL = 3 * 3600
+FAILURE_BACKOFF = 60
+FORECAST_HORIZON_DAYS = 15
+
+_refresh_lock = threading.Lock()
+_refreshing = False
+_last_failure = 0.0
+
+
+def fetch_json(params, base_url=None, timeout=HTTP_TIMEOUT):
+    url = f"{base_url or OPEN_METEO_URL}?{urlencode(params)}"
+    with urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def fetch_daily_forecast(start, end, base_url=None):
+    data = fetch_json(
+        {
+            "latitude": LATITUDE,
+            "longitude": LONGITUDE,
+            "daily": "weathercode,temperature_2m_max",
+            "timezone": "auto",
+            "start_date": str(start),
+            "end_date": str(end),
+        },
+        base_url,
+    )
+    daily = data.get("daily") or {}
+    days = daily.get("time") or []
+    codes = daily.get("weathercode") or []
+    temps = daily.get("temperature_2m_max") or []
+    return {d: (c, t) for d, c, t in zip(days, codes, temps)}
+
+
+def _forecastable(dates):
+    today = datetime.date.today()
+    horizon = today + datetime.timedelta(days=FORECAST_HORIZON_DAYS)
+    out = set()
+    for d in dates:
+        try:
+            day = datetime.date.fromisoformat(str(d))
+        except ValueError:
+            continue
+        if today <= day <= horizon:
+            out.add(day)
+    return out
+
+
+def refresh_forecasts(dates, base_url=None, path=None):
+    global _last_failure
+    days = _forecastable(dates)
+    if not days:
+        return 0
+    try:
+        forecast = fetch_daily_forecast(min(days), max(days), base_url)
+    except Exception:
+        _last_failure = time.time()
+        return 0
+    now = time.time()
+    # Anche i giorni senza dati vanno in cache (NULL), così non si riprova a ogni rerun
+    rows = [(str(d), *forecast.get(str(d), (None, None)), now) for d in days]
+    conn = get_connection(path)
+    conn.executemany(
+        "INSERT OR REPLACE INTO weather_cache (day, weathercode, temp_max, fetched_at) VALUES (?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def _refresh_in_background(dates, base_url):
+    global _refreshing
+    with _refresh_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    path = db.DB_NAME
+
+    def run():
+        global _refreshing
+        try:
+            refresh_forecasts(dates, base_url, path)
+        finally:
+            db.close_thread_connections()
+            with _refresh_lock:
+                _refreshing = False
+
+    threading.Thread(target=run, name="meteo-refresh", daemon=True).start()
+
+
+def _read_cache(dates):
+    conn = get_connection()
+    marks = ",".join("?" * len(dates))
+    rows = conn.execute(
+        f"SELECT day, weathercode, temp_max, fetched_at FROM weather_cache WHERE day IN ({marks})",
+        dates,
+    ).fetchall()
+    conn.close()
+    return {d: (c, t, ts) for d, c, t, ts in rows}
+
+
+def get_forecasts(dates, base_url=None):
+    # {data: (pioggia, temp_max)}; al massimo una richiesta HTTP sincrona, solo per date mai viste
+    dates = sorted({str(d) for d in dates})
+    if not dates:
+        return {}
+    cached = _read_cache(dates)
+
+    now = time.time()
+    wanted = {str(d) for d in _forecastable(dates)}
+    missing = wanted - cached.keys()
+    stale = {d for d in wanted & cached.keys() if now - cached[d][2] > FORECAST_TTL}
+
+    if missing and now - _last_failure > FAILURE_BACKOFF:
+        if refresh_forecasts(wanted, base_url):
+            cached = _read_cache(dates)
+    elif stale:
+        _refresh_in_background(wanted, base_url)
+
+    return {d: (c is not None and c >= 51, t) for d, (c, t, _) in cached.items()}
+
+
+# --- METEO LIVE (sidebar) ---
+# Un thread daemon per processo aggiorna le condizioni attuali ogni LIVE_REFRESH_SECONDS;
+# la sidebar legge solo il valore in memoria e non aspetta mai la rete.
+LIVE_REFRESH_SECONDS = 600
+LIVE_RETRY_SECONDS = 60
+LIVE_UNAVAILABLE = ("🌡️ N/D", "-")
+
+
+def format_current_weather(current):
+    temp = current["temperature"]
+    wcode = current["weathercode"]
+    wind = current["windspeed"]
+    icon = "☀️"
+    if wcode in [1, 2, 3]:
+        icon = "⛅"
+    elif wcode >= 51:
+        icon = "🌧️"
+    return f"{icon} {temp}°C", f"Vento: {wind} km/h"
+
+
+class LiveWeatherService:
+    def __init__(self, base_url=None, interval=LIVE_REFRESH_SECONDS, retry_interval=LIVE_RETRY_SECONDS):
+        self.base_url = base_url
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.value = LIVE_UNAVAILABLE
+        self.last_refresh = None
+        self.last_error = None
+        self.refreshes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh_now(self):
+        try:
+            data = fetch_json(
+                {"latitude": LATITUDE, "longitude": LONGITUDE, "current_weather": "true"},
+                self.base_url,
+            )
+            value = format_current_weather(data["current_weather"])
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+            return False
+        with self._lock:
+            self.value = value
+            self.last_refresh = time.time()
+            self.refreshes += 1
+            self.consecutive_failures = 0
+            self.last_error = None
+        return True
+
+    def _run(self):
+        while True:
+            ok = self.refresh_now()
+            if self._stop.wait(self.interval if ok else min(self.interval, self.retry_interval)):
+                return
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="meteo-live", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=HTTP_TIMEOUT + 1)
+
+    def current(self):
+        with self._lock:
+            return self.value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "last_refresh": self.last_refresh,
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "last_error": self.last_error,
+                "endpoint": self.base_url or OPEN_METEO_URL,
+            }
+
+
+_live_service = None
+_live_lock = threading.Lock()
+
+
+def live_weather():
+    global _live_service
+    with _live_lock:
+        if _live_service is None:
+            _live_service = LiveWeatherService().start()
+        return _live_service
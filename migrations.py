@@ -0,0 +1,441 @@
+# migrations.py
+# Migrazioni di schema numerate, tracciate con PRAGMA user_version.
+# Ogni migrazione gira una sola volta per database; a regime migrate() costa una lettura di PRAGMA
+# al primo avvio del processo e zero query dopo.
+import json
+import threading
+
+import db
+from bj_cards import encode_hand
+from db import get_connection
+
+_lock = threading.Lock()
+_up_to_date = set()
+
+
+def _ensure_column(conn, table, col, coldef):
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    if col not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {coldef}")
+
+
+# --- 1: schema di base (app + blackjack) ---
+# Idempotente: i database creati dal vecchio init_db()/init_blackjack_db() partono da user_version=0
+def _m001_base_schema(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS slots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT,
+        ora TEXT,
+        tema TEXT,
+        creator TEXT,
+        description TEXT,
+        is_confirmed INTEGER DEFAULT 1,
+        UNIQUE(data, ora)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS bookings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER,
+        nome_amico TEXT,
+        note TEXT,
+        plus_one INTEGER DEFAULT 0,
+        nome_plus_one TEXT,
+        tieni_status INTEGER DEFAULT 0,
+        FOREIGN KEY(slot_id) REFERENCES slots(id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS donazioni (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        donatore TEXT,
+        importo REAL,
+        username TEXT
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS goal (
+        id INTEGER PRIMARY KEY,
+        description TEXT,
+        target REAL,
+        current REAL
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT,
+        role TEXT
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS bringing (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER,
+        username TEXT,
+        item TEXT
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS waitlist (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER,
+        username TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS event_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER,
+        username TEXT,
+        message TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+    # Colonne aggiunte nel tempo ai vecchi database
+    _ensure_column(conn, "bookings", "nome_plus_one", "TEXT")
+    _ensure_column(conn, "bookings", "tieni_status", "INTEGER DEFAULT 0")
+    _ensure_column(conn, "slots", "creator", "TEXT")
+    _ensure_column(conn, "slots", "description", "TEXT")
+    _ensure_column(conn, "slots", "is_confirmed", "INTEGER DEFAULT 1")
+    _ensure_column(conn, "donazioni", "username", "TEXT")
+    _ensure_column(conn, "users", "role", "TEXT")
+
+    if conn.execute("SELECT count(*) FROM goal").fetchone()[0] == 0:
+        conn.execute("INSERT INTO goal (id, description, target, current) VALUES (1, 'Fondo Serate', 100.0, 0.0)")
+
+    # Blackjack
+    conn.execute("""CREATE TABLE IF NOT EXISTS bj_game (
+        id INTEGER PRIMARY KEY,
+        status TEXT,
+        dealer_hand TEXT,
+        dealer_initial_hand TEXT,
+        current_player_index INTEGER,
+        current_hand_index INTEGER,
+        deck TEXT
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS bj_players (
+        username TEXT PRIMARY KEY,
+        status TEXT,
+        bankroll INTEGER DEFAULT 2000,
+        bet_main INTEGER DEFAULT 0,
+        bet_pair INTEGER DEFAULT 0,
+        bet_21p3 INTEGER DEFAULT 0,
+        insurance_bet INTEGER DEFAULT 0,
+        insurance_taken INTEGER DEFAULT 0,
+        side_result TEXT DEFAULT '',
+        main_result TEXT DEFAULT ''
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS bj_hands (
+        username TEXT,
+        hand_index INTEGER,
+        hand TEXT,
+        score INTEGER,
+        status TEXT,
+        bet INTEGER,
+        doubled INTEGER DEFAULT 0,
+        is_split_hand INTEGER DEFAULT 0,
+        PRIMARY KEY (username, hand_index)
+    )""")
+
+    _ensure_column(conn, "bj_game", "dealer_initial_hand", "TEXT DEFAULT '[]'")
+    _ensure_column(conn, "bj_game", "current_hand_index", "INTEGER DEFAULT 0")
+    _ensure_column(conn, "bj_players", "insurance_bet", "INTEGER DEFAULT 0")
+    _ensure_column(conn, "bj_players", "insurance_taken", "INTEGER DEFAULT 0")
+    _ensure_column(conn, "bj_hands", "is_split_hand", "INTEGER DEFAULT 0")
+
+    if conn.execute("SELECT count(*) FROM bj_game").fetchone()[0] == 0:
+        conn.execute("INSERT INTO bj_game (id, status, dealer_hand, dealer_initial_hand, current_player_index, current_hand_index, deck) VALUES (1,'WAITING','[]','[]',0,0,'[]')")
+
+
+# --- 2: indici secondari ---
+def _m002_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_slot ON bookings(slot_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings(nome_amico)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bringing_slot ON bringing(slot_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_waitlist_slot ON waitlist(slot_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_messages_slot ON event_messages(slot_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bj_hands_user_status ON bj_hands(username, status)")
+
+
+# --- 3: cache previsioni meteo ---
+def _m003_weather_cache(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS weather_cache (
+        day TEXT PRIMARY KEY,
+        weathercode INTEGER,
+        temp_max REAL,
+        fetched_at REAL
+    )""")
+
+
+# --- 4: inizio evento normalizzato ---
+# starts_at = datetime(data || ' ' || ora): accetta sia "20:00" che "20:00:00", NULL se non valido.
+# I trigger lo tengono allineato su ogni INSERT/UPDATE di data e ora.
+def _m004_slots_starts_at(conn):
+    _ensure_column(conn, "slots", "starts_at", "TEXT")
+    conn.execute("UPDATE slots SET starts_at = datetime(data || ' ' || ora)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_slots_starts_at ON slots(starts_at)")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_slots_starts_at_ins AFTER INSERT ON slots
+        BEGIN
+            UPDATE slots SET starts_at = datetime(NEW.data || ' ' || NEW.ora) WHERE id = NEW.id;
+        END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_slots_starts_at_upd AFTER UPDATE OF data, ora ON slots
+        BEGIN
+            UPDATE slots SET starts_at = datetime(NEW.data || ' ' || NEW.ora) WHERE id = NEW.id;
+        END""")
+
+
+# --- 5: ora canonica e indice per bacheca / fast track ---
+# Le vecchie righe "20:00" diventano "20:00:00" (OR IGNORE: salta i duplicati di UNIQUE(data, ora))
+def _m005_canonical_time(conn):
+    conn.execute("UPDATE OR IGNORE slots SET ora = time(starts_at) WHERE starts_at IS NOT NULL AND ora <> time(starts_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_slots_confirmed_starts_at ON slots(is_confirmed, starts_at)")
+
+
+# --- 6: capienza per slot e contatore posti occupati ---
+# seats_taken = prenotazioni + i loro +1, mantenuto dai trigger su bookings
+def _m006_seat_counter(conn):
+    _ensure_column(conn, "slots", "capacity", "INTEGER DEFAULT 10")
+    _ensure_column(conn, "slots", "seats_taken", "INTEGER DEFAULT 0")
+    conn.execute("UPDATE slots SET capacity = 10 WHERE capacity IS NULL")
+    conn.execute("""UPDATE slots SET seats_taken = (
+        SELECT count(*) + COALESCE(sum(plus_one), 0) FROM bookings WHERE slot_id = slots.id
+    )""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_bookings_seats_ins AFTER INSERT ON bookings
+        BEGIN
+            UPDATE slots SET seats_taken = seats_taken + 1 + COALESCE(NEW.plus_one, 0) WHERE id = NEW.slot_id;
+        END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_bookings_seats_del AFTER DELETE ON bookings
+        BEGIN
+            UPDATE slots SET seats_taken = seats_taken - 1 - COALESCE(OLD.plus_one, 0) WHERE id = OLD.slot_id;
+        END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_bookings_seats_upd AFTER UPDATE OF slot_id, plus_one ON bookings
+        BEGIN
+            UPDATE slots SET seats_taken = seats_taken - 1 - COALESCE(OLD.plus_one, 0) WHERE id = OLD.slot_id;
+            UPDATE slots SET seats_taken = seats_taken + 1 + COALESCE(NEW.plus_one, 0) WHERE id = NEW.slot_id;
+        END""")
+
+
+# --- 7: blackjack in forma compatta ---
+# Sabot come BLOB + cursore, mani come BLOB di carte 0..51 (vedi bj_cards.py).
+# Le vecchie colonne JSON restano ma non vengono più lette; le partite in corso vengono convertite.
+def _m007_compact_cards(conn):
+    _ensure_column(conn, "bj_game", "shoe", "BLOB DEFAULT x''")
+    _ensure_column(conn, "bj_game", "shoe_pos", "INTEGER DEFAULT 0")
+    _ensure_column(conn, "bj_game", "dealer_cards", "BLOB DEFAULT x''")
+    _ensure_column(conn, "bj_game", "dealer_initial_cards", "BLOB DEFAULT x''")
+    _ensure_column(conn, "bj_hands", "cards", "BLOB DEFAULT x''")
+
+    def enc(js):
+        try:
+            return encode_hand(json.loads(js or "[]"))
+        except Exception:
+            return b""
+
+    for gid, deck, dh, di in conn.execute("SELECT id, deck, dealer_hand, dealer_initial_hand FROM bj_game").fetchall():
+        # Il vecchio mazzo si consumava con pop() dalla fine: invertito, il cursore parte da 0
+        conn.execute(
+            "UPDATE bj_game SET shoe=?, shoe_pos=0, dealer_cards=?, dealer_initial_cards=? WHERE id=?",
+            (enc(deck)[::-1], enc(dh), enc(di), gid),
+        )
+    for u, idx, hand in conn.execute("SELECT username, hand_index, hand FROM bj_hands").fetchall():
+        conn.execute("UPDATE bj_hands SET cards=? WHERE username=? AND hand_index=?", (enc(hand), u, idx))
+
+
+# --- 8: versione del tavolo (aggiornamenti guidati dai cambiamenti) ---
+def _m008_table_version(conn):
+    _ensure_column(conn, "bj_game", "version", "INTEGER DEFAULT 0")
+
+
+# --- 9: più tavoli di blackjack ---
+# Ogni riga di bj_game è un tavolo; giocatori e mani portano il proprio table_id e il posto.
+def _m009_tables(conn):
+    _ensure_column(conn, "bj_game", "name", "TEXT")
+    _ensure_column(conn, "bj_game", "max_seats", "INTEGER DEFAULT 7")
+    _ensure_column(conn, "bj_players", "table_id", "INTEGER DEFAULT 1")
+    _ensure_column(conn, "bj_players", "seat", "INTEGER")
+    _ensure_column(conn, "bj_hands", "table_id", "INTEGER DEFAULT 1")
+    conn.execute("UPDATE bj_game SET name = 'Tavolo ' || id WHERE name IS NULL")
+    # Posti in ordine di arrivo (il vecchio ordine di gioco era il rowid)
+    conn.execute("""UPDATE bj_players SET seat = (
+        SELECT count(*) FROM bj_players p WHERE p.table_id = bj_players.table_id AND p.rowid < bj_players.rowid
+    ) WHERE seat IS NULL""")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bj_players_table_seat ON bj_players(table_id, seat)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bj_hands_table ON bj_hands(table_id, username)")
+
+
+# --- 10: turno per posto ---
+# Il cursore del turno diventa (current_seat, current_hand_index) e ogni mano porta il posto del giocatore:
+# la prossima mano da giocare è una sola query sull'indice (table_id, status, seat, hand_index).
+def _m010_seat_turns(conn):
+    _ensure_column(conn, "bj_hands", "seat", "INTEGER")
+    _ensure_column(conn, "bj_game", "current_seat", "INTEGER DEFAULT 0")
+    conn.execute("UPDATE bj_hands SET seat = (SELECT seat FROM bj_players p WHERE p.username = bj_hands.username)")
+    for gid, p_idx in conn.execute("SELECT id, current_player_index FROM bj_game").fetchall():
+        seats = [r[0] for r in conn.execute("SELECT seat FROM bj_players WHERE table_id=? ORDER BY seat", (gid,)).fetchall()]
+        seat = seats[p_idx] if p_idx is not None and 0 <= p_idx < len(seats) else 0
+        conn.execute("UPDATE bj_game SET current_seat=? WHERE id=?", (seat, gid))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bj_hands_turn ON bj_hands(table_id, status, seat, hand_index)")
+
+
+# --- 11: storico append-only del blackjack ---
+# Ogni azione aggiunge una riga a bj_events (id crescente = inserimento in coda al B-tree); round_no
+# identifica il round del tavolo, così un round si rilegge con un solo range scan sull'indice.
+def _m011_bj_events(conn):
+    _ensure_column(conn, "bj_game", "round_no", "INTEGER DEFAULT 0")
+    conn.execute("""CREATE TABLE IF NOT EXISTS bj_events (
+        id INTEGER PRIMARY KEY,
+        table_id INTEGER NOT NULL,
+        round_no INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        username TEXT,
+        hand_index INTEGER,
+        data TEXT,
+        ts TEXT
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bj_events_round ON bj_events(table_id, round_no)")
+
+
+# --- 12: ricerca full-text ---
+# Un solo indice FTS5 per messaggi della chat, titolo/descrizione degli eventi e lista spesa.
+# rowid = (tipo << 40) + id sorgente (1 messaggio, 2 bringing, 3 evento): i trigger aggiornano una riga per rowid
+# e in ordine di rowid decrescente vengono prima eventi e lista spesa, poi i messaggi dal più recente.
+SEARCH_SOURCES = [
+    # (tabella, tipo, codice, testo, slot_id, username, colonne che cambiano il testo)
+    ("event_messages", "msg", 1, "{r}.message", "{r}.slot_id", "{r}.username", "message, slot_id, username"),
+    ("bringing", "bring", 2, "{r}.item", "{r}.slot_id", "{r}.username", "item, slot_id, username"),
+    ("slots", "slot", 3, "coalesce({r}.tema, '') || ' ' || coalesce({r}.description, '')", "{r}.id", "{r}.creator", "tema, description, creator"),
+]
+
+
+def _m012_search_index(conn):
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        body,
+        kind UNINDEXED,
+        slot_id UNINDEXED,
+        username UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""")
+    for table, kind, code, body, slot, user, cols in SEARCH_SOURCES:
+        base = code << 40
+        insert = (f"INSERT INTO search_fts (rowid, body, kind, slot_id, username) "
+                  f"VALUES (NEW.id + {base}, {body.format(r='NEW')}, '{kind}', {slot.format(r='NEW')}, {user.format(r='NEW')});")
+        delete = f"DELETE FROM search_fts WHERE rowid = OLD.id + {base};"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_ins AFTER INSERT ON {table} BEGIN {insert} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_del AFTER DELETE ON {table} BEGIN {delete} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_upd AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END")
+        conn.execute(f"""INSERT INTO search_fts (rowid, body, kind, slot_id, username)
+            SELECT r.id + {base}, {body.format(r='r')}, '{kind}', {slot.format(r='r')}, {user.format(r='r')} FROM {table} r""")
+
+
+# --- 13: versione dei ruoli ---
+# Contatore incrementato dai trigger a ogni modifica di users: i processi che tengono i ruoli in cache
+# lo rileggono solo quando PRAGMA data_version segnala scritture di altre connessioni.
+def _m013_role_version(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS cache_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )""")
+    conn.execute("INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('roles', 0)")
+    bump = "UPDATE cache_versions SET version = version + 1 WHERE name = 'roles';"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_users_roles_ins AFTER INSERT ON users BEGIN {bump} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_users_roles_upd AFTER UPDATE OF username, role ON users BEGIN {bump} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_users_roles_del AFTER DELETE ON users BEGIN {bump} END")
+
+
+# --- 14: raccolte fondi e totali materializzati ---
+# Ogni donazione appartiene a un obiettivo (goal_id, le vecchie vanno all'obiettivo 1) e ha una data.
+# I trigger su donazioni tengono aggiornati goal.current e i totali per donatore e per mese:
+# la barra in sidebar legge una riga, le statistiche leggono le tabelle di riepilogo e non le donazioni.
+DONATION_ROLLUPS = [
+    # (tabella, colonna chiave, espressione sulla donazione)
+    ("donation_donors", "donor", "coalesce({r}.donatore, '')"),
+    ("donation_months", "month", "coalesce(substr({r}.donated_at, 1, 7), '')"),
+]
+
+
+def _m014_donation_ledger(conn):
+    _ensure_column(conn, "donazioni", "goal_id", "INTEGER DEFAULT 1")
+    _ensure_column(conn, "donazioni", "donated_at", "TEXT")
+    _ensure_column(conn, "goal", "active", "INTEGER DEFAULT 1")
+    conn.execute("UPDATE donazioni SET goal_id = 1 WHERE goal_id IS NULL")
+    conn.execute("UPDATE goal SET current = 0, active = coalesce(active, 1)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_donazioni_goal ON donazioni(goal_id, id)")
+
+    add = ["UPDATE goal SET current = round(current + NEW.importo, 2) WHERE id = NEW.goal_id;"]
+    sub = ["UPDATE goal SET current = round(current - OLD.importo, 2) WHERE id = OLD.goal_id;"]
+    for table, key, expr in DONATION_ROLLUPS:
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+            goal_id INTEGER NOT NULL,
+            {key} TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (goal_id, {key})
+        )""")
+        add.append(f"""INSERT INTO {table} (goal_id, {key}, total, n) VALUES (NEW.goal_id, {expr.format(r='NEW')}, NEW.importo, 1)
+            ON CONFLICT (goal_id, {key}) DO UPDATE SET total = round(total + excluded.total, 2), n = n + 1;""")
+        sub.append(f"""UPDATE {table} SET total = round(total - OLD.importo, 2), n = n - 1
+            WHERE goal_id = OLD.goal_id AND {key} = {expr.format(r='OLD')};""")
+        sub.append(f"DELETE FROM {table} WHERE goal_id = OLD.goal_id AND {key} = {expr.format(r='OLD')} AND n <= 0;")
+    add, sub = "\n            ".join(add), "\n            ".join(sub)
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_donazioni_ins AFTER INSERT ON donazioni
+        BEGIN
+            {add}
+        END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_donazioni_del AFTER DELETE ON donazioni
+        BEGIN
+            {sub}
+        END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_donazioni_upd AFTER UPDATE OF importo, goal_id, donatore, donated_at ON donazioni
+        BEGIN
+            {sub}
+            {add}
+        END""")
+
+    # Totali delle donazioni esistenti (una volta sola, poi ci pensano i trigger)
+    conn.execute("""UPDATE goal SET current = coalesce((SELECT round(sum(importo), 2) FROM donazioni d WHERE d.goal_id = goal.id), 0)""")
+    for table, key, expr in DONATION_ROLLUPS:
+        conn.execute(f"""INSERT INTO {table} (goal_id, {key}, total, n)
+            SELECT goal_id, {expr.format(r='d')}, round(sum(importo), 2), count(*) FROM donazioni d GROUP BY 1, 2""")
+
+
+MIGRATIONS = [
+    (1, _m001_base_schema),
+    (2, _m002_indexes),
+    (3, _m003_weather_cache),
+    (4, _m004_slots_starts_at),
+    (5, _m005_canonical_time),
+    (6, _m006_seat_counter),
+    (7, _m007_compact_cards),
+    (8, _m008_table_version),
+    (9, _m009_tables),
+    (10, _m010_seat_turns),
+    (11, _m011_bj_events),
+    (12, _m012_search_index),
+    (13, _m013_role_version),
+    (14, _m014_donation_ledger),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path=None):
+    path = path or db.DB_NAME
+    if path in _up_to_date:
+        return LATEST_VERSION
+    with _lock:
+        if path in _up_to_date:
+            return LATEST_VERSION
+        conn = get_connection(path)
+        try:
+            version = schema_version(conn)
+            if version < LATEST_VERSION:
+                # BEGIN IMMEDIATE: un solo processo alla volta applica le migrazioni, gli altri attendono
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    version = schema_version(conn)
+                    for num, step in MIGRATIONS:
+                        if num > version:
+                            step(conn)
+                            conn.execute(f"PRAGMA user_version={num}")
+                            version = num
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        finally:
+            conn.close()
+        _up_to_date.add(path)
+        return version
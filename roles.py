@@ -0,0 +1,108 @@
+# roles.py
+# Ruoli degli utenti con cache in processo: username -> (ruolo, badge HTML), caricata in blocco.
+# assign_user_role invalida la cache; le scritture di altri processi si vedono da PRAGMA data_version
+# (cambia solo se un'altra connessione ha fatto commit) e dal contatore cache_versions 'roles' (migrazione 13).
+# Il controllo si fa al più ogni ROLE_CHECK_SECONDS per processo: tutti i badge di un rerun costano zero query.
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+
+import db
+from db import get_connection
+
+
+def role_badge_html(r):
+    if r:
+        style = "background-color: #E0F2FE; color: #0284C7; border: 1px solid #7DD3FC;"
+        if "DJ" in r:
+            style = "background-color: #F3E8FF; color: #9333EA; border: 1px solid #D8B4FE;"
+        elif "Barman" in r:
+            style = "background-color: #FEF3C7; color: #D97706; border: 1px solid #FCD34D;"
+        elif "Admin" in r or "Boss" in r:
+            style = "background-color: #FEE2E2; color: #DC2626; border: 1px solid #FCA5A5;"
+        elif "VIP" in r or "Re" in r:
+            style = "background: linear-gradient(45deg, #FFD700, #FDB931); color: #FFF; text-shadow: 0 1px 2px rgba(0,0,0,0.2);"
+        return f"<span class='role-badge' style='{style}'>{r}</span>"
+    return ""
+
+
+@dataclass
+class RoleMap:
+    version: int
+    roles: dict = field(default_factory=dict)  # username -> ruolo (None = nessuno)
+    badges: dict = field(default_factory=dict)  # username -> badge HTML, solo per chi ha un ruolo
+
+
+ROLE_CHECK_SECONDS = 1.0
+
+_lock = threading.Lock()
+_cache = {}  # percorso del database -> RoleMap
+_checked = {}  # percorso del database -> istante dell'ultimo controllo
+_seen = weakref.WeakKeyDictionary()  # connessione del pool -> ultimo data_version visto da quella connessione
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _role_map():
+    path = db.DB_NAME
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(path)
+        last_check = _checked.get(path)
+        if cached is not None and last_check is not None and now - last_check < ROLE_CHECK_SECONDS:
+            _stats["hits"] += 1
+            return cached
+    conn = get_connection()
+    try:
+        # data_version è per connessione e cambia solo con i commit delle altre connessioni:
+        # si confronta con l'ultimo valore letto dalla stessa connessione, qualunque thread l'abbia usata
+        dv = conn.execute("PRAGMA data_version").fetchone()[0]
+        with _lock: last_dv, _seen[conn] = _seen.get(conn), dv
+        if cached is None or dv != last_dv:
+            version = conn.execute("SELECT version FROM cache_versions WHERE name = 'roles'").fetchone()[0]
+            if cached is None or cached.version != version:
+                rows = conn.execute("SELECT username, role FROM users").fetchall()
+                cached = RoleMap(version, dict(rows), {u: role_badge_html(r) for u, r in rows if r})
+                with _lock:
+                    _stats["misses"] += 1
+                    _cache[path] = cached
+                    _checked[path] = now
+                return cached
+    finally:
+        conn.close()
+    with _lock:
+        _stats["hits"] += 1
+        _checked[path] = now
+    return cached
+
+
+def get_role(username):
+    return _role_map().roles.get(username) if username else None
+
+
+def get_user_role_badge(username):
+    return _role_map().badges.get(username, "") if username else ""
+
+
+def all_users():
+    # [(username, ruolo)] in ordine alfabetico
+    return sorted(_role_map().roles.items())
+
+
+def invalidate_roles():
+    with _lock:
+        _cache.pop(db.DB_NAME, None)
+        _stats["invalidations"] += 1
+
+
+def assign_user_role(username, role):
+    conn = get_connection()
+    conn.execute("UPDATE users SET role = ? WHERE username = ?", (role, username))
+    conn.commit()
+    conn.close()
+    invalidate_roles()
+
+
+def role_cache_stats():
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,101 @@
+# search.py
+# Ricerca full-text su chat, eventi e lista spesa tramite l'indice FTS5 search_fts (migrazione 12).
+# Risultati ordinati per bm25, con snippet evidenziato e paginazione; i messaggi della chat sono
+# visibili solo a chi è prenotato all'evento (o agli admin), come nella pagina "I Miei Eventi".
+#
+# bm25 costa una lettura per ogni riga trovata: un termine comune in una chat lunga ne trova migliaia.
+# Le corrispondenze visibili (filtri di visibilità applicati prima del limite) si leggono in ordine di
+# rowid decrescente, che FTS5 fornisce senza ordinare, a finestre di SEARCH_WINDOW: bm25 ordina la
+# finestra e le pagine proseguono nella finestra successiva (eventi e lista spesa, poi i messaggi più
+# recenti, poi i più vecchi), quindi ogni corrispondenza visibile resta raggiungibile. Gli snippet si
+# costruiscono in Python sul testo delle sole righe della pagina (lette per rowid): snippet() di FTS5
+# rileggerebbe l'intera doclist dei termini per ogni riga.
+import html
+import re
+import unicodedata
+from dataclasses import dataclass
+
+from db import get_connection
+
+SEARCH_PAGE = 10
+SEARCH_WINDOW = 500
+KIND_LABELS = {"msg": "💬 Chat", "slot": "📅 Evento", "bring": "🛒 Porta"}
+SNIPPET_WORDS = 12
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    slot_id: int
+    username: str
+    snippet: str  # HTML: testo con escape, termini trovati in <mark>
+    tema: str
+    data: str
+
+
+def fts_query(text):
+    # Ogni parola diventa un prefisso tra virgolette: niente sintassi FTS5 dall'utente, "cass" trova "cassa"
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def _fold(word):
+    # Come il tokenizer unicode61 con remove_diacritics: minuscole e senza accenti
+    return "".join(c for c in unicodedata.normalize("NFKD", word.casefold()) if not unicodedata.combining(c))
+
+
+def make_snippet(body, text, size=SNIPPET_WORDS):
+    # Finestra di size parole attorno al primo termine trovato; HTML con escape e termini in <mark>
+    prefixes = tuple(_fold(w) for w in re.findall(r"\w+", text or ""))
+    tokens = list(re.finditer(r"\w+", body or ""))
+    hits = [i for i, t in enumerate(tokens) if prefixes and _fold(t.group()).startswith(prefixes)]
+    start = max(0, min(hits[0] - 2 if hits else 0, len(tokens) - size))
+    window = tokens[start:start + size]
+    if not window: return html.escape(body or "")
+    out, pos = ["…" if start > 0 else ""], window[0].start()
+    for i, t in enumerate(window, start):
+        out.append(html.escape(body[pos:t.start()]))
+        word = html.escape(t.group())
+        out.append(f"<mark>{word}</mark>" if i in hits else word)
+        pos = t.end()
+    end = start + len(window) < len(tokens)
+    out.append("…" if end else html.escape(body[pos:]))
+    return "".join(out)
+
+
+SEARCH_SQL = """
+    WITH visible AS (
+        SELECT f.rowid AS rid, bm25(search_fts) AS score, f.kind, f.slot_id, f.username, s.tema, s.data
+        FROM search_fts f JOIN slots s ON s.id = f.slot_id
+        WHERE search_fts MATCH :q
+          AND (:admin OR s.is_confirmed = 1)
+          AND (:admin OR f.kind <> 'msg'
+               OR EXISTS (SELECT 1 FROM bookings b WHERE b.slot_id = f.slot_id AND b.nome_amico = :username))
+        ORDER BY f.rowid DESC LIMIT :window OFFSET :skip
+    )
+    SELECT rid, kind, slot_id, username, tema, data, count(*) OVER () FROM visible
+    ORDER BY score, rid DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def search(text, username=None, admin=False, page=0, per_page=SEARCH_PAGE):
+    # (risultati della pagina, esiste una pagina successiva)
+    q = fts_query(text)
+    if not q: return [], False
+    pages = max(1, SEARCH_WINDOW // per_page)  # pagine per finestra: una pagina non è mai a cavallo di due
+    window = pages * per_page
+    block, page = divmod(page, pages)
+    conn = get_connection()
+    rows = conn.execute(SEARCH_SQL, {"q": q, "admin": int(bool(admin)), "username": username, "window": window,
+                                     "skip": block * window, "limit": per_page + 1, "offset": page * per_page}).fetchall()
+    # Finestra piena: le corrispondenze più vecchie sono nella finestra successiva
+    full = bool(rows) and rows[0][-1] == window
+    rows, has_more = [r[:-1] for r in rows[:per_page]], len(rows) > per_page or full
+    bodies = {}
+    if rows:
+        ids = [r[0] for r in rows]
+        bodies = dict(conn.execute(f"SELECT rowid, body FROM search_fts WHERE rowid IN ({','.join('?' * len(ids))})", ids).fetchall())
+    conn.close()
+    hits = [SearchHit(kind, sid, u, make_snippet(bodies.get(rid), text), tema, data) for rid, kind, sid, u, tema, data in rows]
+    return hits, has_more
@@ -0,0 +1,251 @@
+# service.py
+# Servizio di prenotazione senza Streamlit: account, prenotazioni, waitlist, lista spesa, eventi,
+# chat, cassa e ruoli. Ogni scrittura è una transazione (db.transaction o quella dei moduli sottostanti)
+# e restituisce un Result con un codice di esito; le letture restituiscono dataclass.
+# Le pagine di app.py si limitano a disegnare; benchmark e test di carico chiamano queste funzioni.
+import hashlib
+import sqlite3
+from dataclasses import dataclass
+
+from db import get_connection, transaction
+from events import DEFAULT_CAPACITY, format_event_time, reserve_seat, update_booking_details, invalidate_open_slot
+from chat import post_message, delete_message
+from ledger import create_goal, set_goal_active, add_donation, delete_donation
+from roles import assign_user_role, all_users, invalidate_roles
+# Letture e percorsi già atomici dei moduli sottostanti, esposti così come sono
+from board import load_board, load_admin_events
+from events import fast_join, next_open_slot
+from chat import open_chat, refresh_chat, load_older
+from ledger import primary_goal, list_goals, recent_donations, donor_totals, month_totals
+
+
+@dataclass(frozen=True)
+class Result:
+    status: str  # "OK" oppure un codice: ALREADY_BOOKED, SOLD_OUT, NOT_FOUND, EXISTS, EMPTY, ...
+    id: int = None  # riga creata o toccata, se ha senso
+
+    @property
+    def ok(self):
+        return self.status == "OK"
+
+
+OK = Result("OK")
+
+
+@dataclass
+class MyBooking:
+    id: int
+    slot_id: int
+    data: str
+    ora: str
+    tema: str
+    plus_one: bool
+    nome_plus_one: str
+    note: str
+    is_confirmed: bool
+
+
+@dataclass
+class PendingEvent:
+    id: int
+    data: str
+    ora: str
+    tema: str
+    creator: str
+
+
+# --- ACCOUNT ---
+def make_hashes(password: str) -> str:
+    return hashlib.sha256(str.encode(password)).hexdigest()
+
+
+def check_hashes(password: str, hashed_text: str) -> bool:
+    return make_hashes(password) == hashed_text
+
+
+def create_user(username, password):
+    if not username: return Result("EMPTY")
+    try:
+        with transaction() as conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, make_hashes(password)))
+    except sqlite3.IntegrityError:
+        return Result("EXISTS")
+    invalidate_roles()
+    return OK
+
+
+def ensure_user(username, password):
+    # Fast track: chi arriva dal link entra con il nome; l'account si crea solo se manca
+    with transaction() as conn:
+        created = conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, make_hashes(password))).rowcount
+    if created: invalidate_roles()
+    return OK
+
+
+def login_user(username, password):
+    conn = get_connection()
+    data = conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+    conn.close()
+    return bool(data) and check_hashes(password, data[0])
+
+
+# --- PRENOTAZIONI ---
+def book(slot_id, username, note="", plus_one=False, nome_plus_one=""):
+    return Result(reserve_seat(slot_id, username, note, plus_one, nome_plus_one), slot_id)
+
+
+def update_booking(slot_id, username, note, plus_one, nome_plus_one):
+    return Result(update_booking_details(slot_id, username, note, plus_one, nome_plus_one), slot_id)
+
+
+def cancel_booking(booking_id, username=None):
+    # username=None: rimozione da admin; altrimenti solo la propria prenotazione
+    with transaction() as conn:
+        deleted = conn.execute("DELETE FROM bookings WHERE id = ? AND (? IS NULL OR nome_amico = ?)",
+                               (booking_id, username, username)).rowcount
+    if not deleted: return Result("NOT_FOUND", booking_id)
+    invalidate_open_slot()
+    return Result("OK", booking_id)
+
+
+def my_bookings(username):
+    conn = get_connection()
+    rows = conn.execute(
+        """SELECT b.id, s.id, s.data, s.ora, s.tema, b.plus_one, b.nome_plus_one, b.note, s.is_confirmed
+        FROM bookings b JOIN slots s ON b.slot_id = s.id
+        WHERE b.nome_amico = ? ORDER BY s.starts_at""",
+        (username,),
+    ).fetchall()
+    conn.close()
+    return [MyBooking(bid, sid, d, o, t, bool(p1), np1 or "", note or "", bool(conf)) for bid, sid, d, o, t, p1, np1, note, conf in rows]
+
+
+def join_waitlist(slot_id, username):
+    # Idempotente: una sola riga per persona ed evento
+    with transaction() as conn:
+        if conn.execute("SELECT 1 FROM waitlist WHERE slot_id = ? AND username = ?", (slot_id, username)).fetchone():
+            return Result("ALREADY_LISTED", slot_id)
+        conn.execute("INSERT INTO waitlist (slot_id, username) VALUES (?, ?)", (slot_id, username))
+    return Result("OK", slot_id)
+
+
+def add_bring_item(slot_id, username, item):
+    item = (item or "").strip()
+    if not item: return Result("EMPTY")
+    with transaction() as conn:
+        cur = conn.execute("INSERT INTO bringing (slot_id, username, item) VALUES (?, ?, ?)", (slot_id, username, item))
+    return Result("OK", cur.lastrowid)
+
+
+def remove_bring_item(item_id, username):
+    with transaction() as conn:
+        deleted = conn.execute("DELETE FROM bringing WHERE id = ? AND username = ?", (item_id, username)).rowcount
+    return Result("OK" if deleted else "NOT_FOUND", item_id)
+
+
+# --- EVENTI ---
+def create_event(data, ora, tema, creator="Admin", capacity=None, confirmed=True, description=None):
+    # data: datetime.date o "YYYY-MM-DD"; ora: datetime.time
+    try:
+        with transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO slots (data, ora, tema, creator, description, is_confirmed, capacity) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(data), format_event_time(ora), tema, creator, description, int(bool(confirmed)), int(capacity or DEFAULT_CAPACITY)),
+            )
+    except sqlite3.IntegrityError:
+        return Result("EXISTS")
+    if confirmed: invalidate_open_slot()
+    return Result("OK", cur.lastrowid)
+
+
+def request_birthday(username, data, ora, tema, description="", guests=0):
+    # Evento in attesa di approvazione con festeggiato e ospiti già prenotati, tutto o niente
+    try:
+        with transaction() as conn:
+            sid = conn.execute(
+                "INSERT INTO slots (data, ora, tema, creator, description, is_confirmed) VALUES (?, ?, ?, ?, ?, 0)",
+                (str(data), format_event_time(ora), tema, username, description),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO bookings (slot_id, nome_amico, note, plus_one, nome_plus_one, tieni_status) VALUES (?, ?, ?, 0, '', 1)",
+                [(sid, username, "Festeggiato 👑")] + [(sid, f"Ospite {i + 1} di {username}", "Invitato") for i in range(int(guests))],
+            )
+    except sqlite3.IntegrityError:
+        return Result("EXISTS")
+    return Result("OK", sid)
+
+
+def pending_events():
+    conn = get_connection()
+    rows = conn.execute("SELECT id, data, ora, tema, creator FROM slots WHERE is_confirmed=0 ORDER BY starts_at").fetchall()
+    conn.close()
+    return [PendingEvent(*r) for r in rows]
+
+
+def approve_event(slot_id):
+    with transaction() as conn:
+        updated = conn.execute("UPDATE slots SET is_confirmed=1 WHERE id=?", (slot_id,)).rowcount
+    invalidate_open_slot()
+    return Result("OK" if updated else "NOT_FOUND", slot_id)
+
+
+def edit_event(slot_id, data, ora, tema, capacity):
+    # La capienza non scende mai sotto i posti già occupati
+    try:
+        with transaction() as conn:
+            updated = conn.execute(
+                "UPDATE slots SET data=?, ora=?, tema=?, capacity=max(?, seats_taken) WHERE id=?",
+                (str(data), format_event_time(ora), tema, int(capacity), slot_id),
+            ).rowcount
+    except sqlite3.IntegrityError:
+        return Result("EXISTS", slot_id)
+    invalidate_open_slot()
+    return Result("OK" if updated else "NOT_FOUND", slot_id)
+
+
+def delete_event(slot_id):
+    # Anche "Rifiuta" di una richiesta: evento e tutto ciò che gli appartiene
+    with transaction() as conn:
+        for table in ("bookings", "bringing", "waitlist", "event_messages"):
+            conn.execute(f"DELETE FROM {table} WHERE slot_id=?", (slot_id,))
+        deleted = conn.execute("DELETE FROM slots WHERE id=?", (slot_id,)).rowcount
+    invalidate_open_slot()
+    return Result("OK" if deleted else "NOT_FOUND", slot_id)
+
+
+# --- CHAT ---
+def send_message(slot_id, username, message):
+    message = (message or "").strip()
+    if not message: return Result("EMPTY")
+    return Result("OK", post_message(slot_id, username, message))
+
+
+def remove_message(view, msg_id, username):
+    return Result("OK" if delete_message(view, msg_id, username) else "NOT_FOUND", msg_id)
+
+
+# --- CASSA ---
+def donate(nome, importo, username=None, goal_id=1):
+    if not importo: return Result("EMPTY")
+    return Result("OK", add_donation(nome, importo, username, goal_id))
+
+
+def remove_donation(donation_id):
+    return Result("OK" if delete_donation(donation_id) else "NOT_FOUND", donation_id)
+
+
+def new_goal(description, target):
+    if not description: return Result("EMPTY")
+    return Result("OK", create_goal(description, target))
+
+
+def toggle_goal(goal_id, active):
+    set_goal_active(goal_id, active)
+    return Result("OK", goal_id)
+
+
+# --- RUOLI ---
+def set_role(username, role):
+    if username not in dict(all_users()): return Result("NOT_FOUND")
+    assign_user_role(username, role or None)
+    return OK
@@ -0,0 +1,32 @@
+# tests/conftest.py
+# Ogni test lavora su un database nuovo in tmp_path, già migrato (mai su terrazzo_vito.db).
+# Le cache in processo (fast track, ruoli, snapshot dei tavoli) sono per percorso del database,
+# quindi un file nuovo per test basta a isolarle.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    # Connessione del test sul database nuovo; le funzioni chiamate dal test usano lo stesso file
+    path = str(tmp_path / "terrazzo_test.db")
+    db.close_all_connections()
+    db.set_database(path)
+    migrations.migrate(path)
+    conn = db.get_connection()
+    yield conn
+    conn.close()
+    db.close_all_connections()
+    migrations._up_to_date.discard(path)
+
+
+@pytest.fixture
+def db_path(conn):
+    return db.DB_NAME
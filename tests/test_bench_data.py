@@ -0,0 +1,13 @@
+import bench_data
+import events
+
+
+def test_small_scale_is_consistent(conn, db_path):
+    rows = bench_data.generate(db_path, "small")
+    scale = bench_data.SCALES["small"]
+    assert rows["slots"] == scale.events + scale.history and rows["users"] == scale.users
+    bad = conn.execute("""SELECT count(*) FROM slots s WHERE seats_taken > capacity OR seats_taken <>
+        (SELECT count(*) + coalesce(sum(plus_one), 0) FROM bookings WHERE slot_id = s.id)""").fetchone()[0]
+    assert bad == 0
+    # cleanup_past_events elimina esattamente lo storico
+    assert events.cleanup_past_events() == scale.history
@@ -0,0 +1,39 @@
+import json
+
+import benchmarks
+
+
+REPORT = {"results": {
+    "board_load": {"n_5": {"min_us": 100.0, "median_us": 120.0, "p95_us": 200.0, "queries": 3}},
+    "fast_join": {"first_slot": {7: {"delete_all_us": 50.0}}, "ok": True},
+    "cold_start": {"empty": True},
+}}
+
+
+def test_timings_keep_only_comparable_times():
+    assert benchmarks._timings(REPORT["results"]) == {"board_load/n_5/min_us": 100.0, "fast_join/first_slot/7/delete_all_us": 50.0}
+
+
+def test_report_compares_with_itself_after_json():
+    # Stessa forma del JSON salvato: chiavi non stringa e benchmark senza tempi restano confrontabili
+    saved = json.loads(json.dumps(REPORT))
+    assert benchmarks.compare(saved, saved) == ([], 2)
+    assert benchmarks.compare(saved, REPORT) == ([], 2)
+
+
+def test_compare_flags_only_regressions_over_threshold():
+    slower = json.loads(json.dumps(REPORT))
+    slower["results"]["board_load"]["n_5"]["min_us"] = 130.0
+    assert benchmarks.compare(REPORT, slower, 0.25) == ([("board_load/n_5/min_us", 100.0, 130.0, 1.3)], 2)
+    assert benchmarks.compare(REPORT, slower, 0.5)[0] == []
+    # Sotto MIN_DELTA_US in assoluto non è una regressione
+    slower["results"]["board_load"]["n_5"]["min_us"] = 100.0
+    slower["results"]["fast_join"]["first_slot"]["7"]["delete_all_us"] = 50.0 + benchmarks.MIN_DELTA_US
+    assert benchmarks.compare(REPORT, slower)[0] == []
+
+
+def test_merge_applies_the_stat_to_times_only():
+    a = {"x": {"min_us": 10.0, "queries": 3}, "label": "a"}
+    b = {"x": {"min_us": 12.0, "queries": 4}, "label": "b"}
+    assert benchmarks._merge([a, b], max) == {"x": {"min_us": 12.0, "queries": 3}, "label": "a"}
+    assert benchmarks._merge([a, b], min)["x"]["min_us"] == 10.0
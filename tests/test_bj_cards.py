@@ -0,0 +1,21 @@
+import pytest
+
+import bj_cards
+import bj_sim
+
+
+def test_lookup_tables_match_the_rules():
+    assert bj_cards.verify_lookup_tables() == []
+
+
+@pytest.mark.parametrize("policy", bj_sim.POLICIES)
+def test_simulator_matches_the_scalar_reference(policy):
+    # Stessi esiti del riferimento scalare (funzioni di bj_cards + regole di end_round) mano per mano
+    assert bj_sim.verify(5000, seed=1, policy=policy) == 0
+
+
+def test_short_card_buffer_raises(monkeypatch):
+    # Un buffer più corto di un round non deve produrre esiti silenziosamente sbagliati
+    monkeypatch.setattr(bj_sim, "CARDS_PER_ROUND", 4)
+    with pytest.raises(RuntimeError):
+        bj_sim.simulate_batch(bj_sim.np.random.default_rng(1), 1000)
@@ -0,0 +1,127 @@
+import threading
+
+import blackjack_app as bj
+import db
+import bj_events
+from bench_data import current_player, record_session, seat_players
+from bj_snapshot import clear_snapshots
+
+
+def _play_round(conn, table_id):
+    bj.start_game(table_id)
+    for _ in range(30):
+        status = conn.execute("SELECT status FROM bj_game WHERE id=?", (table_id,)).fetchone()[0]
+        user, _, _ = bj.get_current_turn(conn, table_id)
+        if status == "INSURANCE":
+            bj.close_insurance_phase(conn.execute("SELECT username FROM bj_players WHERE table_id=? LIMIT 1", (table_id,)).fetchone()[0], table_id)
+        elif status == "PLAYING":
+            bj.player_stand(user, table_id)
+        else:
+            break
+    bj.reset_round(table_id)
+
+
+def test_end_round_report_matches_the_database(conn):
+    seat_players(bj, 6)
+    bj.start_game(1)
+    conn.execute("UPDATE bj_game SET status='PLAYING', current_seat=0, current_hand_index=0 WHERE id=1")
+    conn.execute("UPDATE bj_hands SET cards=x'0001', score=4, status='PLAYING'")
+    conn.commit()
+    report = bj.end_round(1)
+    stored = {u: (br, res) for u, br, res in conn.execute("SELECT username, bankroll, main_result FROM bj_players WHERE table_id=1")}
+    assert report.bankrolls == stored
+    assert all(h.bankroll == stored[h.username][0] for h in report.hands)
+
+
+def test_turn_order_with_splits(conn, seats=8):
+    conn.execute("UPDATE bj_game SET max_seats=? WHERE id=1", (seats,))
+    conn.commit()
+    players = seat_players(bj, seats)
+    bj.start_game(1)
+    conn.execute("UPDATE bj_hands SET cards=?, score=16, status='PLAYING' WHERE table_id=1", (bytes([24, 25]),))  # 8♠ 8♥
+    conn.execute("UPDATE bj_game SET status='PLAYING', current_seat=0, current_hand_index=0, dealer_cards=x'2c30' WHERE id=1")
+    conn.commit()
+    visited, split_done = [], set()
+    while True:
+        user, seat, h_idx = bj.get_current_turn(conn, 1)
+        if user is None: break
+        visited.append((seat, h_idx))
+        if user not in split_done:
+            assert bj.player_split(user, 1) == "OK"
+            split_done.add(user)
+            continue
+        bj.player_stand(user, 1)
+    # Ordine (posto, mano): 0/0, 0/1, 1/0, 1/1, ... e poi il banco
+    assert visited == [(s, h) for s in range(seats) for h in (0, 0, 1)]
+    assert conn.execute("SELECT status FROM bj_game WHERE id=1").fetchone()[0] == "FINISHED"
+    assert len(players) == seats
+
+
+def test_leaving_players_pass_the_turn(conn, seats=6):
+    players = seat_players(bj, seats)
+    bj.start_game(1)
+    conn.execute("UPDATE bj_hands SET cards=?, score=16, status='PLAYING' WHERE table_id=1", (bytes([24, 25]),))
+    conn.execute("UPDATE bj_game SET status='PLAYING', current_seat=0, current_hand_index=0, dealer_cards=x'2c30' WHERE id=1")
+    conn.commit()
+    bj.player_stand(players[0], 1)
+    # Chi esce con il turno lo passa al posto dopo; uscito l'ultimo con mani da giocare, il round si chiude
+    for seat, user in enumerate(players[1:], 1):
+        assert bj.get_current_turn(conn, 1)[:2] == (user, seat)
+        bj.leave_blackjack(user)
+    assert conn.execute("SELECT status FROM bj_game WHERE id=1").fetchone()[0] == "FINISHED"
+
+
+def test_full_tables_open_a_new_one(conn, players=21):
+    for i in range(players):
+        table_id = next(t[0] for t in bj.list_tables() if t[2] == "WAITING" and t[4] < t[3])
+        assert bj.join_blackjack(f"player{i}", table_id)[0]
+    tables = bj.list_tables()
+    full = [t[0] for t in tables if t[4] == t[3]]
+    assert len(full) == players // bj.TABLE_SEATS and tables[-1][4] == 0
+    conn.execute("UPDATE bj_players SET bet_main=10")
+    conn.commit()
+    # Le azioni su un tavolo non toccano la versione degli altri (i loro client non ricaricano)
+    others = {t: conn.execute("SELECT version FROM bj_game WHERE id=?", (t,)).fetchone()[0] for t in full[1:]}
+    _play_round(conn, full[0])
+    assert all(conn.execute("SELECT version FROM bj_game WHERE id=?", (t,)).fetchone()[0] == v for t, v in others.items())
+
+
+def test_replay_matches_the_recorded_session(conn, rounds=30):
+    users = seat_players(bj, 6)
+    record_session(bj, users, rounds, seed=1234)
+    replays = bj_events.replay_all(1)
+    assert len(replays) == rounds and all(r.status == "FINISHED" for r in replays)
+    stored = dict(conn.execute("SELECT username, bankroll FROM bj_players WHERE table_id=1").fetchall())
+    assert all(stored[u] == br for u, br in replays[-1].bankrolls.items())
+
+
+def _ticks(fn, n):
+    # Ogni tick su un thread nuovo, come i fragment run_every di Streamlit
+    out = []
+    before = db.connection_stats()
+    for _ in range(n):
+        t = threading.Thread(target=lambda: out.append(fn()))
+        t.start()
+        t.join()
+    after = db.connection_stats()
+    return out, after["statements"] - before["statements"], after["opened"] - before["opened"]
+
+
+def test_table_polling(conn, ticks=30, spectators=20):
+    clear_snapshots()
+    seat_players(bj, 6)
+    bj.start_game(1)
+    (state,), _, _ = _ticks(lambda: bj.poll_table_state(None, "player0"), 1)
+    # Client in attesa: una lettura della versione per tick, sulla connessione già aperta del pool
+    _, statements, opened = _ticks(lambda: bj.poll_table_state(state, "player0"), ticks)
+    assert statements == ticks and opened == 0
+    bj.player_stand(current_player(bj)[0], 1)
+    (new_state,), statements, _ = _ticks(lambda: bj.poll_table_state(state, "player0"), 1)
+    assert new_state.version > state.version
+    # Lettura della versione + BEGIN, partita, giocatori/mani, COMMIT
+    assert statements == 5
+    # Spettatori: dopo un'azione il primo tick legge il tavolo, tutti gli altri usano lo stesso snapshot
+    bj.player_stand(current_player(bj)[0], 1)
+    views, statements, _ = _ticks(lambda: bj.poll_table_state(None, "watcher", watch=1), spectators)
+    assert all(v is views[0] for v in views) and views[0].version > new_state.version
+    assert statements == spectators + 4
@@ -0,0 +1,41 @@
+import datetime
+
+import events
+import roles
+from bench_data import QueryCounter, seed_events
+from board import ADMIN_PAGE, load_admin_events, load_board
+
+
+def test_board_queries_do_not_grow_with_events(conn, monkeypatch):
+    # Il ruolo arriva dalla cache dei ruoli: caricata prima e senza controlli di versione durante il test
+    monkeypatch.setattr(roles, "ROLE_CHECK_SECONDS", 3600)
+    seed_events(5)
+    load_board("user1")
+    with QueryCounter() as few:
+        board = load_board("user1")
+    assert len(board.slots) == 5
+    seed_events(25, start=datetime.date.today() + datetime.timedelta(days=6))
+    with QueryCounter() as many:
+        board = load_board("user1")
+    assert len(board.slots) == 30 and many.count == few.count
+
+
+def test_admin_events_pages_with_participants(conn):
+    seed_events(2 * ADMIN_PAGE, bookings_per_event=4, items_per_event=0)
+    since = events.now_ts()
+    with QueryCounter() as qc:
+        page = load_admin_events(since)
+    assert len(page.events) == ADMIN_PAGE and page.has_more and qc.count == 2
+    assert all(len(e.participants) == 4 for e in page.events)
+    last = load_admin_events(since, page=1)
+    assert not last.has_more
+    assert last.events[-1].id == conn.execute("SELECT id FROM slots ORDER BY starts_at DESC LIMIT 1").fetchone()[0]
+
+
+def test_admin_events_lists_invalid_dates_first(conn):
+    # starts_at NULL (data non valida): resta raggiungibile per correggerla o eliminarla
+    seed_events(3)
+    bad = conn.execute("INSERT INTO slots (data, ora, tema, creator, is_confirmed) VALUES ('31/12', '20:00:00', 'Data rotta', 'Admin', 1)").lastrowid
+    conn.commit()
+    page = load_admin_events(events.now_ts())
+    assert [e.id for e in page.events][0] == bad and len(page.events) == 4
@@ -0,0 +1,61 @@
+import chat
+from bench_data import QueryCounter, seed_events
+
+
+def _chat(conn, messages=200, slots=3, users=20):
+    # Chat interlacciate: i messaggi di uno slot sono sparsi nella tabella come in produzione
+    seed_events(slots, bookings_per_event=0, items_per_event=0)
+    slot_ids = [r[0] for r in conn.execute("SELECT id FROM slots ORDER BY id").fetchall()]
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, '', ?)",
+                     [(f"user{u}", "DJ" if u % 10 == 0 else None) for u in range(users)])
+    conn.executemany("INSERT INTO event_messages (slot_id, username, message) VALUES (?, ?, ?)",
+                     [(slot_ids[i % slots], f"user{i % users}", f"messaggio {i}") for i in range(messages * slots)])
+    conn.commit()
+    return slot_ids[0]
+
+
+def test_open_chat_loads_latest_page_with_roles(conn):
+    slot = _chat(conn)
+    view = chat.open_chat(slot)
+    assert len(view.messages) == chat.CHAT_PAGE and view.has_older
+    assert view.messages[-1].id == conn.execute("SELECT max(id) FROM event_messages WHERE slot_id=?", (slot,)).fetchone()[0]
+    assert any(m.role == "DJ" for m in view.messages)
+
+
+def test_refresh_and_load_older(conn):
+    slot = _chat(conn)
+    view = chat.open_chat(slot)
+    with QueryCounter() as tick:
+        assert chat.refresh_chat(view) == 0
+    assert tick.count == 1
+    chat.post_message(slot, "user1", "nuovo")
+    assert chat.refresh_chat(view) == 1 and view.messages[-1].message == "nuovo"
+    first = view.first_id
+    chat.load_older(view)
+    assert len(view.messages) == 2 * chat.CHAT_PAGE + 1 and view.messages[chat.CHAT_PAGE].id == first
+
+
+def test_delete_only_own_messages(conn):
+    slot = _chat(conn)
+    view = chat.open_chat(slot)
+    mine = chat.post_message(slot, "user1", "da cancellare")
+    chat.refresh_chat(view)
+    assert not chat.delete_message(view, mine, "user2")
+    assert chat.delete_message(view, mine, "user1") and mine not in [m.id for m in view.messages]
+
+
+def test_refresh_drops_messages_deleted_elsewhere(conn):
+    # Stessa chat aperta in due sessioni: la cancellazione fatta in una sparisce dall'altra al tick
+    slot = _chat(conn)
+    mine = chat.post_message(slot, "user1", "da cancellare")
+    view, other = chat.open_chat(slot), chat.open_chat(slot)
+    oldest = other.first_id
+    assert chat.delete_message(view, mine, "user1")
+    conn.execute("DELETE FROM event_messages WHERE id = ?", (oldest,))
+    conn.commit()
+    newer = chat.post_message(slot, "user2", "dopo")
+    assert chat.refresh_chat(other) == 1
+    assert [m.id for m in other.messages] == [m.id for m in view.messages if m.id != oldest] + [newer]
+    with QueryCounter() as tick:
+        assert chat.refresh_chat(other) == 0
+    assert tick.count == 1
@@ -0,0 +1,58 @@
+import threading
+
+import db
+import service
+
+
+def _on_new_thread(fn, *args):
+    t = threading.Thread(target=fn, args=args)
+    t.start()
+    t.join()
+
+
+def test_connections_are_reused_across_threads(conn):
+    # Streamlit esegue ogni rerun su un thread nuovo: la connessione rilasciata da uno serve il successivo
+    _on_new_thread(service.load_board, "anna")
+    db.reset_connection_stats()
+    for _ in range(5): _on_new_thread(service.load_board, "anna")
+    assert db.connection_stats()["opened"] == 0
+
+
+def test_nested_calls_share_the_threads_connection(conn):
+    inner = db.get_connection()
+    assert inner is conn
+    inner.close()
+    assert db.get_connection() is conn and conn._depth == 2
+    conn.close()
+
+
+def test_extra_close_after_release_is_ignored(conn, db_path):
+    # Rimessa nel pool una volta sola: due thread non devono ricevere la stessa connessione
+    got = []
+    _on_new_thread(lambda: got.append(db.get_connection()) or got[0].close() or got[0].close())
+    assert db._idle[db_path].count(got[0]) == 1
+
+
+def test_released_connection_goes_back_to_the_pool(conn):
+    other = []
+    _on_new_thread(lambda: other.append(db.get_connection()))  # mai rilasciata: resta al thread finito
+    _on_new_thread(lambda: other.append(db.get_connection()) or other[-1].close())
+    _on_new_thread(lambda: other.append(db.get_connection()) or other[-1].close())
+    assert other[1] is other[2] and other[0] is not other[1] and conn not in other
+
+
+def test_nested_transaction_is_a_savepoint(conn):
+    # L'errore nel blocco interno annulla solo quello; il COMMIT resta alla transazione esterna
+    with db.transaction() as outer:
+        outer.execute("INSERT INTO users (username, password) VALUES ('outer', '')")
+        try:
+            with db.transaction() as inner:
+                inner.execute("INSERT INTO users (username, password) VALUES ('inner', '')")
+                raise KeyError
+        except KeyError:
+            pass
+        with db.transaction() as inner:
+            inner.execute("INSERT INTO users (username, password) VALUES ('kept', '')")
+        assert outer.in_transaction
+    names = {r[0] for r in conn.execute("SELECT username FROM users")}
+    assert names == {"outer", "kept"}
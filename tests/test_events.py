@@ -0,0 +1,109 @@
+import datetime
+import threading
+
+import db
+import events
+from bench_data import seed_events
+
+TOMORROW = datetime.date.today() + datetime.timedelta(days=1)
+
+
+def _slot(conn, capacity, day=TOMORROW):
+    sid = conn.execute(
+        "INSERT INTO slots (data, ora, tema, creator, is_confirmed, capacity) VALUES (?, '20:00:00', 'Test', 'Admin', 1, ?)",
+        (str(day), capacity),
+    ).lastrowid
+    conn.commit()
+    return sid
+
+
+def _run_threads(n, target):
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        target(i)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in pool: t.start()
+    for t in pool: t.join()
+
+
+def test_concurrent_reservations_never_exceed_capacity(conn):
+    sid = _slot(conn, 10)
+    results = []
+    _run_threads(30, lambda i: results.append(events.reserve_seat(sid, f"friend{i}", plus_one=(i % 3 == 0))))
+    taken, cap = conn.execute("SELECT seats_taken, capacity FROM slots WHERE id=?", (sid,)).fetchone()
+    real = conn.execute("SELECT count(*) + coalesce(sum(plus_one), 0) FROM bookings WHERE slot_id=?", (sid,)).fetchone()[0]
+    assert taken <= cap and taken == real
+    assert set(results) == {"OK", "SOLD_OUT"}
+
+
+def test_reserve_seat_outcomes(conn):
+    sid = _slot(conn, 2)
+    assert events.reserve_seat(sid, "anna") == "OK"
+    assert events.reserve_seat(sid, "anna") == "ALREADY_BOOKED"
+    assert events.reserve_seat(sid, "bruno", plus_one=True) == "SOLD_OUT"
+    assert events.reserve_seat(sid + 100, "carla") == "NOT_FOUND"
+
+
+def test_fast_join_skips_full_events(conn):
+    capacities = (3, 5, 20)
+    sids = [_slot(conn, cap, TOMORROW + datetime.timedelta(days=i)) for i, cap in enumerate(capacities)]
+    conn.executemany("INSERT INTO bookings (slot_id, nome_amico) VALUES (?, ?)", [(sids[0], f"early{i}") for i in range(capacities[0])])
+    conn.commit()
+    events.invalidate_open_slot()
+    results = []
+    _run_threads(40, lambda i: results.append(events.fast_join(f"friend{i}")))
+    ok = [slot[0] for slot, res in results if res == "OK"]
+    assert len(ok) == min(40, sum(capacities[1:])) and sids[0] not in ok
+    for sid in sids:
+        taken, cap = conn.execute("SELECT seats_taken, capacity FROM slots WHERE id=?", (sid,)).fetchone()
+        assert taken <= cap
+    # Una persona, un posto
+    assert conn.execute("SELECT count(DISTINCT nome_amico) = count(*) FROM bookings").fetchone()[0] == 1
+
+
+def test_cleanup_removes_only_past_events(conn):
+    seed_events(20, bookings_per_event=2, items_per_event=1, start=datetime.date.today() - datetime.timedelta(days=30))
+    seed_events(5, bookings_per_event=2, items_per_event=1)
+    assert events.cleanup_past_events() == 20
+    assert events.cleanup_past_events() == 0
+    assert conn.execute("SELECT count(*) FROM slots").fetchone()[0] == 5
+    assert conn.execute("SELECT count(*) FROM bookings WHERE slot_id NOT IN (SELECT id FROM slots)").fetchone()[0] == 0
+
+
+def test_reservations_inside_a_callers_transaction(conn):
+    sid = _slot(conn, 2)
+    with db.transaction():
+        assert events.reserve_seat(sid, "anna") == "OK"
+        assert events.update_booking_details(sid, "anna", "", True, "amico") == "OK"
+        assert events.reserve_seat(sid, "bruno") == "SOLD_OUT"
+    assert conn.execute("SELECT seats_taken FROM slots WHERE id=?", (sid,)).fetchone()[0] == 2
+
+
+def test_taking_the_last_seat_invalidates_the_fast_slot(conn):
+    # Entro FAST_SLOT_TTL il fast track non deve proporre un evento appena riempito
+    first, second = _slot(conn, 2), _slot(conn, 5, TOMORROW + datetime.timedelta(days=1))
+    events.invalidate_open_slot()
+    assert events.next_open_slot()[0] == first
+    assert events.reserve_seat(first, "anna") == "OK" and events.next_open_slot()[0] == first
+    assert events.reserve_seat(first, "bruno") == "OK" and events.next_open_slot()[0] == second
+    assert events.update_booking_details(second, "carla", "", True, "") == "NOT_FOUND"
+    for i in range(4): events.reserve_seat(second, f"amico{i}")
+    assert events.update_booking_details(second, "amico0", "", True, "zio") == "OK"
+    assert events.next_open_slot() is None
+
+
+def test_update_checks_capacity_only_when_adding_a_plus_one(conn):
+    sid = _slot(conn, 3)
+    for name in ("anna", "bruno"): events.reserve_seat(sid, name)
+    assert events.update_booking_details(sid, "anna", "", True, "zio") == "OK"
+    assert events.update_booking_details(sid, "bruno", "", True, "zia") == "SOLD_OUT"
+    # Capienza ridotta dall'admin sotto i posti presi: le modifiche che non aggiungono posti passano
+    conn.execute("UPDATE slots SET capacity = 1 WHERE id = ?", (sid,))
+    conn.commit()
+    assert events.update_booking_details(sid, "anna", "arrivo tardi", True, "zio Pino") == "OK"
+    assert events.update_booking_details(sid, "bruno", "porto il vino", False, "") == "OK"
+    assert events.update_booking_details(sid, "anna", "", False, "") == "OK"
+    assert conn.execute("SELECT seats_taken FROM slots WHERE id=?", (sid,)).fetchone()[0] == 2
@@ -0,0 +1,22 @@
+import ledger
+
+
+def test_rollups_match_the_donations(conn, donations=3000, donors=30, goals=3):
+    for g in range(2, goals + 1):
+        ledger.create_goal(f"Fondo {g}", 500)
+    conn.executemany(
+        "INSERT INTO donazioni (donatore, importo, goal_id, donated_at) VALUES (?, ?, ?, ?)",
+        [(f"donor{i % donors}", float(i % 50 + 1), i % goals + 1, f"2025-{i % 12 + 1:02d}-01 20:00:00") for i in range(donations)],
+    )
+    conn.commit()
+    # Aggiornamenti e cancellazioni passano dagli stessi trigger
+    conn.execute("UPDATE donazioni SET importo = importo + 0.5, goal_id = 2 WHERE id % 97 = 0")
+    conn.execute("DELETE FROM donazioni WHERE id % 101 = 0")
+    conn.commit()
+    for gid, cur in conn.execute("SELECT id, current FROM goal").fetchall():
+        full = conn.execute("SELECT coalesce(round(sum(importo), 2), 0) FROM donazioni WHERE goal_id = ?", (gid,)).fetchone()[0]
+        assert abs(cur - full) < 0.01, gid
+    by_donor = dict(conn.execute("SELECT donatore, round(sum(importo), 2) FROM donazioni WHERE goal_id = 2 GROUP BY 1").fetchall())
+    assert {d: t for d, t, _ in ledger.donor_totals(2, limit=donors)} == by_donor
+    by_month = conn.execute("SELECT substr(donated_at, 1, 7), round(sum(importo), 2), count(*) FROM donazioni GROUP BY 1 ORDER BY 1 DESC").fetchall()
+    assert ledger.month_totals() == by_month
@@ -0,0 +1,31 @@
+import datetime
+
+import pytest
+
+import meteo
+from bench_data import StubOpenMeteo
+
+
+@pytest.fixture
+def stub():
+    stub = StubOpenMeteo()
+    yield stub
+    stub.close()
+
+
+def test_forecasts_use_one_ranged_request(conn, stub):
+    today = datetime.date.today()
+    dates = [str(today + datetime.timedelta(days=i)) for i in range(30)]
+    first = meteo.get_forecasts(dates, stub.url)
+    # Una sola richiesta ranged per tutti gli eventi, poi solo cache locale
+    assert meteo.get_forecasts(dates, stub.url) == first
+    assert stub.requests == 1
+
+
+def test_live_weather_reads_from_memory(stub):
+    service = meteo.LiveWeatherService(base_url=stub.url, interval=3600)
+    assert service.refresh_now()
+    # La sidebar legge solo il valore in memoria: nessuna richiesta HTTP per rerun
+    for _ in range(100):
+        service.current()
+    assert stub.requests == 1 and service.current()
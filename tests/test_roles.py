@@ -0,0 +1,45 @@
+import sqlite3
+
+import roles
+from bench_data import QueryCounter
+
+
+def _users(conn, users=50):
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, '', ?)",
+                     [(f"user{i}", "🎧 DJ" if i % 7 == 0 else None) for i in range(users)])
+    conn.commit()
+
+
+def test_cached_badges_need_no_queries(conn, monkeypatch):
+    monkeypatch.setattr(roles, "ROLE_CHECK_SECONDS", 3600)
+    _users(conn)
+    roles.get_user_role_badge("user0")
+    with QueryCounter() as qc:
+        for i in range(200):
+            roles.get_user_role_badge(f"user{i % 50}")
+    assert qc.count == 0  # entro ROLE_CHECK_SECONDS nessuna query
+
+
+def test_write_in_this_process_invalidates(conn):
+    _users(conn)
+    roles.get_role("user1")
+    roles.assign_user_role("user1", "🍹 Barman")
+    assert roles.get_role("user1") == "🍹 Barman"
+
+
+def test_write_from_another_process(conn, db_path, monkeypatch):
+    # data_version + contatore dei ruoli, controllati a ogni chiamata con l'intervallo azzerato
+    _users(conn)
+    monkeypatch.setattr(roles, "ROLE_CHECK_SECONDS", 0)
+    roles.get_role("user0")
+    other = sqlite3.connect(db_path)
+    other.execute("UPDATE users SET role = '📸 Fotografo' WHERE username = 'user2'")
+    other.commit()
+    assert roles.get_role("user2") == "📸 Fotografo"
+    # Scritture di altre tabelle cambiano data_version ma non i ruoli: nessun ricaricamento
+    before = roles.role_cache_stats()["misses"]
+    other.execute("INSERT INTO donazioni (donatore, importo) VALUES ('x', 1)")
+    other.commit()
+    roles.get_role("user3")
+    assert roles.role_cache_stats()["misses"] == before
+    other.close()
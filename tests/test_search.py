@@ -0,0 +1,60 @@
+import search
+from bench_data import seed_events
+
+
+def _messages(conn, messages=300, slots=5, users=20):
+    seed_events(slots, bookings_per_event=3, items_per_event=2)
+    slot_ids = [r[0] for r in conn.execute("SELECT id FROM slots ORDER BY id").fetchall()]
+    words = ["cassa", "ghiaccio", "birra", "pizza", "chitarra", "casse", "vino", "torta", "sedie", "musica", "stasera", "arrivo"]
+    conn.executemany("INSERT INTO event_messages (slot_id, username, message) VALUES (?, ?, ?)",
+                     [(slot_ids[i % slots], f"user{i % users}", f"{words[i % 12]} {words[(i * 7) % 12]} messaggio {i}") for i in range(messages)])
+    conn.commit()
+    return slot_ids
+
+
+def test_index_follows_insert_update_delete(conn):
+    slot_ids = _messages(conn)
+    mid = conn.execute("INSERT INTO event_messages (slot_id, username, message) VALUES (?, 'user1', 'porto io lo speaker')", (slot_ids[0],)).lastrowid
+    conn.commit()
+    assert [h.username for h in search.search("speaker", admin=True)[0]] == ["user1"]
+    conn.execute("UPDATE event_messages SET message='porto il proiettore' WHERE id=?", (mid,))
+    conn.commit()
+    assert not search.search("speaker", admin=True)[0] and search.search("proiett", admin=True)[0]
+    conn.execute("DELETE FROM event_messages WHERE id=?", (mid,))
+    conn.commit()
+    assert not search.search("proiettore", admin=True)[0]
+
+
+def test_chat_visible_only_to_booked_users(conn):
+    # user0 è prenotato a tutti gli eventi seminati, user500 a nessuno (vede solo eventi e lista spesa)
+    _messages(conn)
+    assert any(h.kind == "msg" for h in search.search("cassa", username="user0")[0])
+    assert all(h.kind != "msg" for h in search.search("item", username="user500")[0])
+
+
+def test_snippet_and_paging(conn):
+    _messages(conn)
+    hits, has_more = search.search("ghiaccio torta", username="user0")
+    assert hits and has_more and "<mark>" in hits[0].snippet
+    assert len(hits) == search.SEARCH_PAGE
+
+
+def test_visibility_applies_before_the_window(conn):
+    # bob è prenotato solo all'evento A: i 600 messaggi più recenti dell'evento B non gli nascondono il suo
+    seed_events(2, bookings_per_event=0, items_per_event=0)
+    a, b = [r[0] for r in conn.execute("SELECT id FROM slots ORDER BY id").fetchall()]
+    conn.execute("INSERT INTO bookings (slot_id, nome_amico) VALUES (?, 'bob')", (a,))
+    conn.execute("INSERT INTO event_messages (slot_id, username, message) VALUES (?, 'anna', 'porto lo speaker')", (a,))
+    conn.executemany("INSERT INTO event_messages (slot_id, username, message) VALUES (?, 'carla', ?)",
+                     [(b, f"speaker numero {i}") for i in range(600)])
+    conn.commit()
+    hits, has_more = search.search("speaker", username="bob")
+    assert [(h.slot_id, h.username) for h in hits] == [(a, "anna")] and not has_more
+    # L'admin raggiunge tutte le 601 corrispondenze sfogliando le pagine, ognuna una volta sola
+    seen, page = [], 0
+    while True:
+        hits, has_more = search.search("speaker", admin=True, page=page)
+        seen += [h.snippet for h in hits]
+        if not has_more: break
+        page += 1
+    assert len(seen) == len(set(seen)) == 601
@@ -0,0 +1,73 @@
+import datetime
+import random
+import threading
+
+import db
+import service
+
+
+def test_nested_read_keeps_the_callers_transaction(conn):
+    # Una lettura annidata (get_connection ... close) dentro una transazione non la annulla
+    with db.transaction() as tx:
+        tx.execute("INSERT INTO users (username, password) VALUES ('outer', '')")
+        assert not service.login_user("outer", "pw") and tx.in_transaction
+    assert conn.execute("SELECT count(*) FROM users WHERE username = 'outer'").fetchone()[0] == 1
+
+
+def test_error_rolls_back_the_transaction(conn):
+    try:
+        with db.transaction() as tx:
+            tx.execute("INSERT INTO users (username, password) VALUES ('rolled_back', '')")
+            service.my_bookings("rolled_back")
+            raise KeyError
+    except KeyError:
+        pass
+    assert conn.execute("SELECT count(*) FROM users WHERE username = 'rolled_back'").fetchone()[0] == 0
+
+
+def test_simulated_users_keep_counters_consistent(conn, users=200, threads=4, capacity=15, seed=7):
+    # Registrazione, bacheca, prenotazione (o waitlist se pieno), lista spesa, chat, qualche disdetta
+    day = datetime.date.today() + datetime.timedelta(days=1)
+    sids = [service.create_event(day + datetime.timedelta(days=i), datetime.time(20, 0), f"Evento {i}", capacity=capacity).id
+            for i in range(5)]
+    counts, lock = {}, threading.Lock()
+
+    def worker(ids):
+        rng = random.Random(seed + ids.start)
+        local = {}
+        for i in ids:
+            name = f"sim{i}"
+            ok = service.create_user(name, "pw").ok and service.login_user(name, "pw")
+            local["login"] = local.get("login", 0) + ok
+            service.load_board(name)
+            sid = rng.choice(sids)
+            res = service.book(sid, name, "sim", rng.random() < 0.2, "amico")
+            local[res.status] = local.get(res.status, 0) + 1
+            if res.status == "SOLD_OUT":
+                service.join_waitlist(sid, name)
+                continue
+            service.add_bring_item(sid, name, "ghiaccio")
+            service.send_message(sid, name, "ci sono!")
+            if rng.random() < 0.1:
+                local["cancel"] = local.get("cancel", 0) + service.cancel_booking(service.my_bookings(name)[0].id, name).ok
+        with lock:
+            for k, v in local.items(): counts[k] = counts.get(k, 0) + v
+
+    pool = [threading.Thread(target=worker, args=(range(t, users, threads),)) for t in range(threads)]
+    for t in pool: t.start()
+    for t in pool: t.join()
+
+    bad = conn.execute("""SELECT count(*) FROM slots s WHERE seats_taken > capacity OR seats_taken <>
+        (SELECT count(*) + coalesce(sum(plus_one), 0) FROM bookings WHERE slot_id = s.id)""").fetchone()[0]
+    assert bad == 0
+    assert counts["login"] == users and counts.get("OK", 0) + counts.get("SOLD_OUT", 0) == users, counts
+    assert conn.execute("SELECT count(*) FROM waitlist").fetchone()[0] == counts.get("SOLD_OUT", 0)
+    assert conn.execute("SELECT count(*) FROM bookings").fetchone()[0] == counts.get("OK", 0) - counts.get("cancel", 0)
+
+
+def test_result_codes(conn):
+    assert service.create_user("", "pw").status == "EMPTY"
+    assert service.create_user("anna", "pw").ok and service.create_user("anna", "pw").status == "EXISTS"
+    assert service.login_user("anna", "pw") and not service.login_user("anna", "no")
+    assert service.cancel_booking(12345, "anna").status == "NOT_FOUND"
+    assert service.send_message(1, "anna", "   ").status == "EMPTY"